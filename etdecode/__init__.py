@@ -0,0 +1 @@
+"""Decoding and analysis of Wolfenstein: Enemy Territory demo files (.dm_84)."""
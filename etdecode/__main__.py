@@ -0,0 +1,5 @@
+import sys
+
+from etdecode.cli import main
+
+sys.exit(main())
@@ -0,0 +1,177 @@
+import math
+
+import numpy as np
+
+from etdecode.snapshot import MAX_CLIENTS
+
+AIM_WINDOW = 128  # Samples of view angles kept per player
+SPEED_SCALE = 10  # Speeds are summed as whole tenths of a degree per second
+MIN_SPEEDS = 16  # Known speeds in the window before a z-score is given
+
+
+def _turn(previous, angles):
+    # Shortest way around between two sets of view angles, summed over the axes
+    delta = np.abs(angles - previous) % 360.0
+    delta = np.minimum(delta, 360.0 - delta)
+    return delta[..., 0] + delta[..., 1] + delta[..., 2]
+
+
+def _turn_axis(previous, angle):
+    # _turn for one axis on plain floats, the same operations
+    delta = abs(angle - previous) % 360.0
+    return min(delta, 360.0 - delta)
+
+
+def _quantize(speeds):
+    # The speeds as tenths, and which of them are known
+    known = speeds == speeds
+    return np.rint(np.where(known, speeds, 0.0) * SPEED_SCALE).astype(np.int64), known
+
+
+class AimHistory:
+    """Fixed-size ring of the latest view angles of every player.
+
+    Next to the angles it keeps the angular velocity (degrees per second)
+    each sample was reached with, and rolling sums of it over the window, so
+    mean, variance and the z-score of a new speed are O(1) however long the
+    demo is. The sums are kept as integers (see SPEED_SCALE) so they are
+    exact: adding samples one at a time or a block at once gives the same.
+    """
+
+    def __init__(self, window=AIM_WINDOW, players=MAX_CLIENTS):
+        self.window = window
+        self.times = np.zeros((players, window), dtype=np.int64)
+        self.angles = np.zeros((players, window, 3))
+        self.speeds = np.full((players, window), np.nan)  # NaN where no speed is known
+        self.count = np.zeros(players, dtype=np.int64)  # Samples stored, at most window
+        self.head = np.zeros(players, dtype=np.int64)  # Next slot to write
+        self._speed_count = np.zeros(players, dtype=np.int64)
+        self._speed_sum = np.zeros(players, dtype=np.int64)
+        self._speed_squares = np.zeros(players, dtype=np.int64)
+
+    def last(self, player_id):
+        # Latest (angle_x, angle_y, angle_z, timestamp), or None before the first sample
+        if not self.count[player_id]:
+            return None
+        slot = (self.head[player_id] - 1) % self.window
+        return (*self.angles[player_id, slot].tolist(), int(self.times[player_id, slot]))
+
+    def add(self, player_id, timestamp, angle_x, angle_y, angle_z):
+        # Store one sample. Returns the one before it like last() did, and the
+        # z-score of the new speed against the window before it (NaN when unknown).
+        previous = self.last(player_id)
+        speed = zscore = math.nan
+        if previous is not None and timestamp > previous[3]:
+            turn = _turn_axis(previous[0], angle_x) + _turn_axis(previous[1], angle_y) + _turn_axis(previous[2], angle_z)
+            speed = turn * 1000.0 / (timestamp - previous[3])
+            zscore = self._zscore(player_id, round(speed * SPEED_SCALE))
+
+        slot = self.head[player_id]
+        if self.count[player_id] == self.window:
+            self._forget(player_id, self.speeds[player_id, slot])
+        else:
+            self.count[player_id] += 1
+        self.times[player_id, slot] = timestamp
+        self.angles[player_id, slot] = angle_x, angle_y, angle_z
+        self.speeds[player_id, slot] = speed
+        if speed == speed:
+            tenths = round(speed * SPEED_SCALE)
+            self._speed_count[player_id] += 1
+            self._speed_sum[player_id] += tenths
+            self._speed_squares[player_id] += tenths * tenths
+        self.head[player_id] = (slot + 1) % self.window
+        return previous, zscore
+
+    def extend(self, player_id, timestamps, angles):
+        # Store a block of one player's samples in time order, (n,) times and (n, 3)
+        # angles. Returns the z-scores add() would have given, one per sample.
+        count = len(timestamps)
+        if not count:
+            return np.empty(0)
+        previous = self.last(player_id)
+        speeds = np.full(count, np.nan)
+        times = np.asarray(timestamps, dtype=np.int64)
+        angles = np.asarray(angles, dtype=np.float64)
+        elapsed = np.diff(times)
+        turn = _turn(angles[:-1], angles[1:])
+        np.divide(turn * 1000.0, elapsed, out=speeds[1:], where=elapsed > 0)
+        if previous is not None and times[0] > previous[3]:
+            speeds[0] = _turn(np.array(previous[:3]), angles[0]) * 1000.0 / (times[0] - previous[3])
+
+        # The window before every sample, from running sums over the stored
+        # samples followed by the block
+        stored = self.count[player_id]
+        slots = (self.head[player_id] - stored + np.arange(stored)) % self.window
+        tenths, known = _quantize(np.concatenate([self.speeds[player_id, slots], speeds]))
+        sums = [np.concatenate([[0], np.cumsum(values)]) for values in (known, tenths, tenths * tenths)]
+        ends = np.arange(stored, stored + count)
+        starts = np.maximum(ends - self.window, 0)
+        counts, totals, squares = (running[ends] - running[starts] for running in sums)
+        zscores = self._zscores(counts, totals, squares, tenths[stored:])
+        zscores[~known[stored:]] = np.nan
+
+        # Only the last window samples survive
+        keep = min(count, self.window)
+        slots = (self.head[player_id] + np.arange(count - keep, count)) % self.window
+        self.times[player_id, slots] = times[-keep:]
+        self.angles[player_id, slots] = angles[-keep:]
+        self.speeds[player_id, slots] = speeds[-keep:]
+        self.head[player_id] = (self.head[player_id] + count) % self.window
+        self.count[player_id] = min(self.count[player_id] + count, self.window)
+        self._recount(player_id)
+        return zscores
+
+    def state(self):
+        # The stored samples, for checkpoints. The rolling sums are recounted on restore.
+        return {"times": self.times, "angles": self.angles, "speeds": self.speeds, "count": self.count, "head": self.head}
+
+    def restore(self, state):
+        for name, values in state.items():
+            getattr(self, name)[:] = values
+        self._recount(slice(None))
+
+    def samples(self, player_id):
+        # Copies of the stored (times, angles), oldest first
+        count = self.count[player_id]
+        slots = (self.head[player_id] - count + np.arange(count)) % self.window
+        return self.times[player_id, slots], self.angles[player_id, slots]
+
+    def speed_stats(self, player_id):
+        # (samples, mean, variance) of the angular velocity over the window
+        count = int(self._speed_count[player_id])
+        if not count:
+            return 0, 0.0, 0.0
+        total = int(self._speed_sum[player_id])
+        spread = count * int(self._speed_squares[player_id]) - total * total
+        return count, total / count / SPEED_SCALE, spread / (count * count) / (SPEED_SCALE * SPEED_SCALE)
+
+    def _forget(self, player_id, speed):
+        if speed == speed:
+            tenths = round(float(speed) * SPEED_SCALE)
+            self._speed_count[player_id] -= 1
+            self._speed_sum[player_id] -= tenths
+            self._speed_squares[player_id] -= tenths * tenths
+
+    def _recount(self, players):
+        tenths, known = _quantize(self.speeds[players])
+        self._speed_count[players] = known.sum(axis=-1)
+        self._speed_sum[players] = tenths.sum(axis=-1)
+        self._speed_squares[players] = (tenths * tenths).sum(axis=-1)
+
+    def _zscore(self, player_id, tenths):
+        count = int(self._speed_count[player_id])
+        total = int(self._speed_sum[player_id])
+        spread = count * int(self._speed_squares[player_id]) - total * total
+        if count < MIN_SPEEDS or spread <= 0:
+            return math.nan
+        # (speed - mean) / deviation, with the counts multiplied through
+        return (count * tenths - total) / math.sqrt(spread)
+
+    @staticmethod
+    def _zscores(counts, totals, squares, tenths):
+        # _zscore over arrays, the same operations
+        spread = counts * squares - totals * totals
+        zscores = np.full(len(counts), np.nan)
+        valid = (counts >= MIN_SPEEDS) & (spread > 0)
+        zscores[valid] = (counts[valid] * tenths[valid] - totals[valid]) / np.sqrt(spread[valid].astype(np.float64))
+        return zscores
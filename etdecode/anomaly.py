@@ -0,0 +1,274 @@
+import logging
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# scipy is imported by aim_features, recording the samples doesn't need it
+
+SMOOTHING_SIGMA = 1.0  # Frames, of the Gaussian the angular velocity is smoothed with
+MAX_FILL = 1000  # ms the last angles of a player missing from the snapshots stand in for
+SNAP_WINDOW = 250  # ms before a shot searched for a flick onto the target
+SNAP_SPEED = 300.0  # deg/s the smoothed turn must peak at to count as a snap
+SETTLE_WINDOW = 100  # ms from a shot in which the aim of a snap holds still
+SETTLE_RATIO = 0.2  # Share of the peak turn speed left when it holds: the aim stopped dead
+HIT_WINDOW = 100  # ms after a shot its hit is looked for
+STATS_WINDOW = 5000  # ms per window of turn speed statistics
+WINDOW_SAMPLES = 20  # Samples a window needs to count
+MOVING_SPEED = 5.0  # deg/s mean turn speed below which a window is idle and skipped
+MIN_SHOTS = 10  # Shots a player needs for their snap rates to be scored
+MAX_Z = 10.0  # Cap of one feature's share of a score, in MADs
+
+# (feature, direction, weight) of the score, direction 1 where high values are
+# suspicious and -1 where low ones are
+SCORE_FEATURES = (
+    ("snap_rate", 1, 2.0),  # Shots right after a flick that stopped dead
+    ("snap_hit_rate", 1, 1.0),  # Of those, the ones that hit
+    ("jerk_ratio", 1, 1.0),  # Spikes of jerk against the player's usual jerk
+    ("turn_cv", -1, 1.0),  # Turning at an unnaturally even speed
+)
+
+
+class AimRecorder:
+    """View angles, shots and hits of every player over a whole demo.
+
+    Samples are kept in the blocks they arrive in and laid out as one
+    (players, frames) series each when the demo is done, see series().
+    """
+
+    def __init__(self):
+        self._times = []
+        self._player_ids = []
+        self._angles = []
+        self._shots = []
+        self._hits = []
+
+    def add(self, timestamp, player_ids, angles):
+        # One frame's player ids and their (n, 3) view angles. Copied, the
+        # arrays may be views the parser reuses.
+        if len(player_ids):
+            self._times.append(np.full(len(player_ids), timestamp, dtype=np.int64))
+            self._player_ids.append(np.array(player_ids, dtype=np.int16))
+            self._angles.append(np.array(angles, dtype=np.float32)[:, :2])  # Pitch and yaw, not roll
+
+    def shot(self, timestamp, player_id):
+        self._shots.append((timestamp, player_id))
+
+    def hit(self, timestamp, player_id):
+        self._hits.append((timestamp, player_id))
+
+    def series(self):
+        """(frame times, player ids, angles) of the recorded samples.
+
+        angles is (players, frames, 2) pitch and yaw in degrees. A player
+        only in some snapshots' changed entities keeps their last angles
+        for up to MAX_FILL ms, the rest of the gaps are NaN.
+        """
+        if not self._times:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int16), np.zeros((0, 0, 2), dtype=np.float32)
+        times = np.concatenate(self._times)
+        player_ids = np.concatenate(self._player_ids)
+        frame_times, columns = np.unique(times, return_inverse=True)
+        players, rows = np.unique(player_ids, return_inverse=True)
+        angles = np.full((len(players), len(frame_times), 2), np.nan, dtype=np.float32)
+        angles[rows, columns] = np.concatenate(self._angles)
+
+        # Forward fill, the age of the sample filled in limited to MAX_FILL
+        observed = ~np.isnan(angles[..., 0])
+        last = np.maximum.accumulate(np.where(observed, np.arange(len(frame_times)), -1), axis=1)
+        fill = ~observed & (last >= 0)
+        fill &= frame_times - frame_times[np.maximum(last, 0)] <= MAX_FILL
+        filled = np.take_along_axis(angles, np.maximum(last, 0)[..., None], axis=1)
+        angles[fill] = filled[fill]
+        return frame_times, players, angles
+
+    def features(self):
+        # aim_features of everything recorded
+        return aim_features(*self.series(), np.array(self._shots, dtype=np.int64).reshape(-1, 2),
+                            np.array(self._hits, dtype=np.int64).reshape(-1, 2))
+
+
+def _hypot(vectors):
+    return np.hypot(vectors[..., 0], vectors[..., 1])
+
+
+def aim_features(frame_times, player_ids, angles, shots, hits):
+    """Per-player aim kinematics of one demo, a dict per player.
+
+    angles are (players, frames, 2) pitch and yaw series as
+    AimRecorder.series() returns them, shots and hits (n, 2) arrays of
+    (timestamp, player_id). The angular velocity is smoothed with a
+    Gaussian over the gaps, acceleration and jerk are its derivatives.
+    A snap is a shot fired within SNAP_WINDOW of a turn peaking above
+    SNAP_SPEED, where the turn slows to SETTLE_RATIO of that peak within
+    SETTLE_WINDOW of the shot.
+    Features that can't be known, like the snap rate without shots, are
+    NaN.
+    """
+    from scipy.ndimage import gaussian_filter1d
+
+    frames = len(frame_times)
+    if frames < 3 or not len(player_ids):
+        return []
+    seconds = (frame_times - frame_times[0]) / 1000.0
+
+    # Turn rates the shortest way around, NaN where a sample is missing
+    delta = (np.diff(angles.astype(np.float64), axis=1) + 180.0) % 360.0 - 180.0
+    rates = np.full(angles.shape, np.nan)
+    rates[:, 1:] = delta / np.diff(seconds)[:, None]
+    valid = ~np.isnan(rates[..., 0])
+    # Normalized convolution: the gaps neither count as zero nor spread NaN
+    weight = gaussian_filter1d(valid.astype(np.float64), SMOOTHING_SIGMA, axis=1)
+    smooth = gaussian_filter1d(np.where(valid[..., None], rates, 0.0), SMOOTHING_SIGMA, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        smooth /= weight[..., None]
+    smooth[~valid] = np.nan
+    speed = _hypot(smooth)
+    acceleration = np.gradient(smooth, seconds, axis=1)
+    jerk = _hypot(np.gradient(acceleration, seconds, axis=1))
+
+    # Snaps before shots, every shot at once. The frame of a shot is the last
+    # one at or before it.
+    count = len(player_ids)
+    rows = np.searchsorted(player_ids, shots[:, 1]).clip(0, count - 1)
+    columns = np.searchsorted(frame_times, shots[:, 0], side="right") - 1
+    known = (player_ids[rows] == shots[:, 1]) & (columns >= 0)
+    rows, columns, shot_times = rows[known], columns[known], shots[known, 0]
+    frame = np.median(np.diff(frame_times))
+    before = (columns[:, None] - np.arange(max(1, int(round(SNAP_WINDOW / frame))))).clip(0)
+    after = (columns[:, None] + np.arange(1 + int(round(SETTLE_WINDOW / frame)))).clip(None, frames - 1)
+    peak = np.fmax.reduce(speed[rows[:, None], before], axis=1) if len(rows) else np.zeros(0)
+    settled = np.fmin.reduce(speed[rows[:, None], after], axis=1) if len(rows) else np.zeros(0)
+    with np.errstate(invalid="ignore"):
+        snaps = (peak >= SNAP_SPEED) & (settled <= SETTLE_RATIO * peak)
+
+    # A shot hit when the same player hit within HIT_WINDOW of it
+    hit_keys = np.sort(hits[:, 1] << 32 | hits[:, 0])
+    shot_keys = player_ids[rows].astype(np.int64) << 32 | shot_times
+    found = np.searchsorted(hit_keys, shot_keys)
+    hit = found < len(hit_keys)
+    hit[hit] = hit_keys[found[hit]] <= shot_keys[hit] + HIT_WINDOW
+
+    shot_count = np.bincount(rows, minlength=count)
+    snap_count = np.bincount(rows, weights=snaps, minlength=count)
+    snap_hits = np.bincount(rows, weights=snaps & hit, minlength=count)
+    hitters = np.searchsorted(player_ids, hits[:, 1]).clip(0, count - 1)
+    hit_count = np.bincount(hitters[player_ids[hitters] == hits[:, 1]], minlength=count)
+
+    # Turn speed statistics per window of STATS_WINDOW
+    windows = (frame_times - frame_times[0]) // STATS_WINDOW
+    cells = (np.arange(count)[:, None] * (windows[-1] + 1) + windows).ravel()
+    samples = ~np.isnan(speed).ravel()
+    shape = (count, windows[-1] + 1)
+    size = shape[0] * shape[1]
+    values = speed.ravel()[samples]
+    window_samples = np.bincount(cells[samples], minlength=size).reshape(shape)
+    window_sum = np.bincount(cells[samples], weights=values, minlength=size).reshape(shape)
+    window_squares = np.bincount(cells[samples], weights=values * values, minlength=size).reshape(shape)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = window_sum / window_samples
+        deviation = np.sqrt(np.maximum(window_squares / window_samples - mean * mean, 0.0))
+        variation = np.where((window_samples >= WINDOW_SAMPLES) & (mean >= MOVING_SPEED), deviation / mean, np.nan)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # Players without a usable window
+            turn_cv = np.nanmedian(variation, axis=1)
+            # Jerk while turning, holding still would make any spike look huge
+            turning = speed >= MOVING_SPEED
+            jerk_median, jerk_top = np.nanpercentile(np.where(turning, jerk, np.nan), (50, 99), axis=1)
+        snap_rate = snap_count / shot_count
+        snap_hit_rate = snap_hits / snap_count
+        jerk_ratio = np.where(turning.sum(axis=1) >= WINDOW_SAMPLES, jerk_top / jerk_median, np.nan)
+    peak_speed = np.fmax.reduce(speed, axis=1)
+
+    return [{
+        "player_id": player_id,
+        "samples": int(np.count_nonzero(valid[row])),
+        "shots": int(shot_count[row]),
+        "hits": int(hit_count[row]),
+        "snaps": int(snap_count[row]),
+        "snap_hits": int(snap_hits[row]),
+        "snap_rate": float(snap_rate[row]),
+        "snap_hit_rate": float(snap_hit_rate[row]),
+        "peak_speed": float(peak_speed[row]),
+        "jerk_ratio": float(jerk_ratio[row]),
+        "turn_cv": float(turn_cv[row]),
+    } for row, player_id in enumerate(player_ids.tolist())]
+
+
+def rank_players(rows):
+    """Score feature rows, of one demo or many, and sort them most anomalous first.
+
+    Every feature of SCORE_FEATURES becomes a robust z-score over all rows,
+    its distance from the median in median absolute deviations, towards
+    the suspicious side only and capped at MAX_Z. The score is their
+    weighted mean. The snap rates of players with fewer than MIN_SHOTS
+    shots don't count. Returns copies of the rows with a "score" added.
+    """
+    if not rows:
+        return []
+    shots = np.array([row["shots"] for row in rows])
+    scores = np.zeros(len(rows))
+    for feature, direction, weight in SCORE_FEATURES:
+        values = np.array([row[feature] for row in rows], dtype=np.float64)
+        values[~np.isfinite(values)] = np.nan
+        if feature.startswith("snap"):
+            values[shots < MIN_SHOTS] = np.nan
+        if np.isnan(values).all():
+            continue
+        median = np.nanmedian(values)
+        scale = np.nanmedian(np.abs(values - median)) * 1.4826  # The standard deviation of normal data
+        if not scale > 0:
+            scale = np.nanstd(values)
+        if not scale > 0:
+            continue  # All the same, nothing stands out
+        z = np.clip(direction * (values - median) / scale, 0.0, MAX_Z)
+        scores += weight * np.nan_to_num(z)
+    scores /= sum(weight for _, _, weight in SCORE_FEATURES)
+    order = np.argsort(-scores, kind="stable")
+    return [dict(rows[index], score=float(scores[index])) for index in order.tolist()]
+
+
+def _analyze_demo(demo_file, engine):
+    # Runs in a worker process: parse one demo for its aim features. The events
+    # go to an in-memory database that is dropped afterwards.
+    from etdecode.monitor import ETPlayerMonitor
+
+    monitor = ETPlayerMonitor(demo_file, engine=engine, ingest="bulk", database_file=":memory:", record_aim=True)
+    try:
+        monitor.parse_demo()
+        rows = monitor.aim_features()
+        for row in rows:
+            row["demo"] = demo_file
+            row["player_name"] = monitor.player_name(row["player_id"])
+    finally:
+        monitor.close(summary=False)
+    return rows
+
+
+def analyze_demos(pattern, workers=None, engine="auto"):
+    """Rank the players of every demo matching pattern by aim anomaly score.
+
+    The demos are parsed in parallel, one process each, and scored
+    together with rank_players, so a player stands out against everyone
+    in the set.
+    """
+    from etdecode.batch import find_demos
+
+    demos = find_demos(pattern)
+    if not demos:
+        log.warning("No demos found for %s", pattern)
+        return []
+    rows = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_analyze_demo, demo_file, engine): demo_file for demo_file in demos}
+        for future in as_completed(futures):
+            try:
+                rows.extend(future.result())
+            except Exception:
+                log.exception("Error analyzing %s", futures[future])
+    log.info("Analyzed %d demos in %.2fs", len(demos), time.perf_counter() - start)
+    return rank_players(rows)
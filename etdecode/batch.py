@@ -0,0 +1,161 @@
+import argparse
+import glob
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from etdecode.database import DATABASE_FILE, ActionDatabase
+from etdecode.engine import ENGINES, create_decoder
+from etdecode.seek import DemoIndex
+
+log = logging.getLogger(__name__)
+
+DEMO_PATTERN = "*.dm_84"  # Demos picked up from a directory
+
+
+def find_demos(pattern):
+    # Demo files in a directory, or matching a glob pattern, in name order
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, DEMO_PATTERN)
+    return sorted(glob.glob(pattern))
+
+
+def _split_demo(demo_file, engine, split):
+    # Runs in a worker process: the time ranges of the demo's seek index to parse it in
+    return DemoIndex.for_demo(demo_file, create_decoder(engine)).segments(split)
+
+
+def _ingest_shard(demo_file, demo_id, shard_path, engine, options, start_time=None, end_time=None):
+    # Runs in a worker process: parse one demo, or a time range of it, into a database of its own
+    from etdecode.monitor import ETPlayerMonitor
+
+    start = time.perf_counter()
+    monitor = ETPlayerMonitor(demo_file, engine=engine, ingest="bulk", database_file=shard_path,
+                              demo_id=demo_id, **options)
+    try:
+        stats = monitor.parse_demo(start_time, end_time)
+    finally:
+        monitor.close(summary=False)
+    if stats.counters["errors"]:
+        # parse_demo logged the error, the shard holds only part of the demo
+        raise RuntimeError(f"Parsing {demo_file} failed")
+    return time.perf_counter() - start
+
+
+def process_demos(pattern, output=DATABASE_FILE, workers=None, engine="auto", split=1, **options):
+    """Parse every demo matching pattern in parallel into the database at output.
+
+    Each demo is parsed in its own process into a shard database. Once every
+    part of a demo is done its shards are merged into output. Every stored
+    event carries the id of the demo it came from, and a demo parsed into
+    output before has its events replaced. A demo that fails to parse is
+    left as it was. With split > 1 a demo is cut at keyframes of
+    its seek index into up to split time ranges, parsed in parallel. A
+    player's first sample in a range has nothing to be compared with then, so
+    the few events it would give are missing. Returns the number of shards
+    merged.
+    """
+    demos = find_demos(pattern)
+    if not demos:
+        log.warning("No demos found for %s", pattern)
+        return 0
+    database = ActionDatabase(output, mode="bulk")
+    shards = tempfile.mkdtemp(prefix="etdecode-", dir=os.path.dirname(os.path.abspath(output)))
+    merged = parts = 0
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = {}  # future: (demo file, demo id, shard path or None for a split)
+            running = {}  # demo id: parts not finished yet
+            parsed = {}  # demo id: [(shard path, seconds)] of its finished parts, None once one failed
+
+            def submit(demo_file, demo_id, segments):
+                nonlocal parts
+                running[demo_id] = len(segments)
+                parsed[demo_id] = []
+                for part, (start_time, end_time) in enumerate(segments):
+                    shard_path = os.path.join(shards, f"demo-{demo_id}-{part}.db")
+                    future = executor.submit(_ingest_shard, demo_file, demo_id, shard_path, engine, options,
+                                             start_time, end_time)
+                    pending[future] = (demo_file, demo_id, shard_path)
+                parts += len(segments)
+
+            for demo_file in demos:
+                demo_id = database.register_demo(demo_file)
+                if split > 1:
+                    # Building a seek index reads the whole demo, the workers do it
+                    pending[executor.submit(_split_demo, demo_file, engine, split)] = (demo_file, demo_id, None)
+                else:
+                    submit(demo_file, demo_id, [(None, None)])
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    demo_file, demo_id, shard_path = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception:
+                        log.exception("Error processing %s", demo_file)
+                        result = None
+                    if shard_path is None:
+                        if result is not None:
+                            submit(demo_file, demo_id, result)
+                        continue
+                    if result is not None and parsed[demo_id] is not None:
+                        parsed[demo_id].append((shard_path, result))
+                    else:
+                        # This part or an earlier one failed, none of the demo is merged
+                        for path in [shard_path] + [path for path, _ in parsed[demo_id] or ()]:
+                            if os.path.exists(path):
+                                os.remove(path)
+                        parsed[demo_id] = None
+                    running[demo_id] -= 1
+                    if not running[demo_id]:
+                        merged += _merge_demo(database, demo_file, demo_id, parsed.pop(demo_id))
+        database.finish()
+    finally:
+        database.close()
+        shutil.rmtree(shards, ignore_errors=True)
+    log.info("Processed %d of %d parts of %d demos in %.2fs", merged, parts, len(demos),
+             time.perf_counter() - start)
+    return merged
+
+
+def _merge_demo(database, demo_file, demo_id, shards):
+    # Replace what output held of a demo with all of its parts, or keep it when one failed
+    if shards is None:
+        log.error("Keeping the earlier events of %s, not all of it was parsed", demo_file)
+        return 0
+    merged = 0
+    try:
+        database.discard(demo_id)
+        for shard_path, seconds in shards:
+            rows = database.merge(shard_path)
+            merged += 1
+            log.info("Merged %s: %d actions, parsed in %.2fs", demo_file, rows, seconds)
+    except Exception:
+        log.exception("Error merging %s", demo_file)
+    finally:
+        for shard_path, _ in shards:
+            if os.path.exists(shard_path):
+                os.remove(shard_path)
+    return merged
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Parse many demos in parallel into one database.")
+    parser.add_argument("demos", help="directory of .dm_84 files, or a glob pattern")
+    parser.add_argument("-o", "--output", default=DATABASE_FILE, help="database file to merge into")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--engine", default="auto", choices=ENGINES)
+    parser.add_argument("--split", type=int, default=1, help="time ranges to parse each demo in, cut at keyframes")
+    options = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    process_demos(options.demos, options.output, options.workers, options.engine, options.split)
+
+
+if __name__ == "__main__":
+    main()
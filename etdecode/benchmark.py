@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from etdecode.database import INGEST_MODES, ActionDatabase
+from etdecode.demo import DemoReader
+from etdecode.engine import ENGINES, create_decoder
+from etdecode.seek import DemoIndex
+from etdecode.snapshot import SnapshotParser, detach
+
+REPORT_VERSION = 1  # Layout of the JSON report
+STAGES = ("read", "decode", "delta", "interpret", "store")
+BENCHMARK_SNAPSHOTS = 6000  # Size of the generated demo when none is given
+
+
+def peak_rss_kb():
+    # Peak resident set size of this process so far, None where it can't be known
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # Bytes on macOS
+
+
+def _timed(stage, size, function):
+    # Run function, which returns (items, unit), and describe the stage
+    start = time.perf_counter()
+    items, unit = function()
+    seconds = time.perf_counter() - start
+    return {
+        "stage": stage,
+        "seconds": seconds,
+        "mb_per_s": size / seconds / 1e6 if seconds > 0 else None,
+        "items": items,
+        "unit": unit,
+        "items_per_s": items / seconds if seconds > 0 else None,
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def run_stages(demo_file, engine="auto", ingest="safe"):
+    """Time every stage of parsing demo_file on its own, each feeding the next.
+
+    read only frames the messages, decode Huffman decodes the message headers
+    as the seek index does, delta rebuilds the snapshots, interpret turns them
+    into events and store writes those to a fresh database. MB/s are demo
+    bytes over the stage's time, so the stages compare directly.
+    """
+    from etdecode.monitor import ETPlayerMonitor
+
+    class Interpreter(ETPlayerMonitor):
+        # Keeps the event columns instead of writing them
+        def _write_events(self, columns):
+            self.written.append(columns)
+
+    size = os.path.getsize(demo_file)
+    decoder = create_decoder(engine)
+    results = []
+
+    def read():
+        frames = 0
+        with DemoReader(demo_file) as reader:
+            for _ in reader:
+                frames += 1
+        return frames, "messages"
+    results.append(_timed("read", size, read))
+
+    def decode():
+        return len(DemoIndex.build(demo_file, decoder)), "messages"
+    results.append(_timed("decode", size, decode))
+
+    snapshots = []
+
+    def delta():
+        parser = SnapshotParser(decoder)
+        with DemoReader(demo_file) as reader:
+            snapshots.extend(detach(snapshot) for snapshot in parser.snapshots(reader))
+        return len(snapshots), "snapshots"
+    results.append(_timed("delta", size, delta))
+
+    monitor = Interpreter(demo_file, engine=engine)
+    monitor.written = []
+
+    def interpret():
+        for snapshot in snapshots:
+            monitor._process_snapshot(snapshot)
+        if monitor.motion is not None:
+            monitor._flush_motion()
+        if len(monitor.events):
+            monitor._flush_actions_buffer()
+        return sum(len(columns["timestamp"]) for columns in monitor.written), "events"
+    results.append(_timed("interpret", size, interpret))
+
+    def store():
+        with tempfile.TemporaryDirectory() as directory:
+            database = ActionDatabase(os.path.join(directory, "benchmark.db"), mode=ingest)
+            for columns in monitor.written:
+                database.insert_events(columns, monitor.player_name)
+            database.finish()
+            database.close()
+        return database.rows, "rows"
+    results.append(_timed("store", size, store))
+    return results
+
+
+def _run(demo_file, engine, ingest, repeat):
+    # One configuration in a worker process of its own, so its peak RSS is its own
+    run = {"engine": engine, "ingest": ingest}
+    try:
+        best = None
+        for _ in range(repeat):
+            stages = run_stages(demo_file, engine, ingest)
+            if best is None:
+                best = stages
+            else:
+                best = [min(old, new, key=lambda stage: stage["seconds"]) for old, new in zip(best, stages)]
+        run["stages"] = best
+        run["seconds"] = sum(stage["seconds"] for stage in best)
+    except Exception as e:
+        run["error"] = f"{type(e).__name__}: {e}"
+    run["peak_rss_kb"] = peak_rss_kb()
+    return run
+
+
+def benchmark(demo_file, engines=("native", "python"), ingests=INGEST_MODES, repeat=1):
+    """Benchmark every engine and ingest mode combination on demo_file.
+
+    Returns a JSON-ready report: the environment, the demo and one run per
+    combination with the stages run_stages describes, the fastest of repeat
+    tries each. A combination that can't run, like the native engine
+    without huffman.so, has an error instead of stages.
+    """
+    runs = []
+    for engine in engines:
+        for ingest in ingests:
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                runs.append(executor.submit(_run, demo_file, engine, ingest, repeat).result())
+    return {
+        "version": REPORT_VERSION,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "demo": {"path": os.path.abspath(demo_file), "bytes": os.path.getsize(demo_file)},
+        "runs": runs,
+    }
+
+
+def print_report(report):
+    print(f"{report['demo']['path']}: {report['demo']['bytes'] / 1e6:.1f} MB")
+    for run in report["runs"]:
+        print(f"\n{run['engine']} engine, {run['ingest']} ingest, peak RSS {run['peak_rss_kb']} kB")
+        if "error" in run:
+            print(f"  failed: {run['error']}")
+            continue
+        for stage in run["stages"]:
+            print(f"  {stage['stage']:>9}: {stage['seconds']:8.3f}s {stage['mb_per_s']:9.2f} MB/s "
+                  f"{stage['items_per_s']:12.0f} {stage['unit']}/s")
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark every parsing stage on a demo.")
+    parser.add_argument("demo", nargs="?", help="demo to parse (default: generate a synthetic one)")
+    parser.add_argument("--snapshots", type=int, default=BENCHMARK_SNAPSHOTS, help="size of the generated demo")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated demo")
+    parser.add_argument("--engine", action="append", choices=[e for e in ENGINES if e != "auto"],
+                        help="engine to benchmark, repeatable (default: all)")
+    parser.add_argument("--ingest", action="append", choices=INGEST_MODES,
+                        help="ingest mode to benchmark, repeatable (default: all)")
+    parser.add_argument("--repeat", type=int, default=1, help="keep the fastest of this many runs")
+    parser.add_argument("--json", help="write the report to this file, - for stdout")
+    options = parser.parse_args(args)
+    engines = options.engine or [e for e in ENGINES if e != "auto"]
+    ingests = options.ingest or INGEST_MODES
+
+    with tempfile.TemporaryDirectory() as directory:
+        demo_file = options.demo
+        synthetic = None
+        if demo_file is None:
+            from etdecode.synthetic import generate_demo
+            demo_file = os.path.join(directory, "synthetic.dm_84")
+            synthetic = {"snapshots": options.snapshots, "seed": options.seed}
+            synthetic.update(generate_demo(demo_file, snapshots=options.snapshots, seed=options.seed))
+        report = benchmark(demo_file, engines, ingests, options.repeat)
+        report["demo"]["synthetic"] = synthetic
+
+    if options.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report)
+        if options.json:
+            with open(options.json, "w") as file:
+                json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
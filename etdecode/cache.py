@@ -0,0 +1,104 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+PARSER_VERSION = 3  # Bump when decoding or interpretation changes the events of a demo
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "etdecode")
+CACHE_BYTES = 1 << 30  # Size the cache is kept under
+HASH_BLOCK = 1 << 20
+VERSION_FILE = "version"  # In every entry, the PARSER_VERSION that wrote it
+
+
+def content_hash(path):
+    # SHA-256 of a file's bytes
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """Decoded event columns of demos, keyed by content hash and PARSER_VERSION.
+
+    Every entry is a directory with one .npy file per column, loaded memory
+    mapped, and the version that wrote it. A hit refreshes the entry's modification time, and the least
+    recently used entries are removed once the cache outgrows max_bytes.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, demo_file):
+        return f"{content_hash(demo_file)}-v{PARSER_VERSION}"
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def load(self, key, names=None):
+        # {name: read-only memory-mapped array} of an entry, or None on a miss. An
+        # entry of another version, or without exactly the columns in names when
+        # given, is a miss too.
+        path = self._path(key)
+        try:
+            with open(os.path.join(path, VERSION_FILE)) as file:
+                if file.read().strip() != str(PARSER_VERSION):
+                    return None
+            found = sorted(name[:-4] for name in os.listdir(path) if name.endswith(".npy"))
+            if names is not None and found != sorted(names):
+                return None
+            columns = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r") for name in found}
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return columns
+
+    def store(self, key, columns):
+        # Written to a temporary directory and renamed into place, so a reader
+        # never sees half an entry
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = tempfile.mkdtemp(prefix=".tmp-", dir=self.directory)
+        path = self._path(key)
+        try:
+            for name, values in columns.items():
+                np.save(os.path.join(temporary, name + ".npy"), values)
+            with open(os.path.join(temporary, VERSION_FILE), "w") as file:
+                file.write(str(PARSER_VERSION))
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            os.rename(temporary, path)
+        except OSError:
+            shutil.rmtree(temporary, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise  # Unless another process stored the same entry meanwhile
+        self.evict()
+
+    def entries(self):
+        # (last used, bytes, key) of every entry, least recently used first
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for key in os.listdir(self.directory):
+            path = self._path(key)
+            if key.startswith(".") or not os.path.isdir(path):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(path))
+            entries.append((os.stat(path).st_mtime, size, key))
+        return sorted(entries)
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self._path(key), ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        for _, _, key in self.entries():
+            shutil.rmtree(self._path(key), ignore_errors=True)
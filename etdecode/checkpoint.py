@@ -0,0 +1,44 @@
+import json
+import os
+
+import numpy as np
+
+CHECKPOINT_SUFFIX = ".ckpt.npz"  # Appended to the demo file name
+CHECKPOINT_VERSION = 1
+
+
+def save_checkpoint(path, parts):
+    """Write parts, a dict of named state dicts, to path in one step.
+
+    Arrays are stored as .npz members, every other value goes into one JSON
+    document. The file is written next to path and renamed over it, so a
+    crash leaves either the old or the new checkpoint.
+    """
+    arrays = {}
+    values = {}
+    for part, state in parts.items():
+        values[part] = {}
+        for name, value in state.items():
+            if isinstance(value, np.ndarray):
+                arrays[f"{part}.{name}"] = value
+            else:
+                values[part][name] = value
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        np.savez(file, version=CHECKPOINT_VERSION, values=json.dumps(values), **arrays)
+    os.replace(temporary, path)
+
+
+def load_checkpoint(path):
+    # The parts save_checkpoint wrote, or None when there is no checkpoint
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        if int(data["version"]) != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version in {path}")
+        parts = json.loads(str(data["values"]))
+        for key in data.files:
+            if "." in key:
+                part, name = key.split(".", 1)
+                parts.setdefault(part, {})[name] = data[key]
+    return parts
@@ -0,0 +1,227 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+
+from etdecode.anomaly import analyze_demos
+from etdecode.cache import CACHE_DIR, ParseCache
+from etdecode.database import DATABASE_FILE, INGEST_MODES, KIND_TABLES, NEAR_WINDOW, ActionDatabase
+from etdecode.engine import ENGINES
+from etdecode.plot import HEATMAP_BINS, TRACK_POINTS, plot_heatmap, plot_moves, plot_paths, tracks
+
+# The monitor, matplotlib and scipy are imported by the commands that use them,
+# so short jobs only pay for what they run
+
+EXPORT_TABLES = ("player_actions",) + tuple(KIND_TABLES)
+EXPORT_FORMATS = ("csv", "jsonl")
+EXPORT_ROWS = 10000  # Rows fetched from SQLite at a time
+
+
+def _open_database(path):
+    # Reading commands never create an empty database by mistake
+    if not os.path.exists(path):
+        raise SystemExit(f"No database at {path}")
+    return ActionDatabase(path)
+
+
+def parse(options):
+    from etdecode.monitor import ETPlayerMonitor
+
+    cache = ParseCache(options.cache) if options.cache else None
+    monitor = ETPlayerMonitor(options.demo, engine=options.engine, ingest=options.ingest, pipeline=options.pipeline,
+                              database_file=options.database, cache=cache, profile_every=options.profile_every)
+    stats = monitor.parse_demo(options.start, options.end, follow=options.follow, idle_timeout=options.idle_timeout)
+    monitor.close(summary=options.summary)
+    if options.stats == "-":
+        print(stats.to_json())
+    elif options.stats:
+        stats.to_json(options.stats)
+    return 1 if stats.counters["errors"] else 0
+
+
+def summary(options):
+    database = _open_database(options.database)
+    try:
+        if options.totals or options.demo is not None:
+            totals = database.player_totals(options.demo)
+        else:
+            counts = database.action_counts()
+    finally:
+        database.close()
+    if options.totals or options.demo is not None:
+        print(f"{'player':<24} {'moves':>8} {'distance':>12} {'shots':>6} {'hits':>6} {'accuracy':>8} {'reloads':>7}")
+        for _, player_name, moves, distance, shots, hits, accuracy, reloads in totals:
+            accuracy = "-" if accuracy is None else f"{accuracy:.3f}"
+            print(f"{player_name:<24} {moves:>8} {distance:>12.0f} {shots:>6} {hits:>6} {accuracy:>8} {reloads:>7}")
+        return 0
+    for player_name, action, count in counts:
+        print(f"{player_name:<24} {action:<16} {count:>10}")
+    return 0
+
+
+def plot(options):
+    database = _open_database(options.database)
+    try:
+        if options.player is not None:
+            plot_moves(database.player_moves(options.player, options.demo), options.player, options.output)
+            return 0
+        extent = database.position_extent(options.demo)
+        if extent is None:
+            print("No position data available for visualization.")
+            return 1
+        if options.heatmap:
+            plot_heatmap(database.positions(demo_id=options.demo), extent, options.output, options.bins)
+        else:
+            paths = tracks(database.player_ids(options.demo), lambda player_id: database.player_moves(player_id, options.demo))
+            plot_paths(paths, options.output, options.points)
+    finally:
+        database.close()
+    return 0
+
+
+def export(options):
+    database = _open_database(options.database)
+    try:
+        query = f"SELECT * FROM {options.table}"
+        parameters = ()
+        if options.player is not None:
+            query += " WHERE player_id = ?"
+            parameters = (options.player,)
+        if options.table in KIND_TABLES:
+            query += " ORDER BY seq"
+        cursor = database.connection.execute(query, parameters)
+        names = [column[0] for column in cursor.description]
+        output = sys.stdout if options.output in (None, "-") else open(options.output, "w", newline="")
+        try:
+            if options.format == "csv":
+                writer = csv.writer(output)
+                writer.writerow(names)
+            for rows in iter(lambda: cursor.fetchmany(EXPORT_ROWS), []):
+                if options.format == "csv":
+                    writer.writerows(rows)
+                else:
+                    output.writelines(json.dumps(dict(zip(names, row))) + "\n" for row in rows)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+    finally:
+        database.close()
+    return 0
+
+
+def near(options):
+    database = _open_database(options.database)
+    try:
+        if options.hits:
+            for demo_id, timestamp, player_id, weapon, players in database.engagements(options.radius, options.window, options.demo):
+                nearby = " ".join(f"{other}@{distance:.0f}" for other, distance, _ in players)
+                print(f"{demo_id:>4} {timestamp:>10} {player_id:>4} {weapon:>4}  {nearby}")
+            return 0
+        if options.player is None or options.time is None:
+            raise SystemExit("near needs --player and --time, or --hits")
+        players = database.players_near(options.player, options.time, options.radius, options.window, options.demo)
+    finally:
+        database.close()
+    for player_id, distance, timestamp in players:
+        print(f"{player_id:>4} {distance:>10.1f} {timestamp:>10}")
+    return 0
+
+
+def aim(options):
+    ranked = analyze_demos(options.demos, options.workers, options.engine)
+    if options.json:
+        # NaN, a feature that couldn't be known, as null
+        rows = [{name: None if value != value else value for name, value in row.items()} for row in ranked]
+        text = json.dumps(rows, indent=2)
+        if options.json == "-":
+            print(text)
+            return 0
+        with open(options.json, "w") as file:
+            file.write(text)
+    print(f"{'score':>6} {'player':<16} {'shots':>6} {'snaps':>6} {'snap rate':>9} {'jerk ratio':>10} {'turn cv':>7}  demo")
+    for row in ranked[:options.top]:
+        print(f"{row['score']:6.2f} {row['player_name']:<16} {row['shots']:6d} {row['snaps']:6d} {row['snap_rate']:9.3f} "
+              f"{row['jerk_ratio']:10.1f} {row['turn_cv']:7.3f}  {os.path.basename(row['demo'])}")
+    return 0
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog="etdecode", description="Parse and inspect Enemy Territory demos.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log progress and parse statistics")
+    parser.add_argument("-q", "--quiet", action="store_true", help="log errors only")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("parse", help="parse a demo into the database")
+    command.add_argument("demo")
+    command.add_argument("-d", "--database", default=DATABASE_FILE)
+    command.add_argument("--engine", default="auto", choices=ENGINES)
+    command.add_argument("--ingest", default="safe", choices=INGEST_MODES)
+    command.add_argument("--pipeline", action="store_true", help="overlap reading, decoding and writing in threads")
+    command.add_argument("--start", type=int, help="server time (ms) to start at")
+    command.add_argument("--end", type=int, help="server time (ms) to stop after")
+    command.add_argument("--follow", action="store_true", help="keep reading a demo that is still being recorded")
+    command.add_argument("--idle-timeout", type=float, help="stop following after this many seconds without data")
+    command.add_argument("--cache", nargs="?", const=CACHE_DIR, metavar="DIR",
+                         help=f"reuse the events of demos parsed before (default directory: {CACHE_DIR})")
+    command.add_argument("--stats", metavar="PATH", help="write the parse statistics as JSON, - for stdout")
+    command.add_argument("--profile-every", type=int, default=0, metavar="N", help="profile one snapshot in N")
+    command.add_argument("--summary", action="store_true", help="print the action counts when done")
+    command.set_defaults(run=parse)
+
+    command = commands.add_parser("summary", help="print the action counts of every player")
+    command.add_argument("-d", "--database", default=DATABASE_FILE)
+    command.add_argument("--totals", action="store_true", help="print distance, shots, hits and accuracy per player instead")
+    command.add_argument("--demo", type=int, help="totals of this demo id only")
+    command.set_defaults(run=summary)
+
+    command = commands.add_parser("plot", help="plot movement from the database")
+    command.add_argument("-d", "--database", default=DATABASE_FILE)
+    command.add_argument("--player", type=int, help="plot this player's position over time instead of all paths")
+    command.add_argument("--heatmap", action="store_true", help="plot how often all players were where instead")
+    command.add_argument("--bins", type=int, default=HEATMAP_BINS, help="heatmap bins across the longer side of the map")
+    command.add_argument("--points", type=int, default=TRACK_POINTS, help="points kept of each player's path")
+    command.add_argument("-o", "--output", help="write the plot to this file instead of showing it")
+    command.add_argument("--demo", type=int, help="only this demo id, when the database holds several")
+    command.set_defaults(run=plot)
+
+    command = commands.add_parser("export", help="write a table of the database as CSV or JSON lines")
+    command.add_argument("-d", "--database", default=DATABASE_FILE)
+    command.add_argument("--table", default="player_actions", choices=EXPORT_TABLES)
+    command.add_argument("--format", default="csv", choices=EXPORT_FORMATS)
+    command.add_argument("--player", type=int, help="only this player's events")
+    command.add_argument("-o", "--output", help="file to write (default: stdout)")
+    command.set_defaults(run=export)
+
+    command = commands.add_parser("near", help="list the players near a player at a moment, or near every hit")
+    command.add_argument("-d", "--database", default=DATABASE_FILE)
+    command.add_argument("--player", type=int)
+    command.add_argument("--time", type=int, help="server time (ms)")
+    command.add_argument("--radius", type=float, default=500.0, help="distance in map units")
+    command.add_argument("--window", type=int, default=NEAR_WINDOW, help="ms around the moment to look at")
+    command.add_argument("--demo", type=int, help="demo id, when the database holds several")
+    command.add_argument("--hits", action="store_true", help="list the players near the shooter of every hit instead")
+    command.set_defaults(run=near)
+
+    command = commands.add_parser("aim", help="rank the players of many demos by aim anomaly score")
+    command.add_argument("demos", help="directory of .dm_84 files, or a glob pattern")
+    command.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    command.add_argument("--engine", default="auto", choices=ENGINES)
+    command.add_argument("--top", type=int, default=20, help="players to list")
+    command.add_argument("--json", metavar="PATH", help="write every ranked player as JSON, - for stdout")
+    command.set_defaults(run=aim)
+
+    options = parser.parse_args(args)
+    level = logging.ERROR if options.quiet else logging.INFO if options.verbose else logging.WARNING
+    logging.basicConfig(level=level, format="%(message)s")
+    try:
+        return options.run(options)
+    except BrokenPipeError:
+        # Output piped into something that stopped reading, like head
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,15 @@
+# Game constants the demos are read and written with
+
+# entityType_t and entity_event_t values from bg_public.h (2.60b)
+ET_PLAYER = 1
+ET_ITEM = 2
+ET_EVENTS = 62  # Temporary event entities have eType ET_EVENTS + event
+EV_FILL_CLIP = 35
+EV_FIRE_WEAPON = 40
+EV_FIRE_WEAPONB = 41
+EV_FIRE_WEAPON_LASTSHOT = 42
+EV_BULLET_HIT_FLESH = 57
+FIRE_EVENTS = (EV_FIRE_WEAPON, EV_FIRE_WEAPONB, EV_FIRE_WEAPON_LASTSHOT)
+EV_EVENT_BITS = 0x300  # Toggled on repeated events, not part of the event number
+MAX_EVENTS = 4  # Size of the events[] ring, indexed by eventSequence
+EVENT_SEQUENCE_MASK = 0xFF  # eventSequence is sent in 8 bits
@@ -0,0 +1,631 @@
+import logging
+import sqlite3
+import time
+
+import numpy as np
+
+from etdecode.events import ACTION_CODES, ACTIONS, column_list
+
+log = logging.getLogger(__name__)
+
+DATABASE_FILE = "player_data.db"
+POSITION_ROWS = 1 << 16  # Moves read at a time when streaming positions
+TRACK_MS = 1000  # Time span of one player's moves the spatial index keeps one box of
+NEAR_WINDOW = 250  # ms around a moment that players_near looks at
+
+# "safe" commits every flush with the default journal and fsync settings.
+# "bulk" loads with synchronous=OFF in WAL mode inside one transaction (or one
+# per commit_rows rows) and builds the indexes once the rows are in. finish()
+# puts the file back in the journal mode it had.
+INGEST_MODES = ("safe", "bulk")
+
+MOVE = ACTION_CODES["move"]
+AIM_CONSISTENCY = ACTION_CODES["aim_consistency"]
+FIRE = ACTION_CODES["fire"]
+HIT = ACTION_CODES["hit"]
+RELOAD = ACTION_CODES["reload"]
+
+# Per-kind tables, each with the columns it actually uses besides seq, demo_id,
+# player_id and timestamp. seq numbers the events in the order they were stored,
+# across all three tables.
+KIND_TABLES = {
+    "moves": ("pos_x REAL", "pos_y REAL", "pos_z REAL", "velocity REAL", "distance REAL"),
+    "aims": ("angle_x REAL", "angle_y REAL", "angle_z REAL"),
+    "weapon_events": ("action_id INTEGER NOT NULL", "weapon INTEGER", "accuracy REAL"),
+}
+
+# (name, table, columns). Without WITHOUT ROWID the tables are ordered by seq,
+# the player_time indexes serve the per-player lookups instead of the clustered
+# primary key. Moves and aims have a table of their own, the weapon events are
+# looked up by action. demo_seq finds what discard deletes of a demo.
+PLAYER_TIME = "player_id, timestamp"
+INDEXES = tuple((f"idx_{table}_player_time", table, PLAYER_TIME) for table in KIND_TABLES) + (
+    ("idx_weapon_events_action", "weapon_events", "action_id, timestamp"),
+) + tuple((f"idx_{table}_demo_seq", table, "demo_id, seq") for table in KIND_TABLES)
+
+# Keeps the old wide table readable, SELECT * still returns its 13 columns.
+# Rows come grouped by kind, not in storage order.
+PLAYER_ACTIONS_VIEW = """
+    CREATE VIEW IF NOT EXISTS player_actions AS
+    SELECT m.timestamp, m.player_id, p.player_name, 'move' AS action, NULL AS weapon,
+           m.pos_x, m.pos_y, m.pos_z, NULL AS angle_x, NULL AS angle_y, NULL AS angle_z,
+           m.velocity, NULL AS accuracy
+    FROM moves m JOIN players p ON p.player_id = m.player_id
+    UNION ALL
+    SELECT a.timestamp, a.player_id, p.player_name, 'aim_consistency', NULL,
+           NULL, NULL, NULL, a.angle_x, a.angle_y, a.angle_z,
+           NULL, NULL
+    FROM aims a JOIN players p ON p.player_id = a.player_id
+    UNION ALL
+    SELECT w.timestamp, w.player_id, p.player_name, k.action, w.weapon,
+           NULL, NULL, NULL, NULL, NULL, NULL,
+           NULL, w.accuracy
+    FROM weapon_events w JOIN players p ON p.player_id = w.player_id JOIN actions k ON k.action_id = w.action_id
+"""
+
+# Totals per demo and player, and per demo, player and weapon, kept up to date
+# with every insert. Summaries read these instead of the events.
+STATS_TABLES = {
+    "player_stats": (("demo_id", "player_id"), ("moves INTEGER NOT NULL DEFAULT 0", "aims INTEGER NOT NULL DEFAULT 0",
+                                                "distance REAL NOT NULL DEFAULT 0")),
+    "weapon_stats": (("demo_id", "player_id", "weapon"), ("shots INTEGER NOT NULL DEFAULT 0",
+                                                          "hits INTEGER NOT NULL DEFAULT 0",
+                                                          "reloads INTEGER NOT NULL DEFAULT 0")),
+}
+
+# R*Tree of the bounding boxes of every player's moves, one per demo, player and
+# TRACK_MS bucket of time. Boxes are stored as 32-bit floats rounded outwards, so
+# they only pick the candidate buckets, the moves themselves are checked exactly.
+MOVE_TRACKS = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS move_tracks USING rtree(
+        id, min_t, max_t, min_x, max_x, min_y, max_y, min_z, max_z,
+        +demo_id INTEGER, +player_id INTEGER, +bucket INTEGER
+    )
+"""
+TRACK_COLUMNS = ("min_t", "max_t", "min_x", "max_x", "min_y", "max_y", "min_z", "max_z", "demo_id", "player_id", "bucket")
+
+# Moves inside a box of space and time. The candidate buckets come first, CROSS
+# JOIN keeps that order so each one is a range lookup on (player_id, timestamp).
+BOX_MOVES = """
+    SELECT m.demo_id, m.player_id, m.timestamp, m.pos_x, m.pos_y, m.pos_z
+    FROM (SELECT DISTINCT demo_id, player_id, bucket FROM move_tracks
+          WHERE max_t >= :start AND min_t <= :end AND max_x >= :x_min AND min_x <= :x_max
+            AND max_y >= :y_min AND min_y <= :y_max AND max_z >= :z_min AND min_z <= :z_max {tracks}) t
+    CROSS JOIN moves m ON m.player_id = t.player_id AND m.timestamp >= t.bucket * {track_ms}
+                          AND m.timestamp < (t.bucket + 1) * {track_ms} AND m.demo_id = t.demo_id
+    WHERE {moves}
+    ORDER BY m.timestamp, m.seq
+"""
+# The same without the index, for SQLite built without the R*Tree module
+SCAN_MOVES = """
+    SELECT m.demo_id, m.player_id, m.timestamp, m.pos_x, m.pos_y, m.pos_z FROM moves m
+    WHERE {moves}
+    ORDER BY m.timestamp, m.seq
+"""
+BOX_WHERE = """m.timestamp BETWEEN :start AND :end AND m.pos_x BETWEEN :x_min AND :x_max
+               AND m.pos_y BETWEEN :y_min AND :y_max AND m.pos_z BETWEEN :z_min AND :z_max"""
+
+# Same rows as counting the events, grouped by player name and action, over
+# the demos selected by {where}
+ACTION_COUNTS = """
+    SELECT p.player_name, c.action, c.count FROM (
+        SELECT player_id, 'move' AS action, SUM(moves) AS count FROM player_stats {where} GROUP BY player_id
+        UNION ALL
+        SELECT player_id, 'aim_consistency', SUM(aims) FROM player_stats {where} GROUP BY player_id
+        UNION ALL
+        SELECT player_id, 'fire', SUM(shots) FROM weapon_stats {where} GROUP BY player_id
+        UNION ALL
+        SELECT player_id, 'hit', SUM(hits) FROM weapon_stats {where} GROUP BY player_id
+        UNION ALL
+        SELECT player_id, 'reload', SUM(reloads) FROM weapon_stats {where} GROUP BY player_id
+    ) c JOIN players p ON p.player_id = c.player_id
+    WHERE c.count > 0
+    ORDER BY p.player_name, c.action
+"""
+
+# One row per player over the demos selected by {where}
+PLAYER_TOTALS = """
+    SELECT p.player_id, p.player_name, COALESCE(m.moves, 0), COALESCE(m.distance, 0.0),
+           COALESCE(w.shots, 0), COALESCE(w.hits, 0), CAST(w.hits AS REAL) / NULLIF(w.shots, 0), COALESCE(w.reloads, 0)
+    FROM players p
+    LEFT JOIN (SELECT player_id, SUM(moves) AS moves, SUM(distance) AS distance
+               FROM player_stats {where} GROUP BY player_id) m ON m.player_id = p.player_id
+    LEFT JOIN (SELECT player_id, SUM(shots) AS shots, SUM(hits) AS hits, SUM(reloads) AS reloads
+               FROM weapon_stats {where} GROUP BY player_id) w ON w.player_id = p.player_id
+    WHERE m.player_id IS NOT NULL OR w.player_id IS NOT NULL
+    ORDER BY p.player_id
+"""
+
+WEAPON_TOTALS = """
+    SELECT p.player_id, p.player_name, s.weapon, SUM(s.shots), SUM(s.hits),
+           CAST(SUM(s.hits) AS REAL) / NULLIF(SUM(s.shots), 0), SUM(s.reloads)
+    FROM weapon_stats s JOIN players p ON p.player_id = s.player_id
+    {where}
+    GROUP BY s.player_id, s.weapon
+    ORDER BY s.player_id, s.weapon
+"""
+
+
+def _column_names(table):
+    return ("seq", "demo_id", "player_id", "timestamp") + tuple(column.split()[0] for column in KIND_TABLES[table])
+
+
+class ActionDatabase:
+    """SQLite storage for player events, in safe or bulk ingest mode.
+
+    Players and actions are small integer coded dimension tables, the events
+    go to one table per kind. without_rowid clusters those tables on
+    (player_id, timestamp) so per-player reads touch contiguous pages.
+    """
+
+    def __init__(self, path=DATABASE_FILE, mode="safe", commit_rows=None, without_rowid=False):
+        if mode not in INGEST_MODES:
+            raise ValueError(f"Unknown ingest mode: {mode!r} (expected one of {', '.join(INGEST_MODES)})")
+        self.path = path
+        self.mode = mode
+        self.commit_rows = commit_rows  # Bulk mode only, None keeps one transaction per demo
+        self.without_rowid = without_rowid
+        self.rows = 0
+        self.seconds = 0.0  # Spent inserting, committing and indexing
+        self._uncommitted = 0
+        self._players = set()
+        # Used from the pipeline's writer thread, one thread at a time
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self._initialize()
+
+    def _initialize(self):
+        # Setup SQLite database for persistent storage of parsed data
+        cursor = self.connection.cursor()
+        if self.mode == "bulk":
+            self._journal_mode = cursor.execute("PRAGMA journal_mode").fetchone()[0]
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=OFF")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("CREATE TABLE IF NOT EXISTS players (player_id INTEGER PRIMARY KEY, player_name TEXT NOT NULL)")
+        cursor.execute("CREATE TABLE IF NOT EXISTS actions (action_id INTEGER PRIMARY KEY, action TEXT NOT NULL UNIQUE)")
+        cursor.executemany("INSERT OR IGNORE INTO actions VALUES (?, ?)", enumerate(ACTIONS))
+        for table, columns in KIND_TABLES.items():
+            if self.without_rowid:
+                cursor.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        player_id INTEGER NOT NULL, timestamp INTEGER NOT NULL, seq INTEGER NOT NULL,
+                        demo_id INTEGER NOT NULL DEFAULT 0, {", ".join(columns)},
+                        PRIMARY KEY (player_id, timestamp, seq)
+                    ) WITHOUT ROWID
+                """)
+            else:
+                cursor.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        seq INTEGER PRIMARY KEY, demo_id INTEGER NOT NULL DEFAULT 0,
+                        player_id INTEGER NOT NULL, timestamp INTEGER NOT NULL, {", ".join(columns)}
+                    )
+                """)
+            # Tables from before demo ids and move distances were recorded
+            present = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})")]
+            for column in ("demo_id INTEGER NOT NULL DEFAULT 0",) + columns:
+                if column.split()[0] not in present:
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+        cursor.execute("CREATE TABLE IF NOT EXISTS demos (demo_id INTEGER PRIMARY KEY, path TEXT NOT NULL)")
+        self._migrate(cursor)
+        found = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table, (key, columns) in STATS_TABLES.items():
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    {", ".join(f"{name} INTEGER NOT NULL" for name in key)}, {", ".join(columns)},
+                    PRIMARY KEY ({", ".join(key)})
+                ) WITHOUT ROWID
+            """)
+        if not found.issuperset(STATS_TABLES):
+            # Totals of the events stored before they were kept
+            self._rebuild_stats(cursor)
+        try:
+            cursor.execute(MOVE_TRACKS)
+            self.tracked = True
+        except sqlite3.OperationalError as e:
+            log.warning("No spatial index, proximity queries will scan the moves: %s", e)
+            self.tracked = False
+        if self.tracked and "move_tracks" not in found:
+            self._rebuild_tracks(cursor)
+        cursor.execute(PLAYER_ACTIONS_VIEW)
+        if self.mode == "bulk":
+            # Maintaining indexes row by row is what makes a load slow, rebuild them at the end
+            for name, _, _ in INDEXES:
+                cursor.execute(f"DROP INDEX IF EXISTS {name}")
+        else:
+            self._create_indexes(cursor)
+        self.connection.commit()
+
+        self._players = {row[0] for row in cursor.execute("SELECT player_id FROM players")}
+        self.next_seq = 1 + max(cursor.execute(f"SELECT COALESCE(MAX(seq), 0) FROM {table}").fetchone()[0]
+                                for table in KIND_TABLES)
+
+    def _create_indexes(self, cursor):
+        for name, table, columns in INDEXES:
+            # A WITHOUT ROWID table is already ordered by (player_id, timestamp)
+            clustered = cursor.execute("SELECT sql LIKE '%WITHOUT ROWID%' FROM sqlite_master WHERE name = ?", (table,)).fetchone()[0]
+            if not (clustered and columns == PLAYER_TIME):
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+    def _migrate(self, cursor):
+        # Move the rows of a wide player_actions table from older versions into the new tables
+        found = cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'player_actions'").fetchone()
+        if not found:
+            return
+        log.info("Migrating player_actions to the normalized schema")
+        cursor.execute("INSERT OR IGNORE INTO players SELECT player_id, MIN(player_name) FROM player_actions GROUP BY player_id")
+        cursor.execute("INSERT OR IGNORE INTO actions (action) SELECT DISTINCT action FROM player_actions")
+        cursor.execute("""
+            INSERT INTO moves (seq, player_id, timestamp, pos_x, pos_y, pos_z, velocity)
+            SELECT rowid, player_id, timestamp, pos_x, pos_y, pos_z, velocity FROM player_actions WHERE action = 'move'
+        """)
+        cursor.execute("""
+            INSERT INTO aims (seq, player_id, timestamp, angle_x, angle_y, angle_z)
+            SELECT rowid, player_id, timestamp, angle_x, angle_y, angle_z FROM player_actions WHERE action = 'aim_consistency'
+        """)
+        cursor.execute("""
+            INSERT INTO weapon_events (seq, player_id, timestamp, action_id, weapon, accuracy)
+            SELECT a.rowid, a.player_id, a.timestamp, k.action_id, a.weapon, a.accuracy
+            FROM player_actions a JOIN actions k ON k.action = a.action
+            WHERE a.action NOT IN ('move', 'aim_consistency')
+        """)
+        cursor.execute("DROP TABLE player_actions")
+
+    def _rebuild_stats(self, cursor, demo_id=None):
+        # Recount the totals of one demo, or of all of them, from the events
+        where = "" if demo_id is None else "WHERE demo_id = ?"
+        parameters = () if demo_id is None else (demo_id,)
+        for table in STATS_TABLES:
+            cursor.execute(f"DELETE FROM {table} {where}", parameters)
+        cursor.execute(f"""
+            INSERT INTO player_stats (demo_id, player_id, moves, aims, distance)
+            SELECT demo_id, player_id, SUM(moves), SUM(aims), SUM(distance) FROM (
+                SELECT demo_id, player_id, COUNT(*) AS moves, 0 AS aims, TOTAL(distance) AS distance
+                FROM moves {where} GROUP BY demo_id, player_id
+                UNION ALL
+                SELECT demo_id, player_id, 0, COUNT(*), 0.0 FROM aims {where} GROUP BY demo_id, player_id
+            ) GROUP BY demo_id, player_id
+        """, parameters * 2)
+        cursor.execute(f"""
+            INSERT INTO weapon_stats (demo_id, player_id, weapon, shots, hits, reloads)
+            SELECT demo_id, player_id, COALESCE(weapon, 0), SUM(action_id = ?), SUM(action_id = ?), SUM(action_id = ?)
+            FROM weapon_events {where}
+            GROUP BY demo_id, player_id, COALESCE(weapon, 0)
+        """, (FIRE, HIT, RELOAD) + parameters)
+
+    def _rebuild_tracks(self, cursor, demo_id=None):
+        # Recompute the spatial index of one demo, or of all of them, from the moves
+        where = "" if demo_id is None else "WHERE demo_id = ?"
+        parameters = () if demo_id is None else (demo_id,)
+        cursor.execute(f"DELETE FROM move_tracks {where}", parameters)
+        cursor.execute(f"""
+            INSERT INTO move_tracks ({", ".join(TRACK_COLUMNS)})
+            SELECT MIN(timestamp), MAX(timestamp), MIN(pos_x), MAX(pos_x), MIN(pos_y), MAX(pos_y), MIN(pos_z), MAX(pos_z),
+                   demo_id, player_id, timestamp / {TRACK_MS}
+            FROM moves {where}
+            GROUP BY demo_id, player_id, timestamp / {TRACK_MS}
+        """, parameters)
+
+    def _add_tracks(self, columns, rows, demo_id):
+        # Add the boxes of the moves selected by rows to the spatial index. A bucket
+        # split across two batches gets two boxes, the queries don't mind.
+        player_id = columns["player_id"][rows].astype(np.int64)
+        bucket = columns["timestamp"][rows].astype(np.int64) // TRACK_MS
+        order = np.lexsort((bucket, player_id))
+        player_id, bucket = player_id[order], bucket[order]
+        starts = np.flatnonzero(np.r_[True, (player_id[1:] != player_id[:-1]) | (bucket[1:] != bucket[:-1])])
+        bounds = []
+        for name in ("timestamp", "pos_x", "pos_y", "pos_z"):
+            values = columns[name][rows][order].astype(np.float64)
+            bounds += [np.minimum.reduceat(values, starts).tolist(), np.maximum.reduceat(values, starts).tolist()]
+        self.connection.executemany(
+            f"INSERT INTO move_tracks ({', '.join(TRACK_COLUMNS)}) VALUES ({', '.join('?' * len(TRACK_COLUMNS))})",
+            zip(*bounds, [demo_id] * len(starts), player_id[starts].tolist(), bucket[starts].tolist()))
+
+    def _add_stats(self, columns, demo_id):
+        # Add the totals of a batch of events to the stats tables
+        kind = columns["kind"]
+        player_id = columns["player_id"].astype(np.int64)
+        players, groups = np.unique(player_id, return_inverse=True)
+        moves = kind == MOVE
+        distance = np.where(moves & columns["distance_valid"], columns["distance"], 0.0)
+        player_rows = zip([demo_id] * len(players), players.tolist(),
+                          np.bincount(groups, moves, len(players)).astype(np.int64).tolist(),
+                          np.bincount(groups, kind == AIM_CONSISTENCY, len(players)).astype(np.int64).tolist(),
+                          np.bincount(groups, distance, len(players)).tolist())
+        self.connection.executemany("""
+            INSERT INTO player_stats (demo_id, player_id, moves, aims, distance) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT DO UPDATE SET moves = moves + excluded.moves, aims = aims + excluded.aims,
+                                      distance = distance + excluded.distance
+        """, player_rows)
+
+        rows = (kind == FIRE) | (kind == HIT) | (kind == RELOAD)
+        if not rows.any():
+            return
+        weapon = np.where(columns["weapon_valid"][rows], columns["weapon"][rows], 0).astype(np.int64)
+        keys, groups = np.unique(np.stack([player_id[rows], weapon], axis=1), axis=0, return_inverse=True)
+        groups = groups.reshape(-1)
+        counts = [np.bincount(groups, kind[rows] == code, len(keys)).astype(np.int64).tolist() for code in (FIRE, HIT, RELOAD)]
+        self.connection.executemany("""
+            INSERT INTO weapon_stats (demo_id, player_id, weapon, shots, hits, reloads) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT DO UPDATE SET shots = shots + excluded.shots, hits = hits + excluded.hits,
+                                      reloads = reloads + excluded.reloads
+        """, zip([demo_id] * len(keys), keys[:, 0].tolist(), keys[:, 1].tolist(), *counts))
+
+    def register_demo(self, path, demo_id=None):
+        # The id the events of a demo are tagged with. Without an explicit id the
+        # demo keeps the id it got before, or gets the next free one.
+        if demo_id is None:
+            row = self.connection.execute("SELECT demo_id FROM demos WHERE path = ?", (path,)).fetchone()
+            if row:
+                return row[0]
+            demo_id = self.next_demo_id()
+        self.connection.execute("INSERT OR REPLACE INTO demos VALUES (?, ?)", (demo_id, path))
+        self.connection.commit()
+        return demo_id
+
+    def next_demo_id(self):
+        return self.connection.execute("SELECT COALESCE(MAX(demo_id), 0) + 1 FROM demos").fetchone()[0]
+
+    def insert_events(self, columns, player_name, demo_id=0):
+        # columns as EventBuffer.columns() returns them. player_name maps a player id
+        # to the name stored the first time the player is seen.
+        start = time.perf_counter()
+        connection = self.connection
+        count = len(columns["timestamp"])
+        seq = np.arange(self.next_seq, self.next_seq + count)
+        self.next_seq += count
+
+        players = set(np.unique(columns["player_id"]).tolist()) - self._players
+        if players:
+            connection.executemany("INSERT OR IGNORE INTO players VALUES (?, ?)",
+                                   [(player_id, player_name(player_id)) for player_id in sorted(players)])
+            self._players |= players
+
+        kind = columns["kind"]
+        for table, rows, fields in (
+                ("moves", kind == MOVE, ("pos_x", "pos_y", "pos_z", "velocity", "distance")),
+                ("aims", kind == AIM_CONSISTENCY, ("angle_x", "angle_y", "angle_z")),
+                ("weapon_events", (kind != MOVE) & (kind != AIM_CONSISTENCY), ("kind", "weapon", "accuracy"))):
+            if not rows.any():
+                continue
+            values = [seq[rows].tolist(), [demo_id] * int(rows.sum()),
+                      column_list(columns, "player_id", rows), column_list(columns, "timestamp", rows)]
+            values += [column_list(columns, name, rows) for name in fields]
+            names = _column_names(table)
+            connection.executemany(f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})", zip(*values))
+        # In the same transaction as the events, so the totals and the index never
+        # count a batch that wasn't stored
+        self._add_stats(columns, demo_id)
+        if self.tracked and (kind == MOVE).any():
+            self._add_tracks(columns, kind == MOVE, demo_id)
+
+        self.rows += count
+        self._uncommitted += count
+        if self.mode != "bulk" or (self.commit_rows and self._uncommitted >= self.commit_rows):
+            connection.commit()
+            self._uncommitted = 0
+        self.seconds += time.perf_counter() - start
+
+    def commit(self):
+        self.connection.commit()
+        self._uncommitted = 0
+
+    def discard(self, demo_id, from_seq=0, start_time=None, end_time=None):
+        # Delete the events of a demo stored from seq number from_seq on, only
+        # those between start_time and end_time (inclusive) when given
+        if not self.has_events(demo_id):
+            # A new demo, the usual case, has nothing to delete or recount
+            return
+        where, parameters = "demo_id = ? AND seq >= ?", (demo_id, from_seq)
+        if start_time is not None:
+            where, parameters = where + " AND timestamp >= ?", parameters + (start_time,)
+        if end_time is not None:
+            where, parameters = where + " AND timestamp <= ?", parameters + (end_time,)
+        for table in KIND_TABLES:
+            self.connection.execute(f"DELETE FROM {table} WHERE {where}", parameters)
+        cursor = self.connection.cursor()
+        self._rebuild_stats(cursor, demo_id)
+        if self.tracked:
+            self._rebuild_tracks(cursor, demo_id)
+        self.commit()
+
+    def has_events(self, demo_id):
+        # Every stored event is counted in the stats tables, which are keyed by demo first
+        return any(self.connection.execute(f"SELECT 1 FROM {table} WHERE demo_id = ? LIMIT 1", (demo_id,)).fetchone()
+                   for table in STATS_TABLES)
+
+    def merge(self, shard_path):
+        # Copy everything in another database of this schema into this one, with the
+        # seq numbers moved behind the ones already here
+        start = time.perf_counter()
+        connection = self.connection
+        connection.commit()
+        connection.execute("ATTACH DATABASE ? AS shard", (shard_path,))
+        try:
+            offset = self.next_seq - 1
+            connection.execute("INSERT OR IGNORE INTO players SELECT player_id, player_name FROM shard.players")
+            connection.execute("INSERT OR IGNORE INTO actions SELECT action_id, action FROM shard.actions")
+            connection.execute("INSERT OR REPLACE INTO demos SELECT demo_id, path FROM shard.demos")
+            rows = 0
+            for table in KIND_TABLES:
+                names = ", ".join(_column_names(table))
+                copied = ", ".join(_column_names(table)[1:])
+                cursor = connection.execute(f"INSERT INTO main.{table} ({names}) SELECT seq + ?, {copied} FROM shard.{table}", (offset,))
+                rows += cursor.rowcount
+                last = connection.execute(f"SELECT COALESCE(MAX(seq), 0) FROM shard.{table}").fetchone()[0]
+                self.next_seq = max(self.next_seq, offset + last + 1)
+            for table, (key, columns) in STATS_TABLES.items():
+                names = key + tuple(column.split()[0] for column in columns)
+                totals = ", ".join(f"{name} = {name} + excluded.{name}" for name in names[len(key):])
+                # WHERE true tells the parser the ON CONFLICT belongs to the INSERT, not a join
+                connection.execute(f"""
+                    INSERT INTO main.{table} ({", ".join(names)}) SELECT {", ".join(names)} FROM shard.{table} WHERE true
+                    ON CONFLICT DO UPDATE SET {totals}
+                """)
+            if self.tracked:
+                shard_tracked = connection.execute("SELECT 1 FROM shard.sqlite_master WHERE name = 'move_tracks'").fetchone()
+                if shard_tracked:
+                    # New ids, the shard's collide with the ones here
+                    names = ", ".join(TRACK_COLUMNS)
+                    connection.execute(f"INSERT INTO main.move_tracks ({names}) SELECT {names} FROM shard.move_tracks")
+                else:
+                    self._rebuild_tracks(connection.cursor())
+            connection.commit()
+        finally:
+            connection.execute("DETACH DATABASE shard")
+        self._players = {row[0] for row in connection.execute("SELECT player_id FROM players")}
+        self.rows += rows
+        self.seconds += time.perf_counter() - start
+        return rows
+
+    def finish(self):
+        # Commit what is left and build the deferred indexes, then report the ingest rate
+        start = time.perf_counter()
+        self.commit()
+        if self.mode == "bulk":
+            cursor = self.connection.cursor()
+            self._create_indexes(cursor)
+            self.connection.commit()
+            cursor.execute("PRAGMA synchronous=FULL")
+            # Otherwise the file stays in WAL mode, with -wal and -shm files next to it
+            cursor.execute(f"PRAGMA journal_mode={self._journal_mode}")
+        self.seconds += time.perf_counter() - start
+        if self.rows:
+            rate = self.rows / self.seconds if self.seconds > 0 else 0
+            log.info("Stored %d actions in %.2fs (%.0f rows/s, %s ingest)", self.rows, self.seconds, rate, self.mode)
+
+    def action_counts(self, demo_id=None):
+        # (player_name, action, count) for every player and action over all demos
+        # or one, from the stats tables
+        where, parameters = ("", ()) if demo_id is None else ("WHERE demo_id = ?", (demo_id,) * 5)
+        return self.connection.execute(ACTION_COUNTS.format(where=where), parameters).fetchall()
+
+    def player_totals(self, demo_id=None):
+        # (player_id, player_name, moves, distance, shots, hits, accuracy, reloads) of
+        # every player over all demos or one. accuracy is None without shots.
+        where, parameters = ("", ()) if demo_id is None else ("WHERE demo_id = ?", (demo_id, demo_id))
+        return self.connection.execute(PLAYER_TOTALS.format(where=where), parameters).fetchall()
+
+    def weapon_totals(self, demo_id=None):
+        # (player_id, player_name, weapon, shots, hits, accuracy, reloads) of every
+        # player and weapon over all demos or one
+        where, parameters = ("", ()) if demo_id is None else ("WHERE s.demo_id = ?", (demo_id,))
+        return self.connection.execute(WEAPON_TOTALS.format(where=where), parameters).fetchall()
+
+    # The move queries cover every demo in the database, or only demo_id's
+
+    def player_moves(self, player_id, demo_id=None):
+        # (timestamp, pos_x, pos_y, pos_z) of one player in time order
+        query = "SELECT timestamp, pos_x, pos_y, pos_z FROM moves WHERE player_id = ?"
+        parameters = (player_id,)
+        if demo_id is not None:
+            query += " AND demo_id = ?"
+            parameters += (demo_id,)
+        return self.connection.execute(query + " ORDER BY timestamp, seq", parameters).fetchall()
+
+    def player_ids(self, demo_id=None):
+        # Players with moves, in id order
+        where, parameters = ("", ()) if demo_id is None else ("AND demo_id = ?", (demo_id,))
+        return [row[0] for row in self.connection.execute(
+            f"SELECT DISTINCT player_id FROM player_stats WHERE moves > 0 {where} ORDER BY player_id", parameters)]
+
+    def position_extent(self, demo_id=None):
+        # ((min x, max x), (min y, max y)) of the moves, None without any
+        where, parameters = ("", ()) if demo_id is None else ("WHERE demo_id = ?", (demo_id,))
+        x_min, x_max, y_min, y_max = self.connection.execute(
+            f"SELECT MIN(pos_x), MAX(pos_x), MIN(pos_y), MAX(pos_y) FROM moves {where}", parameters).fetchone()
+        return None if x_min is None else ((x_min, x_max), (y_min, y_max))
+
+    def positions(self, batch_rows=POSITION_ROWS, demo_id=None):
+        # (x positions, y positions) of the moves, batch_rows at a time in storage order
+        where, parameters = ("", ()) if demo_id is None else ("WHERE demo_id = ?", (demo_id,))
+        cursor = self.connection.execute(f"SELECT pos_x, pos_y FROM moves {where}", parameters)
+        for rows in iter(lambda: cursor.fetchmany(batch_rows), []):
+            rows = np.array(rows, dtype=np.float64)
+            yield rows[:, 0], rows[:, 1]
+
+    def moves_in_box(self, x_range, y_range, z_range=None, start=None, end=None, demo_id=None):
+        """Moves inside a box of the map over a time range, in time order.
+
+        Ranges are (low, high) and inclusive, a missing z range or time
+        bound leaves that side open. Rows are (demo_id, player_id,
+        timestamp, pos_x, pos_y, pos_z).
+        """
+        return self._moves_in(x_range, y_range, z_range, start, end, demo_id)
+
+    def moves_near(self, position, radius, start=None, end=None, demo_id=None):
+        # Moves within radius of an (x, y, z) position over a time range, rows
+        # as moves_in_box returns them
+        x, y, z = position
+        return self._moves_in((x - radius, x + radius), (y - radius, y + radius), (z - radius, z + radius), start, end,
+                              demo_id, "(m.pos_x - :x) * (m.pos_x - :x) + (m.pos_y - :y) * (m.pos_y - :y) + "
+                                       "(m.pos_z - :z) * (m.pos_z - :z) <= :radius * :radius",
+                              {"x": x, "y": y, "z": z, "radius": radius})
+
+    def _moves_in(self, x_range, y_range, z_range, start, end, demo_id, condition=None, parameters=None):
+        if z_range is None:
+            z_range = (-np.inf, np.inf)
+        parameters = dict(parameters or {}, start=-np.inf if start is None else start, end=np.inf if end is None else end,
+                          x_min=x_range[0], x_max=x_range[1], y_min=y_range[0], y_max=y_range[1],
+                          z_min=z_range[0], z_max=z_range[1], demo_id=demo_id)
+        moves = BOX_WHERE
+        if demo_id is not None:
+            moves += " AND m.demo_id = :demo_id"
+        if condition:
+            moves += f" AND {condition}"
+        if self.tracked:
+            query = BOX_MOVES.format(tracks="" if demo_id is None else "AND demo_id = :demo_id", track_ms=TRACK_MS, moves=moves)
+        else:
+            query = SCAN_MOVES.format(moves=moves)
+        return self.connection.execute(query, parameters).fetchall()
+
+    def player_position(self, player_id, timestamp, window=NEAR_WINDOW, demo_id=None):
+        # (demo_id, timestamp, pos_x, pos_y, pos_z) of the player's move closest to
+        # timestamp and at most window ms from it, None without one
+        query = """
+            SELECT demo_id, timestamp, pos_x, pos_y, pos_z FROM moves
+            WHERE player_id = ? AND timestamp BETWEEN ? AND ? {demo}
+            ORDER BY ABS(timestamp - ?), seq LIMIT 1
+        """
+        parameters = (player_id, timestamp - window, timestamp + window)
+        if demo_id is not None:
+            parameters += (demo_id,)
+        return self.connection.execute(query.format(demo="" if demo_id is None else "AND demo_id = ?"),
+                                       parameters + (timestamp,)).fetchone()
+
+    def players_near(self, player_id, timestamp, radius, window=NEAR_WINDOW, demo_id=None):
+        """Players within radius of where a player was at a moment.
+
+        The player's position is their move closest to timestamp. Every
+        other player of the same demo with a move within radius of it and
+        window ms of timestamp is returned once, as (player_id, distance,
+        timestamp) of their closest such move, nearest first. Empty when
+        the player has no move that close to timestamp.
+        """
+        found = self.player_position(player_id, timestamp, window, demo_id)
+        if found is None:
+            return []
+        demo_id, _, x, y, z = found
+        closest = {}
+        for _, other, time, pos_x, pos_y, pos_z in self.moves_near((x, y, z), radius, timestamp - window,
+                                                                    timestamp + window, demo_id):
+            if other == player_id:
+                continue
+            distance = float(np.sqrt((pos_x - x) ** 2 + (pos_y - y) ** 2 + (pos_z - z) ** 2))
+            if other not in closest or distance < closest[other][1]:
+                closest[other] = (other, distance, time)
+        return sorted(closest.values(), key=lambda row: row[1])
+
+    def engagements(self, radius, window=NEAR_WINDOW, demo_id=None):
+        # (demo_id, timestamp, player_id, weapon, players_near of the player) of
+        # every hit, in time order
+        query = "SELECT demo_id, timestamp, player_id, weapon FROM weapon_events WHERE action_id = ?"
+        parameters = (HIT,)
+        if demo_id is not None:
+            query += " AND demo_id = ?"
+            parameters += (demo_id,)
+        for hit_demo, timestamp, player_id, weapon in self.connection.execute(query + " ORDER BY timestamp, seq", parameters).fetchall():
+            yield hit_demo, timestamp, player_id, weapon, self.players_near(player_id, timestamp, radius, window, hit_demo)
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,122 @@
+import mmap
+import os
+import struct
+import time
+from collections import namedtuple
+
+MAX_MSGLEN = 32768  # Largest message the client will accept (qcommon.h)
+FOLLOW_POLL = 0.5  # Seconds between looks for new frames at the end of a growing demo
+
+# Every demo message is stored as: int32 serverMessageSequence, int32 length, length bytes
+FRAME_HEADER = struct.Struct("<ii")
+
+DemoMessage = namedtuple("DemoMessage", ["sequence", "offset", "data"])
+
+
+class DemoReader:
+    """Memory-mapped reader yielding one framed message at a time.
+
+    The data of each DemoMessage is a memoryview into the mapping, so no bytes
+    are copied until a decoder asks for them.
+    """
+
+    def __init__(self, demo_file):
+        self.demo_file = demo_file
+        self.size = 0
+        self.offset = 0  # Where the next frame starts, or where reading stopped
+        self.truncated = False  # The file ended in the middle of a frame
+        self.malformed = False  # A frame header had an impossible length
+        self.completed = False  # The -1 end of demo marker was reached
+        self._file = None
+        self._mmap = None
+        self._view = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        self._file = open(self.demo_file, "rb")
+        self.size = self._file.seek(0, 2)
+        if self.size:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mmap)
+        else:
+            # An empty file can't be mapped
+            self._view = memoryview(b"")
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Messages handed out are still alive, the mapping goes away with them
+                pass
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __iter__(self):
+        return self.messages()
+
+    def messages(self, offset=0):
+        if self._view is None:
+            self.open()
+        view = self._view
+        size = self.size
+        unpack_from = FRAME_HEADER.unpack_from
+        header_size = FRAME_HEADER.size
+
+        while offset < size:
+            self.offset = offset
+            if offset + header_size > size:
+                self.truncated = True
+                return
+            sequence, length = unpack_from(view, offset)
+            if length == -1:
+                self.completed = True
+                return
+            if length < 0 or length > MAX_MSGLEN:
+                self.malformed = True
+                return
+            start = offset + header_size
+            end = start + length
+            if end > size:
+                self.truncated = True
+                return
+            yield DemoMessage(sequence, offset, view[start:end])
+            offset = end
+        self.offset = offset
+
+    def follow(self, offset=0, poll=FOLLOW_POLL, idle_timeout=None):
+        # messages() for a demo that is still being recorded. At the end of the file
+        # it waits for the next complete frame, yielding None after every poll so the
+        # caller can do other work. Stops at the end of demo marker, at a malformed
+        # frame, or once nothing new arrived for idle_timeout seconds.
+        idle_since = None
+        while True:
+            for message in self.messages(offset):
+                idle_since = None
+                yield message
+            offset = self.offset
+            if self.completed or self.malformed:
+                return
+            now = time.monotonic()
+            if idle_since is None:
+                idle_since = now
+            elif idle_timeout is not None and now - idle_since >= idle_timeout:
+                return
+            time.sleep(poll)
+            yield None
+            if os.path.getsize(self.demo_file) > self.size:
+                # Map the file again to see the new frames
+                self.close()
+                self.open()
+                self.truncated = False
@@ -0,0 +1,24 @@
+import logging
+
+log = logging.getLogger(__name__)
+
+ENGINES = ("auto", "native", "python")
+
+
+def create_decoder(engine="auto"):
+    # "auto" prefers huffman.so and falls back to the pure Python reader when the
+    # library can't be found or loaded on this host
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown decoder engine: {engine!r} (expected one of {', '.join(ENGINES)})")
+
+    if engine in ("auto", "native"):
+        try:
+            from etdecode.native import NativeDecoder
+            return NativeDecoder()
+        except OSError as e:
+            if engine == "native":
+                raise
+            log.warning("huffman library unavailable, using the Python decoder: %s", e)
+
+    from etdecode.msg import PythonDecoder
+    return PythonDecoder()
@@ -0,0 +1,157 @@
+import numpy as np
+
+# Event kinds, stored as a small code instead of the action string
+ACTIONS = ("move", "aim_consistency", "fire", "hit", "reload")
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+
+# (name, dtype, nullable) in player_actions column order, without player_name
+# which is derived from player_id when the events are drained. distance, which
+# player_actions doesn't show, comes last.
+EVENT_COLUMNS = (
+    ("timestamp", np.int32, False),
+    ("player_id", np.int16, False),
+    ("kind", np.uint8, False),
+    ("weapon", np.int16, True),
+    ("pos_x", np.float32, True),  # Positions and angles arrive as float32 already
+    ("pos_y", np.float32, True),
+    ("pos_z", np.float32, True),
+    ("angle_x", np.float32, True),
+    ("angle_y", np.float32, True),
+    ("angle_z", np.float32, True),
+    ("velocity", np.float64, True),
+    ("accuracy", np.float64, True),
+    ("distance", np.float64, True),  # Of a move, from the player's previous sample
+)
+NULLABLE_COLUMNS = tuple(name for name, _, nullable in EVENT_COLUMNS if nullable)
+PLAYER_ACTION_COLUMNS = NULLABLE_COLUMNS[:-1]  # The nullable ones player_actions shows
+
+CHUNK_ROWS = 1 << 16  # Rows added each time the buffer grows
+
+
+def column_list(columns, name, rows=None):
+    # One column of EventBuffer.columns() as Python values, None where it is null.
+    # rows optionally selects events by index or boolean mask.
+    values = columns[name] if rows is None else columns[name][rows]
+    valid = columns.get(name + "_valid")
+    if valid is not None and rows is not None:
+        valid = valid[rows]
+    if valid is None or valid.all():
+        return values.tolist()
+    column = values.astype(object)
+    column[~valid] = None
+    return column.tolist()
+
+
+def action_counts(columns, player_name):
+    # ActionDatabase.action_counts() of columns: (player_name, action, count) sorted
+    # by player name and action
+    pairs, counts = np.unique(np.stack([columns["player_id"].astype(np.int64), columns["kind"]]), axis=1, return_counts=True)
+    return sorted((player_name(player_id), ACTIONS[kind], count)
+                  for (player_id, kind), count in zip(pairs.T.tolist(), counts.tolist()))
+
+
+def player_moves(columns, player_id):
+    # ActionDatabase.player_moves() of columns: (timestamp, pos_x, pos_y, pos_z) in time order
+    rows = np.flatnonzero((columns["player_id"] == player_id) & (columns["kind"] == ACTION_CODES["move"]))
+    rows = rows[np.argsort(columns["timestamp"][rows], kind="stable")]
+    return list(zip(*(column_list(columns, name, rows) for name in ("timestamp", "pos_x", "pos_y", "pos_z"))))
+
+
+class EventBuffer:
+    """Columnar store for player events.
+
+    Every field is a typed NumPy column, missing values are tracked in a
+    boolean mask per nullable column. Storage grows one chunk of columns at a
+    time, so appending never copies the rows already stored.
+    """
+
+    def __init__(self, chunk_rows=CHUNK_ROWS):
+        self.chunk_rows = chunk_rows
+        self._chunks = []  # Full chunks, as (columns, valid masks)
+        self._columns = None
+        self._valid = None
+        self._rows = 0  # Rows used in the current chunk
+        self._new_chunk()
+
+    def _new_chunk(self):
+        if self._columns is not None:
+            self._chunks.append((self._columns, self._valid))
+        self._columns = {name: np.zeros(self.chunk_rows, dtype=dtype) for name, dtype, _ in EVENT_COLUMNS}
+        self._valid = {name: np.zeros(self.chunk_rows, dtype=bool) for name in NULLABLE_COLUMNS}
+        self._rows = 0
+
+    def __len__(self):
+        return len(self._chunks) * self.chunk_rows + self._rows
+
+    def append(self, timestamp, player_id, action, weapon=None, pos_x=None, pos_y=None, pos_z=None,
+               angle_x=None, angle_y=None, angle_z=None, velocity=None, accuracy=None, distance=None):
+        if self._rows == self.chunk_rows:
+            self._new_chunk()
+        row = self._rows
+        columns = self._columns
+        valid = self._valid
+        columns["timestamp"][row] = timestamp
+        columns["player_id"][row] = player_id
+        columns["kind"][row] = ACTION_CODES[action]
+        for name, value in (("weapon", weapon), ("pos_x", pos_x), ("pos_y", pos_y), ("pos_z", pos_z),
+                            ("angle_x", angle_x), ("angle_y", angle_y), ("angle_z", angle_z),
+                            ("velocity", velocity), ("accuracy", accuracy), ("distance", distance)):
+            if value is None:
+                valid[name][row] = False
+            else:
+                columns[name][row] = value
+                valid[name][row] = True
+        self._rows = row + 1
+
+    def extend(self, columns):
+        # Append whole columns in the format columns() returns, with kind codes.
+        # A nullable column without a "<name>_valid" mask is null when missing.
+        count = len(columns["timestamp"])
+        start = 0
+        while start < count:
+            if self._rows == self.chunk_rows:
+                self._new_chunk()
+            row = self._rows
+            stop = start + min(count - start, self.chunk_rows - row)
+            end = row + stop - start
+            for name, _, nullable in EVENT_COLUMNS:
+                values = columns.get(name)
+                if values is not None:
+                    self._columns[name][row:end] = values[start:stop]
+                if nullable:
+                    valid = columns.get(name + "_valid")
+                    self._valid[name][row:end] = values is not None if valid is None else valid[start:stop]
+            self._rows = end
+            start = stop
+
+    def columns(self):
+        # Whole columns of every stored event, plus "<name>_valid" masks for the nullable ones
+        parts = self._chunks + [(self._columns, self._valid)]
+        rows = [self.chunk_rows] * len(self._chunks) + [self._rows]
+        result = {}
+        for name, _, _ in EVENT_COLUMNS:
+            result[name] = np.concatenate([columns[name][:count] for (columns, _), count in zip(parts, rows)])
+        for name in NULLABLE_COLUMNS:
+            result[name + "_valid"] = np.concatenate([valid[name][:count] for (_, valid), count in zip(parts, rows)])
+        return result
+
+    def rows(self, player_name):
+        # Tuples in player_actions column order with None for missing values.
+        # player_name maps a player id to the name stored with its events.
+        columns = self.columns()
+        fields = [columns["timestamp"].tolist(), columns["player_id"].tolist()]
+        names = {player_id: player_name(player_id) for player_id in set(fields[1])}
+        fields.append([names[player_id] for player_id in fields[1]])
+        fields.append([ACTIONS[kind] for kind in columns["kind"].tolist()])
+        for name in PLAYER_ACTION_COLUMNS:
+            fields.append(column_list(columns, name))
+        return zip(*fields)
+
+    def save(self, path):
+        # Drain to a .npz file, one array per column
+        np.savez(path, **self.columns())
+
+    def clear(self):
+        # Keep the current chunk allocated for reuse
+        self._chunks = []
+        self._rows = 0
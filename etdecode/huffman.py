@@ -0,0 +1,268 @@
+# Static Huffman coding used by the message bitstream (huffman.c, msg.c)
+#
+# The engine builds its tree by feeding msg_hData through the adaptive Huffman
+# coder once at startup. The tree depends on the insertion order, not only on the
+# frequencies, so the same adaptive construction is reproduced here.
+
+NYT = 256  # Not yet transmitted, stays in the tree as a 257th symbol
+INTERNAL_NODE = 257
+
+# Longest code produced by msg_hData, one table lookup decodes any symbol
+LOOKUP_BITS = 11
+
+# msg_hData from msg.c, symbol frequencies indexed by byte value
+MSG_HDATA = (
+    250315, 41193, 6292, 7106, 3730, 3750, 6110, 23283,  # 0x00
+    33317, 6950, 7838, 9714, 9257, 17259, 3949, 1778,  # 0x08
+    8288, 1604, 1590, 1663, 1100, 1213, 1238, 1134,  # 0x10
+    1749, 1059, 1246, 1149, 1273, 4486, 2805, 3472,  # 0x18
+    21819, 1159, 1670, 1066, 1043, 1012, 1053, 1070,  # 0x20
+    1726, 888, 1180, 850, 960, 780, 1752, 3296,  # 0x28
+    10630, 4514, 5881, 2685, 4650, 3837, 2093, 1867,  # 0x30
+    2584, 1949, 1972, 940, 1134, 1788, 1670, 1206,  # 0x38
+    5719, 6128, 7222, 6654, 3710, 3795, 1492, 1524,  # 0x40
+    2215, 1140, 1355, 971, 2180, 1248, 1328, 1195,  # 0x48
+    1770, 1078, 1264, 1266, 1168, 965, 1155, 1186,  # 0x50
+    1347, 1228, 1529, 1600, 2617, 2048, 2546, 3275,  # 0x58
+    2410, 3585, 2504, 2800, 2675, 6146, 3663, 2840,  # 0x60
+    14253, 3164, 2221, 1687, 3208, 2739, 3512, 4796,  # 0x68
+    4091, 3515, 5288, 4016, 7937, 6031, 5360, 3924,  # 0x70
+    4892, 3743, 4566, 4807, 5852, 6400, 6225, 8291,  # 0x78
+    23243, 7838, 7073, 8935, 5437, 4483, 3641, 5256,  # 0x80
+    5312, 5328, 5370, 3492, 2458, 1694, 1821, 2121,  # 0x88
+    1916, 1149, 1516, 1367, 1236, 1029, 1258, 1104,  # 0x90
+    1245, 1006, 1149, 1025, 1241, 952, 1287, 997,  # 0x98
+    1713, 1009, 1187, 879, 1099, 929, 1078, 951,  # 0xa0
+    1656, 930, 1153, 1030, 1262, 1062, 1214, 1060,  # 0xa8
+    1621, 930, 1106, 912, 1034, 892, 1158, 990,  # 0xb0
+    1175, 850, 1121, 903, 1087, 920, 1144, 1056,  # 0xb8
+    3462, 2240, 4397, 12136, 7758, 1345, 1307, 3278,  # 0xc0
+    1950, 886, 1023, 1112, 1077, 1042, 1061, 1071,  # 0xc8
+    1484, 1001, 1096, 915, 1052, 995, 1070, 876,  # 0xd0
+    1111, 851, 1059, 805, 1112, 923, 1103, 817,  # 0xd8
+    1899, 1872, 976, 841, 1127, 956, 1159, 950,  # 0xe0
+    7791, 954, 1289, 933, 1127, 3207, 1020, 927,  # 0xe8
+    1355, 768, 1040, 745, 952, 805, 1073, 740,  # 0xf0
+    1013, 805, 1008, 796, 996, 1057, 11457, 13504,  # 0xf8
+)
+
+# Codes of the tree built from MSG_HDATA, bits in stream order, NYT last. Equal
+# to build_codes(MSG_HDATA), kept precomputed because the build takes seconds.
+HUFF_CODES = (
+    "01", "11011", "0001001", "0011011", "10000101", "10001000", "0000100", "111111",
+    "10101", "0010110", "1001011", "1101000", "1100100", "101101", "10011100", "001101010",
+    "1010010", "000110100", "000011111", "000111111", "1011101110", "1100111111", "1101010001", "1100010011",
+    "001011110", "1011000110", "1101010100", "1100011011", "1101011110", "11000010", "111100100", "00101011",
+    "111011", "1100101100", "001000100", "1011001101", "1010001111", "1001111111", "1011000011", "1011001111",
+    "001010010", "0011010110", "1100110000", "0010100000", "1000111001", "0000111101", "001011111", "00011110",
+    "1110010", "11000011", "11110111", "111010011", "11001010", "10001101", "101100000", "100001101",
+    "111000000", "100011110", "100110011", "1000100110", "1100010010", "001111010", "001000101", "1100111110",
+    "11110011", "0000101", "0011111", "0010000", "10000100", "10001010", "000000010", "000011100",
+    "101111001", "1100011000", "1110101101", "1000111011", "101110011", "1101010101", "1110001110", "1100110011",
+    "001101001", "1011100100", "1101011010", "1101011011", "1100101110", "1000111010", "1100011110", "1100110001",
+    "1110101100", "1101001101", "000011101", "000101010", "111000110", "101000001", "110101110", "00011011",
+    "110011110", "00111100", "110101011", "111100011", "111010010", "0000110", "10000010", "111100101",
+    "001110", "00010100", "101111010", "001000110", "00011001", "111100010", "00110000", "11001101",
+    "10100001", "00110001", "11100010", "10011110", "1001101", "0000001", "11101000", "10011000",
+    "11010010", "10000111", "11000101", "11001110", "11110110", "0001011", "0001000", "1010011",
+    "111110", "1001010", "0011001", "1011111", "11110000", "11000001", "10000000", "11100001",
+    "11100110", "11100111", "11101010", "00101110", "110100111", "001000111", "100000010", "101100100",
+    "100011001", "1100011010", "000000011", "1110101111", "1101010000", "1010001010", "1101011000", "1011110000",
+    "1101010011", "1001111100", "1100011100", "1010001001", "1101010010", "1000110000", "1101011111", "1001110110",
+    "001010001", "1001111110", "1100110010", "0011010000", "1011101101", "1000001110", "1011100011", "1000101110",
+    "000111001", "1000011000", "1100011101", "1010001011", "1101011001", "1011001100", "1101001100", "1011001010",
+    "000111000", "1000001111", "1011110001", "0011110111", "1010001100", "0011010111", "1100011111", "1001100101",
+    "1100101111", "0010100001", "1100000001", "0011110110", "1011100101", "1000000111", "1100011001", "1011000100",
+    "00101010", "110000001", "10111010", "000001", "1001000", "1110001111", "1110000011", "00011101",
+    "100011111", "0011010001", "1010001000", "1100000000", "1011100010", "1010001110", "1011001011", "1011100000",
+    "000000000", "1001110111", "1011101100", "1000000110", "1011000010", "1001110100", "1011001110", "0010100111",
+    "1011110110", "0010100110", "1011000111", "0001101010", "1011110111", "1000001100", "1011101111", "0001111100",
+    "100010110", "100010010", "1001100100", "0001111101", "1100010000", "1000111000", "1100101101", "1000100111",
+    "1001001", "1000110001", "1110000010", "1000011001", "1100010001", "00011000", "1010000001", "1000001101",
+    "1110101110", "0000111100", "1010001101", "0000000011", "1000101111", "0001010111", "1011100001", "00000000101",
+    "1010000000", "0001101011", "1001111101", "0001010110", "1001110101", "1011000101", "1111010", "001001",
+    "00000000100",
+)
+
+
+class _Node:
+    __slots__ = ("left", "right", "parent", "next", "prev", "head", "weight", "symbol")
+
+    def __init__(self, symbol):
+        self.left = self.right = self.parent = None
+        self.next = self.prev = self.head = None
+        self.weight = 0
+        self.symbol = symbol
+
+
+class _AdaptiveHuffman:
+    # Port of huff_t and Huff_addRef. Block heads are one element lists standing in
+    # for the node_t ** cells of the C implementation.
+
+    def __init__(self):
+        self.tree = self.lhead = _Node(NYT)
+        self.loc = [None] * (NYT + 1)
+        self.loc[NYT] = self.tree
+        self._pending = []
+
+    def _swap(self, node1, node2):
+        parent1 = node1.parent
+        parent2 = node2.parent
+        if parent1:
+            if parent1.left is node1:
+                parent1.left = node2
+            else:
+                parent1.right = node2
+        else:
+            self.tree = node2
+        if parent2:
+            if parent2.left is node2:
+                parent2.left = node1
+            else:
+                parent2.right = node1
+        else:
+            self.tree = node1
+        node1.parent = parent2
+        node2.parent = parent1
+
+    @staticmethod
+    def _swaplist(node1, node2):
+        node1.next, node2.next = node2.next, node1.next
+        node1.prev, node2.prev = node2.prev, node1.prev
+        if node1.next is node1:
+            node1.next = node2
+        if node2.next is node2:
+            node2.next = node1
+        if node1.next:
+            node1.next.prev = node1
+        if node2.next:
+            node2.next.prev = node2
+        if node1.prev:
+            node1.prev.next = node1
+        if node2.prev:
+            node2.prev.next = node2
+
+    def _increment(self, node):
+        # increment() recurses into the parent before fixing up the child,
+        # the children waiting for their fix-up are kept on a stack instead
+        pending = self._pending
+        while node is not None:
+            following = node.next
+            if following is not None and following.weight == node.weight:
+                leader = node.head[0]
+                if leader is not node.parent:
+                    self._swap(leader, node)
+                self._swaplist(leader, node)
+            previous = node.prev
+            if previous is not None and previous.weight == node.weight:
+                node.head[0] = previous
+            else:
+                node.head[0] = None
+            node.weight += 1
+            following = node.next
+            if following is not None and following.weight == node.weight:
+                node.head = following.head
+            else:
+                node.head = [node]
+            if node.parent is None:
+                break
+            pending.append(node)
+            node = node.parent
+
+        while pending:
+            node = pending.pop()
+            if node.prev is node.parent:
+                self._swaplist(node, node.parent)
+                if node.head[0] is node:
+                    node.head[0] = node.parent
+
+    def _link_after_head(self, node, block_owner):
+        lhead = self.lhead
+        node.next = lhead.next
+        if lhead.next:
+            lhead.next.prev = node
+            if lhead.next.weight == 1:
+                node.head = lhead.next.head
+            else:
+                node.head = [block_owner]
+        else:
+            node.head = [node]
+        lhead.next = node
+        node.prev = lhead
+
+    def add_ref(self, symbol):
+        if self.loc[symbol] is not None:
+            self._increment(self.loc[symbol])
+            return
+
+        # First occurrence: split the NYT node into a new NYT and the symbol
+        leaf = _Node(symbol)
+        internal = _Node(INTERNAL_NODE)
+        internal.weight = 1
+        self._link_after_head(internal, internal)
+        leaf.weight = 1
+        self._link_after_head(leaf, internal)
+
+        lhead = self.lhead
+        if lhead.parent:
+            if lhead.parent.left is lhead:
+                lhead.parent.left = internal
+            else:
+                lhead.parent.right = internal
+        else:
+            self.tree = internal
+        internal.right = leaf
+        internal.left = lhead
+        internal.parent = lhead.parent
+        lhead.parent = leaf.parent = internal
+        self.loc[symbol] = leaf
+        self._increment(internal.parent)
+
+    def codes(self):
+        codes = [None] * (NYT + 1)
+        stack = [(self.tree, "")]
+        while stack:
+            node, prefix = stack.pop()
+            if node.symbol == INTERNAL_NODE:
+                stack.append((node.left, prefix + "0"))
+                stack.append((node.right, prefix + "1"))
+            else:
+                codes[node.symbol] = prefix
+        return tuple(codes)
+
+
+def build_codes(frequencies=MSG_HDATA):
+    # Same sequence of Huff_addRef calls as MSG_initHuffman
+    huff = _AdaptiveHuffman()
+    for symbol, count in enumerate(frequencies):
+        for _ in range(count):
+            huff.add_ref(symbol)
+    return huff.codes()
+
+
+class HuffmanTree:
+    """Lookup tables for the static message Huffman code.
+
+    Bits are consumed least significant first, as Huff_getBit does, so the next
+    LOOKUP_BITS bits of the stream index straight into symbols/lengths.
+    """
+
+    def __init__(self, codes=HUFF_CODES):
+        size = 1 << LOOKUP_BITS
+        self.symbols = [0] * size
+        self.lengths = [0] * size
+        self.encode = [None] * len(codes)  # (code with first bit lowest, length) per symbol
+
+        for symbol, code in enumerate(codes):
+            length = len(code)
+            if length > LOOKUP_BITS:
+                raise ValueError(f"Huffman code for {symbol} is longer than {LOOKUP_BITS} bits")
+            value = int(code[::-1], 2)
+            self.encode[symbol] = (value, length)
+            for high in range(1 << (LOOKUP_BITS - length)):
+                index = value | (high << length)
+                self.symbols[index] = symbol
+                self.lengths[index] = length
+
+        if 0 in self.lengths:
+            raise ValueError("Huffman codes do not form a complete tree")
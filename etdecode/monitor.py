@@ -0,0 +1,610 @@
+import numpy as np
+import logging
+import math
+import os
+import time
+
+from etdecode.aim import AIM_WINDOW, AimHistory
+from etdecode.anomaly import AimRecorder
+from etdecode.checkpoint import CHECKPOINT_SUFFIX, load_checkpoint, save_checkpoint
+from etdecode.constants import ET_EVENTS, ET_PLAYER, EV_BULLET_HIT_FLESH, EV_EVENT_BITS, EV_FILL_CLIP, \
+    EVENT_SEQUENCE_MASK, FIRE_EVENTS, MAX_EVENTS
+from etdecode.database import DATABASE_FILE, ActionDatabase
+from etdecode.demo import FRAME_HEADER, DemoReader
+from etdecode.engine import create_decoder
+from etdecode.events import ACTION_CODES, ACTIONS, CHUNK_ROWS, EVENT_COLUMNS, NULLABLE_COLUMNS, EventBuffer, \
+    action_counts, player_moves
+from etdecode.motion import AIM_CONSISTENCY_THRESHOLD, AIM_STOP_ZSCORE, MotionTracker
+from etdecode.pipeline import StageStats, Writer, threaded
+from etdecode.plot import HEATMAP_BINS, plot_heatmap, plot_moves, plot_paths, tracks
+from etdecode.seek import DemoIndex, in_range
+from etdecode.snapshot import MAX_CLIENTS, SnapshotParser, detach
+from etdecode.stats import ParseStats, RateLimitedLog
+
+log = logging.getLogger(__name__)
+
+MAX_WEAPONS = 64  # Defined MAX_WEAPONS based on the context provided
+
+BATCH_FRAMES = 256  # Snapshots per block of vectorized movement/aim interpretation
+PIPELINE_STAGES = ("read", "decode", "interpret", "write")
+FLUSH_ROWS = 4096  # Follow mode: events interpreted before they are stored and checkpointed
+FLUSH_SECONDS = 2.0  # Follow mode: longest time new events wait to be stored
+# What a cache entry holds: EventBuffer.columns() and the last position of every player
+CACHE_COLUMNS = tuple(name for name, _, _ in EVENT_COLUMNS) + tuple(f"{name}_valid" for name in NULLABLE_COLUMNS) + \
+    ("player_positions",)
+
+# Weapon table extracted from the provided .h/.c source files
+WEAPON_TABLE = {
+    0: "None",
+    1: "Knife",
+    2: "Luger",
+    3: "Colt",
+    4: "MP40",
+    5: "Thompson",
+    6: "Sten",
+    7: "FG42",
+    8: "Panzerfaust",
+    9: "Flamethrower",
+    10: "Grenade",
+    11: "Grenade Launcher",
+    12: "Mortar",
+    13: "Dynamite",
+    14: "Satchel Charge",
+    15: "Airstrike Marker",
+    16: "Landmine",
+    17: "Smoke Grenade",
+    18: "MG42",
+    19: "Garand",
+    20: "K43",
+    21: "BAR",
+    22: "M1 Carbine",
+    23: "PPSH",
+    24: "Panzerschreck",
+    25: "Mosin-Nagant",
+    26: "Unknown",
+    27: "Unknown",
+    28: "Unknown",
+    29: "Unknown",
+    30: "Unknown",
+    31: "Unknown",
+    32: "Unknown",
+    33: "Unknown",
+    34: "Unknown",
+    35: "Unknown",
+    36: "Unknown",
+    37: "Unknown",
+    38: "Unknown",
+    39: "Unknown",
+    40: "Unknown",
+    41: "Unknown",
+    42: "Unknown",
+    43: "Unknown",
+    44: "Unknown",
+    45: "Unknown",
+    46: "Unknown",
+    47: "Unknown",
+    48: "Unknown",
+    49: "Unknown",
+    50: "Unknown",
+    51: "Unknown",
+    52: "Unknown",
+    53: "Unknown",
+    54: "Unknown",
+    55: "Unknown",
+    56: "Unknown",
+    57: "Unknown",
+    58: "Unknown",
+    59: "Unknown",
+    60: "Unknown",
+    61: "Unknown",
+    62: "Unknown",
+    63: "Unknown",
+}
+
+class ETPlayerMonitor:
+    def __init__(self, demo_file, engine="auto", batch_frames=BATCH_FRAMES, aim_window=AIM_WINDOW,
+                 ingest="safe", commit_rows=None, without_rowid=False, pipeline=False,
+                 database_file=DATABASE_FILE, demo_id=None, cache=None, profile_every=0, record_aim=False):
+        self.demo_file = demo_file
+        self.weapon_usage = {}
+        self.player_positions = {}
+        self.aim_history = AimHistory(aim_window)  # Bounded, the latest aim_window samples per player
+        # Opened on first use, a demo found in the cache never touches it
+        self._database = None
+        self._database_options = (database_file, ingest, commit_rows, without_rowid)
+        self._demo_id = demo_id
+        self.events = EventBuffer()  # Columnar, drained to the database every CHUNK_ROWS events
+        self.player_names = {}
+        self.decoder = create_decoder(engine)  # One reusable message reader for the whole demo
+        self.snapshots = SnapshotParser(self.decoder)
+        self.event_sequences = np.full(MAX_CLIENTS, -1, dtype=np.int32)  # Last eventSequence seen per client
+        self.weapons = np.zeros(MAX_CLIENTS, dtype=np.int32)  # Last weapon seen per client
+        # batch_frames=0 interprets every frame on its own as it arrives
+        self.batch_frames = batch_frames
+        self.motion = MotionTracker(self.aim_history) if batch_frames > 0 else None
+        self.motion_frames = 0
+        # pipeline=True overlaps reading, decoding, interpretation and database writes
+        self.pipeline = pipeline
+        self.writer = None
+        self.stage_stats = None
+        # A ParseCache to take the events of a demo parsed before from, instead of the database
+        self.cache = cache
+        self.cached = None  # Event columns of a cache hit
+        self._cache_key = None
+        self._cache_parts = None  # Everything written, while parsing a demo for the cache
+        # Counters and timers, returned by parse_demo. profile_every=N runs one
+        # snapshot in N under cProfile.
+        self.stats = ParseStats(profile_every)
+        self.log = RateLimitedLog(log)
+        # Every player's view angles and shots over the whole demo, for aim_features
+        self.aim_recorder = AimRecorder() if record_aim else None
+
+    def _open_database(self):
+        database_file, ingest, commit_rows, without_rowid = self._database_options
+        # ingest="bulk" trades crash safety of the database for load speed
+        self._database = ActionDatabase(database_file, mode=ingest, commit_rows=commit_rows, without_rowid=without_rowid)
+        self._demo_id = self._database.register_demo(self.demo_file, self._demo_id)
+
+    @property
+    def database(self):
+        if self._database is None:
+            self._open_database()
+        return self._database
+
+    @property
+    def db_connection(self):
+        return self.database.connection
+
+    @property
+    def demo_id(self):
+        # Stored with every event
+        if self._database is None:
+            self._open_database()
+        return self._demo_id
+
+    def parse_demo(self, start_time=None, end_time=None, follow=False, checkpoint=None,
+                   flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS, idle_timeout=None):
+        # A server time range starts at the nearest keyframe of the demo's seek index.
+        # follow=True keeps reading a demo that is still being recorded, see _follow.
+        if follow and (start_time is not None or end_time is not None):
+            raise ValueError("A followed demo is read from its checkpoint, not a time range")
+        if follow and self.aim_recorder is not None:
+            raise ValueError("Recorded aim is not checkpointed, a followed demo can't record it")
+        stats = self.stats
+        start = time.perf_counter_ns()
+        try:
+            if self.cache is not None and self.aim_recorder is None and not follow and start_time is None and end_time is None:
+                # Only whole demos are cached, and they hold no view angles to record
+                self._cache_key = self.cache.key(self.demo_file)
+                cached = self.cache.load(self._cache_key, CACHE_COLUMNS)
+                if cached is not None:
+                    positions = cached.pop("player_positions")
+                    self.player_positions = {int(row[0]): (*row[1:4].tolist(), int(row[4])) for row in positions}
+                    self.cached = cached
+                    stats.count("cache_hits")
+                    return stats
+                self._cache_parts = []
+            with DemoReader(self.demo_file) as reader:
+                if follow:
+                    self._follow(reader, checkpoint or self.demo_file + CHECKPOINT_SUFFIX,
+                                 flush_rows, flush_seconds, idle_timeout)
+                    return stats
+                # What an earlier run stored of this demo, or of this time range of it, is replaced
+                self.database.discard(self.demo_id, start_time=start_time, end_time=end_time)
+                if start_time is not None or end_time is not None:
+                    frames = self._counted(DemoIndex.for_demo(self.demo_file, self.decoder).frames(reader, start_time))
+                else:
+                    frames = self._counted(reader)
+                if self.pipeline:
+                    self._parse_pipelined(frames, start_time, end_time)
+                else:
+                    self._parse_sequential(frames, start_time, end_time)
+                if reader.truncated or reader.malformed:
+                    stats.count("malformed_frames")
+                    log.warning("Demo stopped at a bad frame at offset %d", reader.offset)
+            if self.snapshots.bad_messages:
+                log.warning("Skipped the rest of %d malformed messages", self.snapshots.bad_messages)
+        except Exception as e:
+            self._cache_parts = None  # Nothing to reuse
+            stats.count("errors")
+            log.error("Error parsing demo: %s", e)
+        finally:
+            stats.add_time("total", time.perf_counter_ns() - start)
+            stats.counters["decode_failures"] = self.snapshots.bad_messages
+            stats.counters["dropped_snapshots"] = self.snapshots.dropped_snapshots
+        log.info("Parsed %s\n%s", self.demo_file, stats.report())
+        return stats
+
+    def _counted(self, frames):
+        # Count the frames read, on whichever thread reads them
+        counters = self.stats.counters
+        for frame in frames:
+            counters["messages"] += 1
+            counters["bytes_read"] += FRAME_HEADER.size + len(frame.data)
+            yield frame
+
+    def _parse_sequential(self, frames, start_time=None, end_time=None):
+        # Decoding and interpretation timed apart, storing is timed in _write_events
+        stats = self.stats
+        timers = stats.timers_ns
+        profiler = stats.profiler
+        stored = timers["store"]
+        snapshots = in_range(self.snapshots.snapshots(frames), start_time, end_time)
+        count = 0
+        while True:
+            profiling = profiler is not None and count % stats.profile_every == 0
+            if profiling:
+                profiler.enable()
+            start = time.perf_counter_ns()
+            snapshot = next(snapshots, None)
+            decoded = time.perf_counter_ns()
+            timers["decode"] += decoded - start
+            if snapshot is not None:
+                self._process_snapshot(snapshot)
+                timers["interpret"] += time.perf_counter_ns() - decoded
+            if profiling:
+                profiler.disable()
+            if snapshot is None:
+                break
+            count += 1
+        start = time.perf_counter_ns()
+        if self.motion is not None:
+            self._flush_motion()
+        timers["interpret"] += time.perf_counter_ns() - start - (timers["store"] - stored)
+        stats.count("snapshots", count)
+
+    def _parse_pipelined(self, frames, start_time=None, end_time=None):
+        # Reading, decoding, interpreting and writing each run on their own thread,
+        # handing their results on through bounded queues
+        stats = {name: StageStats(name) for name in PIPELINE_STAGES}
+        self.stage_stats = stats
+        frames = threaded(frames, stats["read"], stats["decode"])
+        snapshots = in_range(self.snapshots.snapshots(frames), start_time, end_time)
+        snapshots = threaded(map(detach, snapshots), stats["decode"], stats["interpret"])
+        self.writer = Writer(self._write_events, stats["write"], stats["interpret"])
+        start = time.perf_counter()
+        try:
+            for snapshot in snapshots:
+                self._process_snapshot(snapshot)
+                stats["interpret"].items += 1
+            if self.motion is not None:
+                self._flush_motion()
+            if len(self.events):
+                self._flush_actions_buffer()
+        finally:
+            stats["interpret"].busy += time.perf_counter() - start
+            writer, self.writer = self.writer, None
+            writer.close()
+            for stage in stats.values():
+                if stage.name != "write":  # Timed as "store" by _write_events
+                    self.stats.add_time(stage.name, int(stage.work * 1e9))
+                log.info(stage.report())
+            self.stats.count("snapshots", stats["interpret"].items)
+
+    def _follow(self, reader, checkpoint, flush_rows, flush_seconds, idle_timeout):
+        # Interpret frames as they are appended to the demo, on this thread. Every
+        # flush_rows events or flush_seconds the events are stored and the state to
+        # continue from is checkpointed, so a restart resumes after the last frame
+        # stored. What an interrupted run stored after its checkpoint is discarded then.
+        offset = stored = self._restore_checkpoint(checkpoint)
+        last_flush = time.monotonic()
+        counters = self.stats.counters
+        for frame in reader.follow(offset, idle_timeout=idle_timeout):
+            if frame is not None:
+                if self.decoder.load(frame.data):
+                    for snapshot in self.snapshots.parse_message(frame.sequence):
+                        self._process_snapshot(snapshot)
+                        counters["snapshots"] += 1
+                counters["messages"] += 1
+                counters["bytes_read"] += FRAME_HEADER.size + len(frame.data)
+                offset = frame.offset + FRAME_HEADER.size + len(frame.data)
+            if offset != stored and (len(self.events) >= flush_rows or time.monotonic() - last_flush >= flush_seconds):
+                self._save_checkpoint(checkpoint, offset)
+                stored = offset
+                last_flush = time.monotonic()
+        if offset != stored:
+            self._save_checkpoint(checkpoint, offset)
+        if reader.malformed:
+            self.stats.count("malformed_frames")
+            log.warning("Demo stopped at a bad frame at offset %d", reader.offset)
+
+    def _save_checkpoint(self, checkpoint, offset):
+        # Store everything interpreted so far, then the state to continue from at offset
+        if self.motion is not None:
+            self._flush_motion()
+        if len(self.events):
+            self._flush_actions_buffer()
+        self.database.commit()
+        parts = {
+            "parser": self.snapshots.state(),
+            "aim": self.aim_history.state(),
+            "monitor": {
+                "offset": offset,
+                "database": os.path.abspath(self.database.path),
+                "demo_id": self.demo_id,
+                "next_seq": self.database.next_seq,
+                "event_sequences": self.event_sequences,
+                "weapons": self.weapons,
+                "player_positions": self.player_positions,
+                "weapon_usage": self.weapon_usage,
+            },
+        }
+        if self.motion is not None:
+            parts["motion"] = self.motion.state()
+        save_checkpoint(checkpoint, parts)
+
+    def _restore_checkpoint(self, checkpoint):
+        # Returns the offset of the first frame still to be read
+        try:
+            parts = load_checkpoint(checkpoint)
+        except (OSError, ValueError, KeyError) as e:
+            log.warning("Ignoring unreadable checkpoint %s: %s", checkpoint, e)
+            parts = None
+        if parts is not None:
+            state = parts["monitor"]
+            if state["database"] != os.path.abspath(self.database.path) or state["demo_id"] != self.demo_id or \
+                    state["offset"] > os.path.getsize(self.demo_file):
+                log.warning("Checkpoint %s is not of this demo and database, starting over", checkpoint)
+                parts = None
+        if parts is None:
+            # From the start, replacing whatever an earlier run stored for this demo
+            self.database.discard(self.demo_id)
+            return 0
+
+        self.database.discard(self.demo_id, state["next_seq"])
+        self.snapshots.restore(parts["parser"])
+        self.aim_history.restore(parts["aim"])
+        self.event_sequences[:] = state["event_sequences"]
+        self.weapons[:] = state["weapons"]
+        self.player_positions = {int(player_id): tuple(position) for player_id, position in state["player_positions"].items()}
+        if self.motion is not None:
+            # A checkpoint of a batch_frames=0 run has no motion part, its samples
+            # to carry over are the last positions and angles
+            if "motion" in parts:
+                self.motion.restore(parts["motion"])
+            else:
+                self.motion.carry_over(self.player_positions)
+        self.weapon_usage = {int(player_id): usage for player_id, usage in state["weapon_usage"].items()}
+        log.info("Resuming %s at offset %d", self.demo_file, state["offset"])
+        return state["offset"]
+
+    def _process_snapshot(self, snapshot):
+        timestamp = snapshot.server_time
+        ps = snapshot.ps
+        # Only rows that were delta decoded in this snapshot can hold anything new
+        changed = snapshot.entities[snapshot.changed]
+        players = changed[(changed["number"] < MAX_CLIENTS) & (changed["eType"] == ET_PLAYER)]
+        # The recording client is not among the entities, only its playerState is sent
+        pov = int(ps["clientNum"]) if 0 <= ps["clientNum"] < MAX_CLIENTS else None
+        self.weapons[players["number"]] = players["weapon"]
+        if self.aim_recorder is not None:
+            if pov is not None:
+                self.aim_recorder.add(timestamp, (pov,), ps["viewangles"].reshape(1, 3))
+            self.aim_recorder.add(timestamp, players["number"], players["apos_trBase"])
+
+        if self.motion is not None:
+            # Batch mode, movement and aim are interpreted a block of frames at a time
+            if pov is not None:
+                # ps is a view of the snapshot ring, the queued samples must be copies
+                self.motion.add(timestamp, (pov,), ps["origin"].reshape(1, 3).copy(), ps["viewangles"].reshape(1, 3).copy())
+            self.motion.add(timestamp, players["number"], players["pos_trBase"], players["apos_trBase"])
+            self.motion_frames += 1
+            if self.motion_frames >= self.batch_frames:
+                self._flush_motion()
+        else:
+            if pov is not None:
+                self._interpret_position(timestamp, pov, *ps["origin"].tolist())
+                self._interpret_angles(timestamp, pov, *ps["viewangles"].tolist())
+            for player_id, origin, angles in zip(players["number"].tolist(), players["pos_trBase"].tolist(), players["apos_trBase"].tolist()):
+                self._interpret_position(timestamp, player_id, *origin)
+                self._interpret_angles(timestamp, player_id, *angles)
+
+        if pov is not None:
+            self._process_events(timestamp, pov, int(ps["weapon"]), int(ps["eventSequence"]), ps["events"].tolist())
+        for player_id, weapon, sequence, events in zip(players["number"].tolist(), players["weapon"].tolist(),
+                                                       players["eventSequence"].tolist(), players["events"].tolist()):
+            self._process_events(timestamp, player_id, weapon, sequence, events)
+
+        # Bullet impacts on players are temporary entities naming the shooter
+        hits = changed[changed["eType"] == ET_EVENTS + EV_BULLET_HIT_FLESH]
+        for attacker in hits["otherEntityNum"].tolist():
+            if attacker >= MAX_CLIENTS:
+                continue
+            weapon = int(ps["weapon"]) if attacker == pov else int(self.weapons[attacker])
+            self._interpret_weapon_usage(timestamp, attacker, EV_BULLET_HIT_FLESH, weapon)
+
+    def _process_events(self, timestamp, player_id, weapon, sequence, events):
+        # Events raised since the last snapshot are the events[] entries between the
+        # previous and the current eventSequence
+        last = self.event_sequences[player_id]
+        self.event_sequences[player_id] = sequence
+        if last < 0:
+            return
+        count = min((sequence - last) & EVENT_SEQUENCE_MASK, MAX_EVENTS)
+        for i in range(sequence - count, sequence):
+            event = events[i % MAX_EVENTS] & ~EV_EVENT_BITS
+            self._interpret_weapon_usage(timestamp, player_id, event, weapon)
+
+    def _flush_motion(self):
+        columns = self.motion.process()
+        self.motion_frames = 0
+        if columns is not None:
+            self.events.extend(columns)
+            if len(self.events) >= CHUNK_ROWS:
+                self._flush_actions_buffer()
+        # Last known positions, as the per-frame path keeps them
+        motion = self.motion
+        for player_id in np.flatnonzero(motion.seen).tolist():
+            self.player_positions[player_id] = (*motion.last_position[player_id].tolist(), int(motion.last_time[player_id]))
+
+    def _interpret_position(self, timestamp, player_id, pos_x, pos_y, pos_z):
+        # Calculate movement details
+        if player_id in self.player_positions:
+            last_pos = self.player_positions[player_id]
+            dx, dy, dz = pos_x - last_pos[0], pos_y - last_pos[1], pos_z - last_pos[2]
+            distance = math.sqrt(dx * dx + dy * dy + dz * dz)  # Squared like NumPy does, see MotionTracker
+            velocity = distance / (timestamp - last_pos[3]) if timestamp - last_pos[3] > 0 else 0
+            self._store_action(timestamp, player_id, "move", None, pos_x, pos_y, pos_z, None, None, None, velocity, None, distance)
+        self.player_positions[player_id] = (pos_x, pos_y, pos_z, timestamp)
+    
+    def _interpret_angles(self, timestamp, player_id, angle_x, angle_y, angle_z):
+        # Interpret aim direction and stability
+        last_angle, zscore = self.aim_history.add(player_id, timestamp, angle_x, angle_y, angle_z)
+
+        # Check for unusual aim patterns: a dead stop, far below how fast the player
+        # otherwise turns over the window, as when locking onto a target
+        if last_angle is not None and zscore <= -AIM_STOP_ZSCORE:
+            angle_change = sum(abs(last_angle[i] - (angle_x, angle_y, angle_z)[i]) for i in range(3))
+            if angle_change < AIM_CONSISTENCY_THRESHOLD:
+                self._store_action(timestamp, player_id, "aim_consistency", None, None, None, None, angle_x, angle_y, angle_z, None, None)
+    
+    def _interpret_weapon_usage(self, timestamp, player_id, event, weapon):
+        weapon = self._extract_weapon(weapon)
+        if weapon == 0:
+            # Ignore events without a valid weapon
+            return
+
+        if self.aim_recorder is not None:
+            if event in FIRE_EVENTS:
+                self.aim_recorder.shot(timestamp, player_id)
+            elif event == EV_BULLET_HIT_FLESH:
+                self.aim_recorder.hit(timestamp, player_id)
+
+        # Record firing, hits and reloads from the entity events. accuracy is the
+        # player's hits per shot so far, over all weapons.
+        if event in FIRE_EVENTS:
+            usage = self.weapon_usage.setdefault(player_id, {"shots": 0, "hits": 0})
+            usage["shots"] += 1
+            self._store_action(timestamp, player_id, "fire", weapon, None, None, None, None, None, None, None, None)
+
+        elif event == EV_BULLET_HIT_FLESH:
+            usage = self.weapon_usage.setdefault(player_id, {"shots": 0, "hits": 0})
+            usage["hits"] += 1
+            accuracy = usage["hits"] / usage["shots"] if usage["shots"] else None  # A hit from before the demo began
+            self._store_action(timestamp, player_id, "hit", weapon, None, None, None, None, None, None, None, accuracy)
+
+        elif event == EV_FILL_CLIP:
+            self._store_action(timestamp, player_id, "reload", weapon, None, None, None, None, None, None, None, None)
+
+    def _extract_weapon(self, weapon_id):
+        # Ensure weapon ID is within a valid range
+        if weapon_id < 0 or weapon_id >= MAX_WEAPONS:
+            self.stats.count("invalid_weapons")
+            self.log.warning("weapon", "Invalid weapon ID extracted: %d", weapon_id)
+            return 0
+        return weapon_id
+
+    def player_name(self, player_id):
+        # The name events of player_id are stored under, one shared string per
+        # player instead of one per event
+        name = self.player_names.get(player_id)
+        if name is None:
+            name = self.player_names[player_id] = f"Player{player_id}"
+        return name
+
+    def _store_action(self, timestamp, player_id, action, weapon, pos_x, pos_y, pos_z, angle_x, angle_y, angle_z, velocity, accuracy,
+                      distance=None):
+        self.events.append(timestamp, player_id, action, weapon, pos_x, pos_y, pos_z, angle_x, angle_y, angle_z, velocity, accuracy,
+                           distance)
+        if len(self.events) >= CHUNK_ROWS:
+            self._flush_actions_buffer()
+
+    def _flush_actions_buffer(self):
+        columns = self.events.columns()
+        counters = self.stats.counters
+        for kind, count in enumerate(np.bincount(columns["kind"], minlength=len(ACTIONS)).tolist()):
+            counters["events." + ACTIONS[kind]] += count
+        if self.writer is not None:
+            self.writer.submit(columns)
+        else:
+            self._write_events(columns)
+        self.events.clear()
+
+    def aim_features(self):
+        # Per-player aim kinematics and snap counts of the parsed demo, see anomaly.aim_features
+        if self.aim_recorder is None:
+            raise ValueError("Aim is only recorded with record_aim=True")
+        return self.aim_recorder.features()
+
+    def _store_pending(self):
+        # Events still buffered go to the database before it is read
+        if len(self.events):
+            self._flush_actions_buffer()
+
+    def _write_events(self, columns):
+        start = time.perf_counter_ns()
+        self.database.insert_events(columns, self.player_name, self.demo_id)
+        self.stats.add_time("store", time.perf_counter_ns() - start)
+        self.stats.count("rows_flushed", len(columns["timestamp"]))
+        if self._cache_parts is not None:
+            self._cache_parts.append(columns)
+
+    def _store_cache(self):
+        parts, self._cache_parts = self._cache_parts, None
+        if parts:
+            columns = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+        else:
+            columns = EventBuffer(0).columns()
+        positions = [(player_id, *position) for player_id, position in sorted(self.player_positions.items())]
+        columns["player_positions"] = np.array(positions, dtype=np.float64).reshape(-1, 5)
+        try:
+            self.cache.store(self._cache_key, columns)
+        except OSError as e:
+            log.warning("Could not cache %s: %s", self.demo_file, e)
+
+    def close(self, summary=True):
+        if self.cached is None:
+            if len(self.events):
+                self._flush_actions_buffer()
+            self.database.finish()
+            if self._cache_parts is not None:
+                self._store_cache()
+        if summary:
+            self._output_summary()
+        if self._database is not None:
+            self._database.close()
+
+    def visualize_movement(self, path=None, heatmap=False, bins=HEATMAP_BINS):
+        # Every player's full path, or with heatmap=True how often the players
+        # were where, streamed from the database or the cached events. Shown in
+        # a window, or written to path without one.
+        if self.cached is not None:
+            moves = self.cached["kind"] == ACTION_CODES["move"]
+            player_ids = np.unique(self.cached["player_id"][moves]).tolist()
+            chunks = [(self.cached["pos_x"][moves], self.cached["pos_y"][moves])]
+            extent = tuple((float(values.min()), float(values.max())) for values in chunks[0]) if player_ids else None
+            paths = tracks(player_ids, lambda player_id: player_moves(self.cached, player_id))
+        else:
+            self._store_pending()
+            # Only this demo's moves, the database may hold others
+            player_ids = self.database.player_ids(self.demo_id)
+            chunks = self.database.positions(demo_id=self.demo_id)
+            extent = self.database.position_extent(self.demo_id)
+            paths = tracks(player_ids, lambda player_id: self.database.player_moves(player_id, self.demo_id))
+
+        if not player_ids:
+            print("No position data available for visualization.")
+            return
+        if heatmap:
+            plot_heatmap(chunks, extent, path, bins)
+        else:
+            plot_paths(paths, path)
+
+    def _output_summary(self):
+        # Generate a summary of actions from the database, or the cached events
+        if self.cached is not None:
+            summary = action_counts(self.cached, self.player_name)
+        else:
+            summary = self.database.action_counts(self.demo_id)
+
+        print("\nSummary of Player Actions:")
+        for player_name, action, count in summary:
+            print(f"Player: {player_name}, Action: {action}, Count: {count}")
+
+    def plot_player_data(self, player_id, path=None):
+        if self.cached is not None:
+            rows = player_moves(self.cached, player_id)
+        else:
+            self._store_pending()
+            rows = self.database.player_moves(player_id, self.demo_id)
+        plot_moves(rows, player_id, path)
@@ -0,0 +1,144 @@
+import numpy as np
+
+from etdecode.events import ACTION_CODES
+from etdecode.snapshot import MAX_CLIENTS
+
+AIM_CONSISTENCY_THRESHOLD = 0.01  # Summed angle change below which aim counts as "consistent"
+AIM_STOP_ZSCORE = 1.5  # Standard deviations below the player's usual turning speed such a stop must be
+
+MOVE = ACTION_CODES["move"]
+AIM_CONSISTENCY = ACTION_CODES["aim_consistency"]
+
+
+class MotionTracker:
+    """Movement and aim deltas for a block of frames at a time.
+
+    Samples are queued per frame, then grouped by player and differenced with
+    NumPy. The values are the same, bit for bit, as the per-frame
+    _interpret_position/_interpret_angles path. The last sample of every
+    player carries over to the next block. The samples are also recorded in
+    aim_history, whose window statistics the aim_consistency check reads.
+    """
+
+    def __init__(self, aim_history):
+        self.aim_history = aim_history
+        self.seen = np.zeros(MAX_CLIENTS, dtype=bool)
+        self.last_time = np.zeros(MAX_CLIENTS, dtype=np.int64)
+        self.last_position = np.zeros((MAX_CLIENTS, 3))
+        self.last_angles = np.zeros((MAX_CLIENTS, 3))
+        self._pending = []
+
+    def add(self, timestamp, player_ids, positions, angles):
+        # One frame worth of samples: player ids with (n, 3) positions and view angles.
+        # The arrays are kept until process(), they must not be views the parser reuses.
+        if len(player_ids):
+            self._pending.append((timestamp, player_ids, positions, angles))
+
+    def state(self):
+        # The samples carried over to the next block, for checkpoints. Nothing may be queued.
+        return {"seen": self.seen, "last_time": self.last_time, "last_position": self.last_position,
+                "last_angles": self.last_angles}
+
+    def restore(self, state):
+        for name, values in state.items():
+            getattr(self, name)[:] = values
+
+    def carry_over(self, player_positions):
+        # Continue after the per-frame path: player_positions maps player ids to
+        # (x, y, z, timestamp), the angles of those samples are the last in aim_history
+        for player_id, (pos_x, pos_y, pos_z, timestamp) in player_positions.items():
+            self.seen[player_id] = True
+            self.last_time[player_id] = timestamp
+            self.last_position[player_id] = (pos_x, pos_y, pos_z)
+            last = self.aim_history.last(player_id)
+            if last is not None:
+                self.last_angles[player_id] = last[:3]
+
+    def process(self):
+        # Interpret the queued samples. Returns EventBuffer.extend columns with the
+        # move and aim_consistency events in the order the per-frame path emits them.
+        if not self._pending:
+            return None
+        pending = self._pending
+        self._pending = []
+        timestamps = np.concatenate([np.full(len(ids), t, dtype=np.int64) for t, ids, _, _ in pending])
+        player_ids = np.concatenate([np.asarray(ids, dtype=np.intp) for _, ids, _, _ in pending])
+        positions = np.concatenate([np.asarray(p, dtype=np.float64) for _, _, p, _ in pending])
+        angles = np.concatenate([np.asarray(a, dtype=np.float64) for _, _, _, a in pending])
+
+        # Group by player, keeping each player's samples in time order
+        order = np.argsort(player_ids, kind="stable")
+        ids = player_ids[order]
+        times = timestamps[order]
+        positions = positions[order]
+        angles = angles[order]
+        first = np.ones(len(ids), dtype=bool)
+        first[1:] = ids[1:] != ids[:-1]
+        last = np.ones(len(ids), dtype=bool)
+        last[:-1] = first[1:]
+
+        # The previous sample of a player's first row comes from the last block
+        starts = ids[first]
+        has_previous = ~first
+        has_previous[first] = self.seen[starts]
+        previous_times = np.empty_like(times)
+        previous_times[1:] = times[:-1]
+        previous_times[first] = self.last_time[starts]
+        previous_positions = np.empty_like(positions)
+        previous_positions[1:] = positions[:-1]
+        previous_positions[first] = self.last_position[starts]
+        previous_angles = np.empty_like(angles)
+        previous_angles[1:] = angles[:-1]
+        previous_angles[first] = self.last_angles[starts]
+
+        # Same operations in the same order as the scalar path
+        delta = positions - previous_positions
+        distance = np.sqrt(delta[:, 0] * delta[:, 0] + delta[:, 1] * delta[:, 1] + delta[:, 2] * delta[:, 2])
+        elapsed = times - previous_times
+        velocity = np.zeros(len(ids))
+        np.divide(distance, elapsed, out=velocity, where=elapsed > 0)
+        turn = np.abs(angles - previous_angles)
+        angle_change = turn[:, 0] + turn[:, 1] + turn[:, 2]
+
+        zscores = np.empty(len(ids))
+        for start, stop in zip(np.flatnonzero(first).tolist(), (np.flatnonzero(last) + 1).tolist()):
+            zscores[start:stop] = self.aim_history.extend(int(ids[start]), times[start:stop], angles[start:stop])
+
+        ends = ids[last]
+        self.seen[ends] = True
+        self.last_time[ends] = times[last]
+        self.last_position[ends] = positions[last]
+        self.last_angles[ends] = angles[last]
+
+        # Back to sample order, a move before the aim event of the same sample
+        moves = np.flatnonzero(has_previous)
+        aims = np.flatnonzero(has_previous & (angle_change < AIM_CONSISTENCY_THRESHOLD) & (zscores <= -AIM_STOP_ZSCORE))
+        rows = np.concatenate([moves, aims])
+        kinds = np.concatenate([np.full(len(moves), MOVE, dtype=np.uint8), np.full(len(aims), AIM_CONSISTENCY, dtype=np.uint8)])
+        emitted = np.argsort(np.concatenate([order[moves] * 2, order[aims] * 2 + 1]))
+        rows = rows[emitted]
+        kinds = kinds[emitted]
+        moving = kinds == MOVE
+        aiming = ~moving
+
+        return {
+            "timestamp": times[rows],
+            "player_id": ids[rows],
+            "kind": kinds,
+            "pos_x": positions[rows, 0],
+            "pos_y": positions[rows, 1],
+            "pos_z": positions[rows, 2],
+            "pos_x_valid": moving,
+            "pos_y_valid": moving,
+            "pos_z_valid": moving,
+            "angle_x": angles[rows, 0],
+            "angle_y": angles[rows, 1],
+            "angle_z": angles[rows, 2],
+            "angle_x_valid": aiming,
+            "angle_y_valid": aiming,
+            "angle_z_valid": aiming,
+            "velocity": velocity[rows],
+            "velocity_valid": moving,
+            "distance": distance[rows],
+            "distance_valid": moving,
+        }
@@ -0,0 +1,471 @@
+import struct
+
+import numpy as np
+
+from etdecode.demo import MAX_MSGLEN
+from etdecode.huffman import HuffmanTree, LOOKUP_BITS
+from etdecode.netfields import (
+    ENTITY_FIELD_COUNT,
+    ENTITY_STATE_FIELDS,
+    ENTITY_STATE_SIZE,
+    ENTITYNUM_NONE,
+    FLOAT_INT_BIAS,
+    FLOAT_INT_BITS,
+    GENTITYNUM_BITS,
+    MAX_GENTITIES,
+    PLAYER_FIELD_COUNT,
+    PLAYER_STATE_ARRAYS,
+    PLAYER_STATE_FIELDS,
+    PLAYER_STATE_SIZE,
+)
+
+MAX_STRING_CHARS = 1024
+BIG_INFO_STRING = 8192
+
+# Room behind the message so a lookup window never leaves the buffer
+BUFFER_SLACK = 4
+
+# Field tables as (32-bit word index, bits), states are handled as arrays of words
+ENTITY_FIELD_WORDS = tuple((offset >> 2, bits) for _, offset, bits in ENTITY_STATE_FIELDS)
+PLAYER_FIELD_WORDS = tuple((offset >> 2, bits) for _, offset, bits in PLAYER_STATE_FIELDS)
+PLAYER_ARRAY_WORDS = {name: offset >> 2 for name, offset, _ in PLAYER_STATE_ARRAYS}
+ENTITY_WORDS = ENTITY_STATE_SIZE >> 2
+PLAYER_WORDS = PLAYER_STATE_SIZE >> 2
+
+# Bit patterns of every float an integral float field can carry
+_count = 1 << FLOAT_INT_BITS
+INTEGRAL_FLOATS = struct.unpack(f"<{_count}i", struct.pack(f"<{_count}f", *range(-FLOAT_INT_BIAS, _count - FLOAT_INT_BIAS)))
+# And back, the bits a float field holding one of them is sent in. -0.0 goes as 0.
+INTEGRAL_BITS = {word: bits for bits, word in enumerate(INTEGRAL_FLOATS)}
+INTEGRAL_BITS[-0x80000000] = FLOAT_INT_BIAS
+
+_tree = None
+
+
+def _shared_tree():
+    global _tree
+    if _tree is None:
+        _tree = HuffmanTree()
+    return _tree
+
+
+class PythonDecoder:
+    """Pure Python message reader with the interface of NativeDecoder.
+
+    Huffman symbols are decoded with a single LOOKUP_BITS wide table lookup
+    instead of walking the tree one bit at a time like Huff_offsetReceive.
+    """
+
+    name = "python"
+
+    def __init__(self):
+        tree = _shared_tree()
+        self._symbols = tree.symbols
+        self._lengths = tree.lengths
+        self.buffer = bytearray(MAX_MSGLEN + BUFFER_SLACK)
+        self.cursize = 0
+        self.readcount = 0
+        self.bit = 0
+
+    def load(self, data):
+        length = len(data)
+        if length > MAX_MSGLEN:
+            return False
+        self.buffer[:length] = data
+        self.cursize = length
+        self.readcount = 0
+        self.bit = 0
+        return True
+
+    def messages(self, frames):
+        load = self.load
+        for frame in frames:
+            if load(frame.data):
+                yield frame
+
+    @property
+    def overflowed(self):
+        return self.readcount > self.cursize
+
+    def read_bits(self, bits):
+        # MSG_ReadBits for a bitstream message: the bits below a multiple of 8 are
+        # stored raw, every whole byte is one Huffman symbol
+        if self.readcount > self.cursize:
+            return 0
+        signed = bits < 0
+        if signed:
+            bits = -bits
+        bit = self.bit
+        end = self.cursize << 3
+        data = self.buffer
+        value = 0
+        nbits = bits & 7
+        if nbits:
+            if bit + nbits > end:
+                self.readcount = self.cursize + 1
+                return 0
+            position = bit >> 3
+            value = ((data[position] | data[position + 1] << 8) >> (bit & 7)) & ((1 << nbits) - 1)
+            bit += nbits
+            bits -= nbits
+        if bits:
+            symbols = self._symbols
+            lengths = self._lengths
+            mask = (1 << LOOKUP_BITS) - 1
+            shift = nbits
+            for _ in range(bits >> 3):
+                position = bit >> 3
+                index = ((data[position] | data[position + 1] << 8 | data[position + 2] << 16) >> (bit & 7)) & mask
+                bit += lengths[index]
+                if bit > end:
+                    # The code runs past the message, Huff_offsetReceive gives up
+                    self.bit = end + 1
+                    self.readcount = self.cursize + 1
+                    return 0
+                value |= symbols[index] << shift
+                shift += 8
+        self.bit = bit
+        self.readcount = (bit >> 3) + 1
+
+        # Same sign extension as the engine, on the bit count left after the raw bits
+        if signed and 0 < bits < 32 and value & (1 << (bits - 1)):
+            value |= -1 ^ ((1 << bits) - 1)
+        value &= 0xFFFFFFFF
+        return value - 0x100000000 if value & 0x80000000 else value
+
+    def read_byte(self):
+        value = self.read_bits(8) & 0xFF
+        return -1 if self.readcount > self.cursize else value
+
+    def read_short(self):
+        value = self.read_bits(16) & 0xFFFF
+        if self.readcount > self.cursize:
+            return -1
+        return value - 0x10000 if value & 0x8000 else value
+
+    def read_long(self):
+        value = self.read_bits(32)
+        return -1 if self.readcount > self.cursize else value
+
+    def _read_string(self, size):
+        chars = []
+        while True:
+            c = self.read_byte()
+            if c == -1 or c == 0:
+                break
+            # Same translation as MSG_ReadString, format specs become dots
+            if c == 0x25:
+                c = 0x2E
+            if len(chars) >= size - 1:
+                break
+            chars.append(c)
+        return bytes(chars).decode("latin-1")
+
+    def read_string(self):
+        return self._read_string(MAX_STRING_CHARS)
+
+    def read_big_string(self):
+        return self._read_string(BIG_INFO_STRING)
+
+    def read_data(self, length):
+        return bytes(self.read_byte() & 0xFF for _ in range(length))
+
+    # States are NumPy arrays laid out like entityState_t/playerState_t, the same
+    # buffers NativeDecoder hands to the engine. None stands for a zeroed state.
+
+    def read_delta_entity(self, from_state, to_state, number):
+        # MSG_ReadDeltaEntity
+        if number < 0 or number >= MAX_GENTITIES:
+            return False
+        to_words = to_state.view(np.int32)
+        read_bits = self.read_bits
+
+        if read_bits(1) == 1:
+            # Removed from the snapshot
+            to_words[:] = 0
+            to_words[0] = ENTITYNUM_NONE
+            return True
+
+        words = from_state.view(np.int32).tolist() if from_state is not None else [0] * ENTITY_WORDS
+        if read_bits(1) == 0:
+            # No delta, same as the old state
+            words[0] = number
+            to_words[:] = words
+            return True
+
+        count = self.read_byte()
+        if count < 0 or count > ENTITY_FIELD_COUNT:
+            return False
+        for index, bits in ENTITY_FIELD_WORDS[:count]:
+            if not read_bits(1):
+                continue
+            if bits == 0:
+                if not read_bits(1):
+                    words[index] = 0
+                elif not read_bits(1):
+                    words[index] = INTEGRAL_FLOATS[read_bits(FLOAT_INT_BITS)]
+                else:
+                    words[index] = read_bits(32)
+            elif read_bits(1):
+                words[index] = read_bits(bits)
+            else:
+                words[index] = 0
+        words[0] = number
+        to_words[:] = words
+        return True
+
+    def read_delta_playerstate(self, from_state, to_state):
+        # MSG_ReadDeltaPlayerstate
+        read_bits = self.read_bits
+        read_short = self.read_short
+
+        count = self.read_byte()
+        if count < 0 or count > PLAYER_FIELD_COUNT:
+            return False
+        words = from_state.view(np.int32).tolist() if from_state is not None else [0] * PLAYER_WORDS
+        for index, bits in PLAYER_FIELD_WORDS[:count]:
+            if not read_bits(1):
+                continue
+            if bits == 0:
+                if not read_bits(1):
+                    words[index] = INTEGRAL_FLOATS[read_bits(FLOAT_INT_BITS)]
+                else:
+                    words[index] = read_bits(32)
+            else:
+                words[index] = read_bits(bits)
+
+        # The arrays only carry the entries flagged in a 16 bit mask
+        if read_bits(1):
+            for name in ("stats", "persistant", "holdable", "powerups"):
+                if read_bits(1):
+                    mask = read_short()
+                    start = PLAYER_ARRAY_WORDS[name]
+                    read_value = self.read_long if name == "powerups" else read_short
+                    for i in range(16):
+                        if mask & (1 << i):
+                            words[start + i] = read_value()
+        if read_bits(1):
+            self._read_ammo(words, PLAYER_ARRAY_WORDS["ammo"])
+        self._read_ammo(words, PLAYER_ARRAY_WORDS["ammoclip"])
+
+        to_state.view(np.int32)[:] = words
+        return True
+
+    # The same readers on rows of state arrays, from_rows None for a zeroed state
+
+    def read_delta_entity_at(self, from_rows, from_index, to_rows, to_index, number):
+        from_state = from_rows[from_index:from_index + 1] if from_rows is not None else None
+        return self.read_delta_entity(from_state, to_rows[to_index:to_index + 1], number)
+
+    def read_delta_playerstate_at(self, from_rows, from_index, to_rows, to_index):
+        from_state = from_rows[from_index:from_index + 1] if from_rows is not None else None
+        return self.read_delta_playerstate(from_state, to_rows[to_index:to_index + 1])
+
+    def _read_ammo(self, words, start):
+        # Four blocks of 16 weapons, each with its own change mask
+        read_short = self.read_short
+        for block in range(4):
+            if self.read_bits(1):
+                mask = read_short()
+                for i in range(16):
+                    if mask & (1 << i):
+                        words[start + block * 16 + i] = read_short()
+
+
+def _words(state, size):
+    # A state as a list of Python ints
+    if state is None:
+        return [0] * size
+    return np.asarray(state).view(np.int32).reshape(-1).tolist()
+
+
+class MessageWriter:
+    """Pure Python message writer, the MSG_Write side of PythonDecoder.
+
+    Writes the same bytes as the MSG_Write functions of huffman.so, so test
+    data can be made without the engine library. Whole bytes are Huffman
+    coded with the table of the shared tree and collected in a bytearray.
+    """
+
+    def __init__(self):
+        self._encode = _shared_tree().encode
+        self.begin()
+
+    def begin(self):
+        # MSG_Init, an empty message
+        self._data = bytearray()
+        self._pending = 0  # Bits not yet a whole byte, first bit lowest
+        self._pending_bits = 0
+        self.written = False
+
+    @property
+    def bit(self):
+        return (len(self._data) << 3) + self._pending_bits
+
+    @property
+    def cursize(self):
+        return (self.bit >> 3) + 1 if self.written else 0
+
+    @property
+    def overflowed(self):
+        return self.cursize > MAX_MSGLEN
+
+    def _put(self, code, length):
+        pending = self._pending | code << self._pending_bits
+        length += self._pending_bits
+        while length >= 8:
+            self._data.append(pending & 0xFF)
+            pending >>= 8
+            length -= 8
+        self._pending = pending
+        self._pending_bits = length
+
+    def write_bits(self, value, bits):
+        # MSG_WriteBits for a bitstream message: the bits below a multiple of 8
+        # raw, then every whole byte as one Huffman symbol
+        if bits < 0:
+            bits = -bits
+        value &= 0xFFFFFFFF >> (32 - bits)
+        nbits = bits & 7
+        if nbits:
+            self._put(value & ((1 << nbits) - 1), nbits)
+            value >>= nbits
+            bits -= nbits
+        encode = self._encode
+        for _ in range(bits >> 3):
+            self._put(*encode[value & 0xFF])
+            value >>= 8
+        self.written = True
+
+    def write_byte(self, value):
+        self.write_bits(value, 8)
+
+    def write_short(self, value):
+        self.write_bits(value, 16)
+
+    def write_long(self, value):
+        self.write_bits(value, 32)
+
+    def write_string(self, text):
+        # MSG_WriteString, one byte at a time and 0 terminated
+        for c in text.encode("latin-1"):
+            self.write_bits(c, 8)
+        self.write_bits(0, 8)
+
+    # States are arrays of words like the ones the readers fill, None stands for
+    # a zeroed state.
+
+    def write_delta_entity(self, from_state, to_state, force):
+        # MSG_WriteDeltaEntity
+        write_bits = self.write_bits
+        if to_state is None:
+            if from_state is not None:
+                write_bits(_words(from_state, ENTITY_WORDS)[0], GENTITYNUM_BITS)
+                write_bits(1, 1)  # Removed
+            return
+        old = _words(from_state, ENTITY_WORDS)
+        new = _words(to_state, ENTITY_WORDS)
+        count = 0
+        for field, (index, _) in enumerate(ENTITY_FIELD_WORDS):
+            if old[index] != new[index]:
+                count = field + 1
+        if not count:
+            if force:
+                write_bits(new[0], GENTITYNUM_BITS)
+                write_bits(0, 1)  # Not removed
+                write_bits(0, 1)  # No delta
+            return
+
+        write_bits(new[0], GENTITYNUM_BITS)
+        write_bits(0, 1)
+        write_bits(1, 1)
+        write_bits(count, 8)
+        for index, bits in ENTITY_FIELD_WORDS[:count]:
+            word = new[index]
+            if old[index] == word:
+                write_bits(0, 1)
+                continue
+            write_bits(1, 1)
+            if bits == 0:
+                if word == 0 or word == -0x80000000:
+                    write_bits(0, 1)  # 0.0
+                else:
+                    write_bits(1, 1)
+                    self._write_float(word)
+            elif word == 0:
+                write_bits(0, 1)
+            else:
+                write_bits(1, 1)
+                write_bits(word, bits)
+
+    def _write_float(self, word):
+        # A small integral float in FLOAT_INT_BITS, anything else as its 32 bits
+        small = INTEGRAL_BITS.get(word)
+        if small is not None:
+            self.write_bits(0, 1)
+            self.write_bits(small, FLOAT_INT_BITS)
+        else:
+            self.write_bits(1, 1)
+            self.write_bits(word, 32)
+
+    def write_delta_playerstate(self, from_state, to_state):
+        # MSG_WriteDeltaPlayerstate
+        write_bits = self.write_bits
+        old = _words(from_state, PLAYER_WORDS)
+        new = _words(to_state, PLAYER_WORDS)
+        count = 0
+        for field, (index, _) in enumerate(PLAYER_FIELD_WORDS):
+            if old[index] != new[index]:
+                count = field + 1
+        write_bits(count, 8)
+        for index, bits in PLAYER_FIELD_WORDS[:count]:
+            word = new[index]
+            if old[index] == word:
+                write_bits(0, 1)
+                continue
+            write_bits(1, 1)
+            if bits == 0:
+                self._write_float(word)
+            else:
+                write_bits(word, bits)
+
+        masks = {name: self._changed(old, new, PLAYER_ARRAY_WORDS[name], 16)
+                 for name in ("stats", "persistant", "holdable", "powerups")}
+        if any(masks.values()):
+            write_bits(1, 1)
+            for name, mask in masks.items():
+                self._write_array(new, PLAYER_ARRAY_WORDS[name], mask, 32 if name == "powerups" else 16)
+        else:
+            write_bits(0, 1)
+        ammo = [self._changed(old, new, PLAYER_ARRAY_WORDS["ammo"] + block * 16, 16) for block in range(4)]
+        write_bits(1 if any(ammo) else 0, 1)
+        if any(ammo):
+            self._write_ammo(new, PLAYER_ARRAY_WORDS["ammo"], ammo)
+        clips = [self._changed(old, new, PLAYER_ARRAY_WORDS["ammoclip"] + block * 16, 16) for block in range(4)]
+        self._write_ammo(new, PLAYER_ARRAY_WORDS["ammoclip"], clips)
+
+    @staticmethod
+    def _changed(old, new, start, length):
+        # Mask of the entries of an array that differ
+        return sum(1 << i for i in range(length) if old[start + i] != new[start + i])
+
+    def _write_array(self, words, start, mask, bits):
+        # A change flag, then the mask and the flagged entries
+        if not mask:
+            self.write_bits(0, 1)
+            return
+        self.write_bits(1, 1)
+        self.write_bits(mask, 16)
+        for i in range(16):
+            if mask & (1 << i):
+                self.write_bits(words[start + i], bits)
+
+    def _write_ammo(self, words, start, masks):
+        for block, mask in enumerate(masks):
+            self._write_array(words, start + block * 16, mask, 16)
+
+    def data(self):
+        # The message so far, cursize bytes like the engine's buffer holds
+        if not self.written:
+            return b""
+        return bytes(self._data) + bytes([self._pending])
@@ -0,0 +1,314 @@
+import ctypes
+import os
+
+import numpy as np
+
+from etdecode.demo import MAX_MSGLEN
+from etdecode.netfields import ENTITY_FIELD_COUNT, ENTITY_STATE_SIZE, MAX_GENTITIES, PLAYER_FIELD_COUNT
+
+# The engine build ships as an ELF shared object; older checkouts named it huffman.dll
+LIBRARY_NAMES = ("huffman.so", "huffman.dll")
+LIBRARY_ENV = "ETDECODE_HUFFMAN_LIB"
+
+# huffman.dll references engine functions it isn't linked with, libetstub.so
+# defines them and is loaded first. Build it with `make -C native`.
+STUB_NAME = os.path.join("native", "libetstub.so")
+STUB_ENV = "ETDECODE_STUB_LIB"
+
+# Room behind the message so the Huffman reader can run over the end without leaving the buffer
+BUFFER_SLACK = 64
+MAX_BASES = 16  # State arrays whose addresses a decoder remembers
+
+
+class msg_t(ctypes.Structure):
+    # Layout of msg_t in qcommon.h, 0x30 bytes on x86-64
+    _fields_ = [
+        ("allowoverflow", ctypes.c_int),
+        ("overflowed", ctypes.c_int),
+        ("oob", ctypes.c_int),
+        ("data", ctypes.POINTER(ctypes.c_ubyte)),
+        ("maxsize", ctypes.c_int),
+        ("cursize", ctypes.c_int),
+        ("uncompsize", ctypes.c_int),
+        ("readcount", ctypes.c_int),
+        ("bit", ctypes.c_int),
+        ("strip", ctypes.c_int),  # Turn high ascii into dots in MSG_ReadString
+    ]
+
+
+_library = None
+
+
+def _root():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def find_library():
+    # An explicit path wins, otherwise look next to the package
+    path = os.environ.get(LIBRARY_ENV)
+    if path:
+        return path
+    root = _root()
+    for name in LIBRARY_NAMES:
+        path = os.path.join(root, name)
+        if os.path.exists(path):
+            return path
+    raise OSError(f"huffman library not found next to {root} (set {LIBRARY_ENV})")
+
+
+def find_stub():
+    path = os.environ.get(STUB_ENV) or os.path.join(_root(), STUB_NAME)
+    if not os.path.exists(path):
+        raise OSError(f"engine stub {path} not built, run `make -C {os.path.dirname(os.path.join(_root(), STUB_NAME))}` "
+                      f"(or set {STUB_ENV})")
+    return path
+
+
+def load_library():
+    global _library
+    if _library is not None:
+        return _library
+
+    # RTLD_GLOBAL makes the stub's symbols resolve the ones huffman.dll is missing
+    ctypes.CDLL(find_stub(), mode=ctypes.RTLD_GLOBAL)
+    lib = ctypes.CDLL(find_library())
+    msg_p = ctypes.POINTER(msg_t)
+
+    lib.MSG_Init.argtypes = [msg_p, ctypes.c_void_p, ctypes.c_int]
+    lib.MSG_Init.restype = None
+    lib.MSG_BeginReading.argtypes = [msg_p]
+    lib.MSG_BeginReading.restype = None
+    lib.Huff_Decompress.argtypes = [msg_p, ctypes.c_int]
+    lib.Huff_Decompress.restype = None
+    lib.MSG_ReadBits.argtypes = [msg_p, ctypes.c_int]
+    lib.MSG_ReadBits.restype = ctypes.c_int
+    lib.MSG_ReadByte.argtypes = [msg_p]
+    lib.MSG_ReadByte.restype = ctypes.c_int
+    lib.MSG_ReadShort.argtypes = [msg_p]
+    lib.MSG_ReadShort.restype = ctypes.c_int
+    lib.MSG_ReadLong.argtypes = [msg_p]
+    lib.MSG_ReadLong.restype = ctypes.c_int
+    lib.MSG_ReadString.argtypes = [msg_p]
+    lib.MSG_ReadString.restype = ctypes.c_char_p
+    lib.MSG_ReadBigString.argtypes = [msg_p]
+    lib.MSG_ReadBigString.restype = ctypes.c_char_p
+    lib.MSG_ReadData.argtypes = [msg_p, ctypes.c_void_p, ctypes.c_int]
+    lib.MSG_ReadData.restype = None
+    # entityState_t/playerState_t are passed as raw buffers laid out like the C structs
+    lib.MSG_ReadDeltaEntity.argtypes = [msg_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int]
+    lib.MSG_ReadDeltaEntity.restype = None
+    lib.MSG_ReadDeltaPlayerstate.argtypes = [msg_p, ctypes.c_void_p, ctypes.c_void_p]
+    lib.MSG_ReadDeltaPlayerstate.restype = None
+    # Writers, for etdecode.synthetic
+    lib.MSG_WriteBits.argtypes = [msg_p, ctypes.c_int, ctypes.c_int]
+    lib.MSG_WriteBits.restype = None
+    lib.MSG_WriteDeltaEntity.argtypes = [msg_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int]
+    lib.MSG_WriteDeltaEntity.restype = None
+    lib.MSG_WriteDeltaPlayerstate.argtypes = [msg_p, ctypes.c_void_p, ctypes.c_void_p]
+    lib.MSG_WriteDeltaPlayerstate.restype = None
+
+    _library = lib
+    return lib
+
+
+def _address(buffer):
+    # Accept raw addresses, NumPy arrays, ctypes arrays and bytearrays alike.
+    # __array_interface__ would rebuild the descr of a structured dtype every call.
+    if buffer is None or isinstance(buffer, int):
+        return buffer
+    if isinstance(buffer, np.ndarray):
+        return buffer.ctypes.data
+    return ctypes.addressof(ctypes.c_char.from_buffer(buffer))
+
+
+class NativeDecoder:
+    """Message reader backed by the MSG_ functions of huffman.so.
+
+    One msg_t and one data buffer are allocated up front and reused for every
+    message, so decoding a demo does no per-message allocation on this side.
+    """
+
+    name = "native"
+
+    def __init__(self):
+        self.lib = load_library()
+        self.buffer = (ctypes.c_ubyte * (MAX_MSGLEN + BUFFER_SLACK))()
+        self._buffer_view = memoryview(self.buffer).cast("B")
+        self.msg = msg_t()
+        self._msg_ref = ctypes.byref(self.msg)
+        self.lib.MSG_Init(self._msg_ref, self.buffer, MAX_MSGLEN)
+        self._bases = {}  # id of a state array: (array, address, stride)
+        self._null_entity = (ctypes.c_ubyte * ENTITY_STATE_SIZE)()  # MSG_ReadDeltaEntity needs a from state
+
+    def load(self, data):
+        # Copy one framed message into the reusable buffer and start bitstream reading
+        length = len(data)
+        if length > MAX_MSGLEN:
+            return False
+        self._buffer_view[:length] = data
+        self.msg.cursize = length
+        self.lib.MSG_BeginReading(self._msg_ref)
+        return True
+
+    def messages(self, frames):
+        # Batch decode: each yielded frame is loaded and ready to be read from this decoder
+        load = self.load
+        for frame in frames:
+            if load(frame.data):
+                yield frame
+
+    @property
+    def readcount(self):
+        return self.msg.readcount
+
+    @property
+    def cursize(self):
+        return self.msg.cursize
+
+    @property
+    def overflowed(self):
+        # Reads past the end return garbage, the message must be dropped
+        return self.msg.readcount > self.msg.cursize
+
+    def read_bits(self, bits):
+        return self.lib.MSG_ReadBits(self._msg_ref, bits)
+
+    def read_byte(self):
+        return self.lib.MSG_ReadByte(self._msg_ref)
+
+    def read_short(self):
+        return self.lib.MSG_ReadShort(self._msg_ref)
+
+    def read_long(self):
+        return self.lib.MSG_ReadLong(self._msg_ref)
+
+    def read_string(self):
+        return self.lib.MSG_ReadString(self._msg_ref).decode("latin-1")
+
+    def read_big_string(self):
+        return self.lib.MSG_ReadBigString(self._msg_ref).decode("latin-1")
+
+    def read_data(self, length):
+        data = (ctypes.c_ubyte * length)()
+        self.lib.MSG_ReadData(self._msg_ref, data, length)
+        return bytes(data)
+
+    # The engine calls Com_Error on a bad field count, which can't be survived from
+    # Python, so the count is read ahead on a copy of the read state first.
+
+    def _peek_entity_count(self):
+        probe = msg_t.from_buffer_copy(self.msg)
+        probe_ref = ctypes.byref(probe)
+        if self.lib.MSG_ReadBits(probe_ref, 1) or not self.lib.MSG_ReadBits(probe_ref, 1):
+            # Removed or unchanged, no field count follows
+            return 0
+        return self.lib.MSG_ReadByte(probe_ref)
+
+    def _peek_playerstate_count(self):
+        probe = msg_t.from_buffer_copy(self.msg)
+        return self.lib.MSG_ReadByte(ctypes.byref(probe))
+
+    def read_delta_entity(self, from_state, to_state, number):
+        # Returns False instead of letting the engine abort on malformed input
+        if number < 0 or number >= MAX_GENTITIES:
+            return False
+        count = self._peek_entity_count()
+        if count < 0 or count > ENTITY_FIELD_COUNT:
+            return False
+        self.lib.MSG_ReadDeltaEntity(self._msg_ref, _address(from_state), _address(to_state), number)
+        return True
+
+    def read_delta_playerstate(self, from_state, to_state):
+        count = self._peek_playerstate_count()
+        if count < 0 or count > PLAYER_FIELD_COUNT:
+            return False
+        self.lib.MSG_ReadDeltaPlayerstate(self._msg_ref, _address(from_state), _address(to_state))
+        return True
+
+    # The same readers on rows of state arrays, from_rows None for a zeroed state.
+    # Each array's address is looked up once, a row is an offset from it.
+
+    def _row_address(self, rows, index):
+        if rows is None:
+            return None
+        base = self._bases.get(id(rows))
+        if base is None or base[0] is not rows:
+            if len(self._bases) >= MAX_BASES:
+                self._bases.clear()
+            base = self._bases[id(rows)] = (rows, rows.ctypes.data, rows.strides[0])
+        return base[1] + index * base[2]
+
+    def read_delta_entity_at(self, from_rows, from_index, to_rows, to_index, number):
+        if number < 0 or number >= MAX_GENTITIES:
+            return False
+        count = self._peek_entity_count()
+        if count < 0 or count > ENTITY_FIELD_COUNT:
+            return False
+        from_address = self._row_address(from_rows, from_index) if from_rows is not None else \
+            ctypes.addressof(self._null_entity)
+        self.lib.MSG_ReadDeltaEntity(self._msg_ref, from_address, self._row_address(to_rows, to_index), number)
+        return True
+
+    def read_delta_playerstate_at(self, from_rows, from_index, to_rows, to_index):
+        count = self._peek_playerstate_count()
+        if count < 0 or count > PLAYER_FIELD_COUNT:
+            return False
+        self.lib.MSG_ReadDeltaPlayerstate(self._msg_ref, self._row_address(from_rows, from_index),
+                                          self._row_address(to_rows, to_index))
+        return True
+
+
+class NativeWriter:
+    """Message writer backed by the MSG_Write functions of huffman.so.
+
+    Same interface as msg.MessageWriter, one msg_t reused for every message.
+    """
+
+    def __init__(self):
+        self.lib = load_library()
+        self.buffer = (ctypes.c_ubyte * MAX_MSGLEN)()
+        self.msg = msg_t()
+        self._msg_ref = ctypes.byref(self.msg)
+        self.begin()
+
+    def begin(self):
+        # MSG_Init leaves the data alone. A message ending on a byte boundary
+        # counts one byte more than its bits fill, which would keep whatever the
+        # last message left there.
+        ctypes.memset(self.buffer, 0, self.msg.cursize + 1 if self.msg.data else MAX_MSGLEN)
+        self.lib.MSG_Init(self._msg_ref, self.buffer, MAX_MSGLEN)
+
+    @property
+    def cursize(self):
+        return self.msg.cursize
+
+    @property
+    def overflowed(self):
+        return bool(self.msg.overflowed)
+
+    def write_bits(self, value, bits):
+        self.lib.MSG_WriteBits(self._msg_ref, value, bits)
+
+    def write_byte(self, value):
+        self.write_bits(value, 8)
+
+    def write_short(self, value):
+        self.write_bits(value, 16)
+
+    def write_long(self, value):
+        self.write_bits(value, 32)
+
+    def write_string(self, text):
+        for c in text.encode("latin-1"):
+            self.write_bits(c, 8)
+        self.write_bits(0, 8)
+
+    def write_delta_entity(self, from_state, to_state, force):
+        # The engine dereferences from_state whenever to_state is given
+        self.lib.MSG_WriteDeltaEntity(self._msg_ref, _address(from_state), _address(to_state), force)
+
+    def write_delta_playerstate(self, from_state, to_state):
+        self.lib.MSG_WriteDeltaPlayerstate(self._msg_ref, _address(from_state), _address(to_state))
+
+    def data(self):
+        return bytes(memoryview(self.buffer)[:self.msg.cursize])
@@ -0,0 +1,199 @@
+# Delta compression field tables from msg.c and the struct layouts they index into
+
+GENTITYNUM_BITS = 10
+MAX_GENTITIES = 1 << GENTITYNUM_BITS
+ENTITYNUM_NONE = MAX_GENTITIES - 1  # Also ends the packet entity list
+
+# Floats holding small integers are sent in FLOAT_INT_BITS bits
+FLOAT_INT_BITS = 13
+FLOAT_INT_BIAS = 1 << (FLOAT_INT_BITS - 1)
+
+# sizeof(entityState_t) and sizeof(playerState_t) on x86-64
+ENTITY_STATE_SIZE = 288
+PLAYER_STATE_SIZE = 1452
+
+# (name, byte offset, bits) in transmission order. 0 bits is a float, negative
+# bits a signed integer. Only the first "field count" entries are present in a
+# delta, the rest are copied from the old state.
+ENTITY_STATE_FIELDS = (
+    ("eType", 4, 8),
+    ("eFlags", 8, 24),
+    ("pos.trType", 12, 8),
+    ("pos.trTime", 16, 32),
+    ("pos.trDuration", 20, 32),
+    ("pos.trBase[0]", 24, 0),
+    ("pos.trBase[1]", 28, 0),
+    ("pos.trBase[2]", 32, 0),
+    ("pos.trDelta[0]", 36, 0),
+    ("pos.trDelta[1]", 40, 0),
+    ("pos.trDelta[2]", 44, 0),
+    ("apos.trType", 48, 8),
+    ("apos.trTime", 52, 32),
+    ("apos.trDuration", 56, 32),
+    ("apos.trBase[0]", 60, 0),
+    ("apos.trBase[1]", 64, 0),
+    ("apos.trBase[2]", 68, 0),
+    ("apos.trDelta[0]", 72, 0),
+    ("apos.trDelta[1]", 76, 0),
+    ("apos.trDelta[2]", 80, 0),
+    ("time", 84, 32),
+    ("time2", 88, 32),
+    ("origin[0]", 92, 0),
+    ("origin[1]", 96, 0),
+    ("origin[2]", 100, 0),
+    ("origin2[0]", 104, 0),
+    ("origin2[1]", 108, 0),
+    ("origin2[2]", 112, 0),
+    ("angles[0]", 116, 0),
+    ("angles[1]", 120, 0),
+    ("angles[2]", 124, 0),
+    ("angles2[0]", 128, 0),
+    ("angles2[1]", 132, 0),
+    ("angles2[2]", 136, 0),
+    ("otherEntityNum", 140, 10),
+    ("otherEntityNum2", 144, 10),
+    ("groundEntityNum", 148, 10),
+    ("loopSound", 160, 8),
+    ("constantLight", 152, 32),
+    ("dl_intensity", 156, 32),
+    ("modelindex", 164, 9),
+    ("modelindex2", 168, 9),
+    ("frame", 176, 16),
+    ("clientNum", 172, 8),
+    ("solid", 180, 24),
+    ("event", 184, 10),
+    ("eventParm", 188, 8),
+    ("eventSequence", 192, 8),
+    ("events[0]", 196, 8),
+    ("events[1]", 200, 8),
+    ("events[2]", 204, 8),
+    ("events[3]", 208, 8),
+    ("eventParms[0]", 212, 8),
+    ("eventParms[1]", 216, 8),
+    ("eventParms[2]", 220, 8),
+    ("eventParms[3]", 224, 8),
+    ("powerups", 228, 16),
+    ("weapon", 232, 8),
+    ("legsAnim", 236, 10),
+    ("torsoAnim", 240, 10),
+    ("density", 244, 10),
+    ("dmgFlags", 248, 32),
+    ("onFireStart", 252, 32),
+    ("onFireEnd", 256, 32),
+    ("nextWeapon", 260, 8),
+    ("teamNum", 264, 8),
+    ("effect1Time", 268, 32),
+    ("effect2Time", 272, 32),
+    ("effect3Time", 276, 32),
+    ("animMovetype", 284, 4),
+    ("aiState", 280, 2),
+)
+
+PLAYER_STATE_FIELDS = (
+    ("commandTime", 0, 32),
+    ("pm_type", 4, 8),
+    ("bobCycle", 8, 8),
+    ("pm_flags", 12, 16),
+    ("pm_time", 16, -16),
+    ("origin[0]", 20, 0),
+    ("origin[1]", 24, 0),
+    ("origin[2]", 28, 0),
+    ("velocity[0]", 32, 0),
+    ("velocity[1]", 36, 0),
+    ("velocity[2]", 40, 0),
+    ("weaponTime", 44, -16),
+    ("weaponDelay", 48, -16),
+    ("grenadeTimeLeft", 52, -16),
+    ("gravity", 56, 16),
+    ("leanf", 60, 0),
+    ("speed", 64, 16),
+    ("delta_angles[0]", 68, 16),
+    ("delta_angles[1]", 72, 16),
+    ("delta_angles[2]", 76, 16),
+    ("groundEntityNum", 80, 10),
+    ("legsTimer", 84, 16),
+    ("torsoTimer", 92, 16),
+    ("legsAnim", 88, 10),
+    ("torsoAnim", 96, 10),
+    ("movementDir", 100, 8),
+    ("eFlags", 104, 24),
+    ("eventSequence", 108, 8),
+    ("events[0]", 112, 8),
+    ("events[1]", 116, 8),
+    ("events[2]", 120, 8),
+    ("events[3]", 124, 8),
+    ("eventParms[0]", 128, 8),
+    ("eventParms[1]", 132, 8),
+    ("eventParms[2]", 136, 8),
+    ("eventParms[3]", 140, 8),
+    ("clientNum", 160, 8),
+    ("weapons[0]", 980, 32),
+    ("weapons[1]", 984, 32),
+    ("weapon", 164, 7),
+    ("weaponstate", 168, 4),
+    ("weapAnim", 1152, 10),
+    ("viewangles[0]", 176, 0),
+    ("viewangles[1]", 180, 0),
+    ("viewangles[2]", 184, 0),
+    ("viewheight", 188, -8),
+    ("damageEvent", 192, 8),
+    ("damageYaw", 196, 8),
+    ("damagePitch", 200, 8),
+    ("damageCount", 204, 8),
+    ("mins[0]", 988, 0),
+    ("mins[1]", 992, 0),
+    ("mins[2]", 996, 0),
+    ("maxs[0]", 1000, 0),
+    ("maxs[1]", 1004, 0),
+    ("maxs[2]", 1008, 0),
+    ("crouchMaxZ", 1012, 0),
+    ("crouchViewHeight", 1016, 0),
+    ("standViewHeight", 1020, 0),
+    ("deadViewHeight", 1024, 0),
+    ("runSpeedScale", 1028, 0),
+    ("sprintSpeedScale", 1032, 0),
+    ("crouchSpeedScale", 1036, 0),
+    ("friction", 1048, 0),
+    ("viewlocked", 1040, 8),
+    ("viewlocked_entNum", 1044, 16),
+    ("nextWeapon", 1052, 8),
+    ("teamNum", 1056, 8),
+    ("onFireStart", 1060, 32),
+    ("curWeapHeat", 1436, 8),
+    ("aimSpreadScale", 1164, 8),
+    ("serverCursorHint", 1064, 8),
+    ("serverCursorHintVal", 1068, 8),
+    ("classWeaponTime", 1144, 32),
+    ("identifyClient", 1440, 8),
+    ("identifyClientHealth", 1444, 8),
+    ("aiState", 1448, 2),
+)
+
+ENTITY_FIELD_COUNT = len(ENTITY_STATE_FIELDS)
+PLAYER_FIELD_COUNT = len(PLAYER_STATE_FIELDS)
+
+# playerState_t arrays sent after the fields: (name, byte offset, length)
+PLAYER_STATE_ARRAYS = (
+    ("stats", 208, 16),
+    ("persistant", 272, 16),
+    ("powerups", 336, 16),
+    ("ammo", 400, 64),
+    ("ammoclip", 656, 64),
+    ("holdable", 912, 16),
+)
+
+
+def struct_layout(fields, arrays=()):
+    # Group "pos.trBase[0]".."[2]" style entries into (name, offset, is_float, length)
+    # members, in offset order, so the layout can be described to NumPy or ctypes
+    members = {}
+    for name, offset, bits in fields:
+        base, _, index = name.partition("[")
+        base = base.replace(".", "_")
+        index = int(index.rstrip("]")) if index else 0
+        start = offset - 4 * index
+        _, _, is_float, length = members.get(base, (base, start, bits == 0, 0))
+        members[base] = (base, start, is_float, max(length, index + 1))
+    for name, offset, length in arrays:
+        members[name] = (name, offset, False, length)
+    return sorted(members.values(), key=lambda member: member[1])
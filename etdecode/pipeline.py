@@ -0,0 +1,145 @@
+import queue
+import threading
+import time
+
+QUEUE_SIZE = 64  # Items a stage may run ahead of the next one
+_POLL = 0.1  # Seconds between checks whether the other end gave up
+
+_END = object()
+
+
+class StageStats:
+    """Wall-clock accounting of one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0  # Producing items, including time starved for input
+        self.starved = 0.0  # Waiting for the previous stage
+        self.blocked = 0.0  # Waiting for room in the next stage's queue
+
+    @property
+    def work(self):
+        return max(self.busy - self.starved, 0.0)
+
+    def report(self):
+        return (f"{self.name:>9}: {self.items} items, {self.work:.2f}s working, "
+                f"{self.starved:.2f}s waiting for input, {self.blocked:.2f}s blocked on output")
+
+
+def _put(items, item, stop):
+    # Bounded put that gives up once the consumer is gone
+    while not stop.is_set():
+        try:
+            items.put(item, timeout=_POLL)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def threaded(iterable, stats, consumer_stats=None, queue_size=QUEUE_SIZE):
+    """Iterate over iterable on a background thread, yielding its items in order.
+
+    The queue between both threads is bounded, so a fast producer blocks until
+    the consumer catches up. An exception on the producer side is raised again
+    in the consumer, and a consumer that stops early stops the producer.
+    """
+    items = queue.Queue(queue_size)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            iterator = iter(iterable)
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    stats.busy += time.perf_counter() - start
+                stats.items += 1
+                start = time.perf_counter()
+                if not _put(items, (item, None), stop):
+                    return
+                stats.blocked += time.perf_counter() - start
+            _put(items, (_END, None), stop)
+        except BaseException as e:
+            _put(items, (_END, e), stop)
+
+    thread = threading.Thread(target=produce, name=f"etdecode-{stats.name}", daemon=True)
+    thread.start()
+    try:
+        while True:
+            start = time.perf_counter()
+            item, error = items.get()
+            if consumer_stats is not None:
+                consumer_stats.starved += time.perf_counter() - start
+            if item is _END:
+                if error is not None:
+                    raise error
+                break
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+class Writer:
+    """Runs write(item) for every submitted item on its own thread.
+
+    submit blocks while the queue is full. The first error raised by write is
+    raised again, once, from the next submit or from close, and nothing is
+    written after it.
+    """
+
+    def __init__(self, write, stats, submitter_stats=None, queue_size=QUEUE_SIZE):
+        self.write = write
+        self.stats = stats
+        self.submitter_stats = submitter_stats
+        self.error = None
+        self._raised = False
+        self._items = queue.Queue(queue_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"etdecode-{stats.name}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            start = time.perf_counter()
+            item = self._items.get()
+            waited = time.perf_counter() - start
+            self.stats.starved += waited
+            self.stats.busy += waited
+            if item is _END:
+                return
+            if self.error is not None:
+                continue  # Drain without writing once a write failed
+            start = time.perf_counter()
+            try:
+                self.write(item)
+            except BaseException as e:
+                self.error = e
+                self._stop.set()
+            self.stats.busy += time.perf_counter() - start
+            self.stats.items += 1
+
+    def _raise(self):
+        if self.error is not None and not self._raised:
+            self._raised = True
+            raise self.error
+
+    def submit(self, item):
+        self._raise()
+        start = time.perf_counter()
+        _put(self._items, item, self._stop)
+        if self.submitter_stats is not None:
+            self.submitter_stats.blocked += time.perf_counter() - start
+        self._raise()
+
+    def close(self):
+        # Wait for everything submitted to be written
+        self._items.put(_END)
+        self._thread.join()
+        self._raise()
@@ -0,0 +1,164 @@
+import numpy as np
+
+# matplotlib and scipy are imported by the functions that need them, parsing
+# never pays for them
+
+SMOOTHING_SIGMA = 2  # Samples, of the Gaussian the plotted positions are smoothed with
+TRACK_POINTS = 2000  # Points kept of each player's path, by LTTB
+HEATMAP_BINS = 512  # Bins across the longer side of the map
+FIGURE_SIZE = (12, 8)
+LEGEND_PLAYERS = 16  # More players than this get no legend, it would cover the map
+
+
+def lttb(x, y, points):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps of a path.
+
+    The first and last point are always kept. In between, every bucket of
+    consecutive points keeps the one spanning the largest triangle with the
+    point kept before it and the average of the next bucket, so turns and
+    peaks survive the downsampling.
+    """
+    count = len(x)
+    if points >= count or points < 3:
+        return np.arange(count)
+    # points - 2 buckets between the first and the last point, none of them empty
+    bounds = np.linspace(1, count - 1, points - 1).astype(np.int64)
+    sizes = np.diff(bounds)
+    next_x = np.append(np.add.reduceat(x[:count - 1], bounds[:-1])[1:] / sizes[1:], x[-1])
+    next_y = np.append(np.add.reduceat(y[:count - 1], bounds[:-1])[1:] / sizes[1:], y[-1])
+    kept = np.empty(points, dtype=np.int64)
+    kept[0] = previous = 0
+    kept[-1] = count - 1
+    for bucket in range(points - 2):
+        start, end = bounds[bucket], bounds[bucket + 1]
+        # Twice the triangle areas, the factor doesn't change the largest
+        areas = np.abs((x[previous] - next_x[bucket]) * (y[start:end] - y[previous]) -
+                       (x[previous] - x[start:end]) * (next_y[bucket] - y[previous]))
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+
+def min_max_indices(values, buckets):
+    # Indices of the smallest and largest value of each of buckets equal runs of
+    # values in order: what a line drawn buckets pixels wide can show of them
+    count = len(values)
+    if count <= 2 * buckets:
+        return np.arange(count)
+    bounds = np.linspace(0, count, buckets + 1).astype(np.int64)
+    order = np.lexsort((values, np.repeat(np.arange(buckets), np.diff(bounds))))
+    return np.unique(np.concatenate([order[bounds[:-1]], order[bounds[1:] - 1]]))
+
+
+def tracks(player_ids, moves):
+    # (player_id, x positions, y positions) of every player, one player's moves
+    # in memory at a time. moves(player_id) returns the rows player_moves does.
+    for player_id in player_ids:
+        rows = np.array(moves(player_id), dtype=np.float64).reshape(-1, 4)
+        yield player_id, rows[:, 1], rows[:, 2]
+
+
+def _figure(path, **options):
+    # A pyplot figure to show, or a bare Figure when it only goes to a file,
+    # which needs no display and leaves pyplot's state alone
+    if path is None:
+        import matplotlib.pyplot as plt
+        return plt.figure(**options)
+    from matplotlib.figure import Figure
+    return Figure(**options)
+
+
+def _finish(figure, path):
+    if path is None:
+        import matplotlib.pyplot as plt
+        plt.show()
+    else:
+        figure.savefig(path)
+
+
+def plot_paths(paths, path=None, points=TRACK_POINTS):
+    """Draw the x/y path of every player, (player_id, x, y) tuples as tracks gives.
+
+    Each path is cut down to points by LTTB before it is drawn, and
+    paths may be a generator, so only one full path is in memory at a
+    time. Shown in a window, or written to path (format from its
+    extension).
+    """
+    figure = _figure(path, figsize=FIGURE_SIZE)
+    axes = figure.add_subplot()
+    players = 0
+    for player_id, x_positions, y_positions in paths:
+        if not len(x_positions):
+            continue
+        kept = lttb(x_positions, y_positions, points)
+        line, = axes.plot(x_positions[kept], y_positions[kept], linewidth=0.8, alpha=0.7, label=f"Player {player_id}")
+        axes.scatter(x_positions[-1:], y_positions[-1:], s=12, color=line.get_color())  # Where the path ends
+        players += 1
+
+    axes.set_xlabel('X Position')
+    axes.set_ylabel('Y Position')
+    axes.set_title('Player Movement Paths')
+    axes.set_aspect('equal', adjustable='datalim')
+    if 0 < players <= LEGEND_PLAYERS:
+        axes.legend(loc='upper right', fontsize='small')
+    axes.grid(True)
+    _finish(figure, path)
+
+
+def _edges(low, high, size):
+    # Bin edges size apart from low, the last one at or beyond high
+    edges = low + np.arange(max(int(np.ceil((high - low) / size)), 1) + 1) * size
+    edges[-1] = max(edges[-1], high)
+    return edges
+
+
+def plot_heatmap(chunks, extent, path=None, bins=HEATMAP_BINS):
+    """Draw where all players were, from (x positions, y positions) chunks.
+
+    extent is ((min x, max x), (min y, max y)) of all positions. The
+    chunks are binned one at a time into bins across the longer side of
+    it, so memory depends on the bins only. Counts are drawn on a log
+    scale.
+    """
+    (x_min, x_max), (y_min, y_max) = extent
+    # Square bins, and never a zero-width range
+    size = max(x_max - x_min, y_max - y_min, 1.0) / bins
+    x_edges = _edges(x_min, x_max, size)
+    y_edges = _edges(y_min, y_max, size)
+    counts = np.zeros((len(x_edges) - 1, len(y_edges) - 1), dtype=np.int64)
+    for x_positions, y_positions in chunks:
+        counts += np.histogram2d(x_positions, y_positions, bins=(x_edges, y_edges))[0].astype(np.int64)
+
+    figure = _figure(path, figsize=FIGURE_SIZE)
+    axes = figure.add_subplot()
+    image = axes.imshow(np.log1p(counts.T), origin='lower', cmap='inferno', interpolation='nearest',
+                        extent=(x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]))
+    figure.colorbar(image, ax=axes, label='log(1 + positions)')
+    axes.set_xlabel('X Position')
+    axes.set_ylabel('Y Position')
+    axes.set_title('Player Position Density')
+    _finish(figure, path)
+
+
+def plot_moves(rows, player_id, path=None):
+    """Draw one player's smoothed position over time.
+
+    rows are (timestamp, pos_x, pos_y, pos_z) in time order, as
+    ActionDatabase.player_moves returns them. Each line keeps only the
+    minimum and maximum of every pixel column it covers.
+    """
+    from scipy.ndimage import gaussian_filter1d
+
+    values = np.array(rows, dtype=np.float64).reshape(-1, 4)
+    figure = _figure(path)
+    axes = figure.add_subplot()
+    buckets = int(figure.get_figwidth() * figure.dpi)
+    for column, name in enumerate(("X", "Y", "Z"), 1):
+        smooth = gaussian_filter1d(values[:, column], sigma=SMOOTHING_SIGMA) if len(values) else values[:, column]
+        kept = min_max_indices(smooth, buckets)
+        axes.plot(values[kept, 0], smooth[kept], label=f"Position {name}")
+    axes.set_xlabel("Timestamp")
+    axes.set_ylabel("Position")
+    axes.set_title(f"Player {player_id} Movement Data")
+    axes.legend()
+    _finish(figure, path)
@@ -0,0 +1,160 @@
+import os
+
+import numpy as np
+
+from etdecode.demo import DemoReader
+from etdecode.snapshot import SVC_GAMESTATE, SVC_NOP, SVC_SERVERCOMMAND, SVC_SNAPSHOT
+
+INDEX_SUFFIX = ".idx.npz"  # Sidecar file name, appended to the demo's
+INDEX_VERSION = 1
+
+# Message flags
+HAS_SNAPSHOT = 1
+FULL_SNAPSHOT = 2  # Not delta compressed, decodes from the baselines alone
+GAMESTATE = 4
+NO_TIME = -1  # server_time of messages without a snapshot
+
+
+def in_range(snapshots, start_time=None, end_time=None):
+    # The snapshots with start_time <= server_time < end_time, stopping at the first one past the range
+    for snapshot in snapshots:
+        if end_time is not None and snapshot.server_time >= end_time:
+            return
+        if start_time is None or snapshot.server_time >= start_time:
+            yield snapshot
+
+
+class DemoIndex:
+    """Byte offset, sequence number and server time of every message of a demo.
+
+    Built in one pass that reads no further into a message than the snapshot
+    header, so no entity is decoded. Full snapshots are keyframes: parsing can
+    start at one with an empty parser that has only seen the gamestate before
+    it, for the baselines.
+    """
+
+    def __init__(self, offsets, sequences, server_times, flags, size=0, mtime_ns=0):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.sequences = np.asarray(sequences, dtype=np.int32)
+        self.server_times = np.asarray(server_times, dtype=np.int64)
+        self.flags = np.asarray(flags, dtype=np.uint8)
+        self.size = size  # Of the demo file the index was built from
+        self.mtime_ns = mtime_ns
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @classmethod
+    def build(cls, demo_file, decoder):
+        offsets = []
+        sequences = []
+        server_times = []
+        flags = []
+        with DemoReader(demo_file) as reader:
+            for frame in decoder.messages(reader):
+                server_time, flag = cls._scan(decoder)
+                offsets.append(frame.offset)
+                sequences.append(frame.sequence)
+                server_times.append(server_time)
+                flags.append(flag)
+        stat = os.stat(demo_file)
+        return cls(offsets, sequences, server_times, flags, stat.st_size, stat.st_mtime_ns)
+
+    @staticmethod
+    def _scan(msg):
+        # Just enough of CL_ParseServerMessage to find the snapshot header
+        msg.read_long()  # reliableAcknowledge
+        while not msg.overflowed:
+            command = msg.read_byte()
+            if command == SVC_NOP:
+                continue
+            if command == SVC_SERVERCOMMAND:
+                msg.read_long()
+                msg.read_string()
+            elif command == SVC_GAMESTATE:
+                return NO_TIME, GAMESTATE
+            elif command == SVC_SNAPSHOT:
+                server_time = msg.read_long()
+                delta = msg.read_byte()
+                if msg.overflowed:
+                    break
+                return server_time, HAS_SNAPSHOT if delta else HAS_SNAPSHOT | FULL_SNAPSHOT
+            else:
+                break  # SVC_EOF, or nothing after it can be located
+        return NO_TIME, 0
+
+    def save(self, path):
+        with open(path, "wb") as file:  # A file object, so no .npz is appended to the name
+            np.savez(file, version=INDEX_VERSION, size=self.size, mtime_ns=self.mtime_ns, offsets=self.offsets,
+                     sequences=self.sequences, server_times=self.server_times, flags=self.flags)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data["version"]) != INDEX_VERSION:
+                raise ValueError(f"Unsupported demo index version in {path}")
+            return cls(data["offsets"], data["sequences"], data["server_times"], data["flags"],
+                       int(data["size"]), int(data["mtime_ns"]))
+
+    @classmethod
+    def for_demo(cls, demo_file, decoder, path=None):
+        # The sidecar index of a demo, rebuilt when missing or older than the demo
+        path = path or demo_file + INDEX_SUFFIX
+        stat = os.stat(demo_file)
+        if os.path.exists(path):
+            try:
+                index = cls.load(path)
+                if (index.size, index.mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+                    return index
+            except (OSError, ValueError, KeyError):
+                pass  # Unreadable, replaced below
+        index = cls.build(demo_file, decoder)
+        try:
+            index.save(path)
+        except OSError:
+            pass  # Read-only next to the demo, the index is just not kept
+        return index
+
+    @property
+    def keyframes(self):
+        # Message numbers of the full snapshots
+        return np.flatnonzero(self.flags & FULL_SNAPSHOT)
+
+    def start(self, server_time=None):
+        # (gamestate, keyframe) message numbers to start parsing from so that every
+        # snapshot from server_time on is decoded. The gamestate is None when there
+        # is none before the keyframe, both are 0 without any keyframe.
+        keyframes = self.keyframes
+        if not len(keyframes):
+            return 0, 0
+        keyframe = keyframes[0]
+        if server_time is not None:
+            before = keyframes[self.server_times[keyframes] <= server_time]
+            if len(before):
+                keyframe = before[-1]
+        gamestates = np.flatnonzero(self.flags[:keyframe + 1] & GAMESTATE)
+        gamestate = int(gamestates[-1]) if len(gamestates) else None
+        return gamestate, int(keyframe)
+
+    def frames(self, reader, start_time=None):
+        # Frames of an open DemoReader for a fresh SnapshotParser to reach start_time
+        gamestate, keyframe = self.start(start_time)
+        if not len(self):
+            return
+        if gamestate is not None and gamestate != keyframe:
+            yield next(reader.messages(int(self.offsets[gamestate])))
+        yield from reader.messages(int(self.offsets[keyframe]))
+
+    def segments(self, parts):
+        # Split the demo into at most parts (start_time, end_time) ranges of about
+        # as many messages each, cut at keyframes. None leaves a range open.
+        keyframes = self.keyframes
+        cuts = []
+        for part in range(1, parts):
+            position = np.searchsorted(keyframes, len(self) * part // parts)
+            if position < len(keyframes):
+                time = int(self.server_times[keyframes[position]])
+                if position and (not cuts or time > cuts[-1]):
+                    cuts.append(time)
+        bounds = [None] + cuts + [None]
+        return list(zip(bounds[:-1], bounds[1:]))
@@ -0,0 +1,321 @@
+from collections import namedtuple
+
+import numpy as np
+
+from etdecode.netfields import (
+    ENTITY_STATE_FIELDS,
+    ENTITY_STATE_SIZE,
+    ENTITYNUM_NONE,
+    GENTITYNUM_BITS,
+    MAX_GENTITIES,
+    PLAYER_STATE_ARRAYS,
+    PLAYER_STATE_FIELDS,
+    PLAYER_STATE_SIZE,
+    struct_layout,
+)
+
+MAX_CLIENTS = 64
+MAX_CONFIGSTRINGS = 1024
+PACKET_BACKUP = 32  # Snapshots a delta may refer back to
+PACKET_MASK = PACKET_BACKUP - 1
+
+# Rows of the parse entity ring. A snapshot always gets MAX_GENTITIES contiguous
+# rows, so its entities are a plain slice of the ring.
+MAX_PARSE_ENTITIES = PACKET_BACKUP * 256
+
+# svc_ops_e
+SVC_BAD = 0
+SVC_NOP = 1
+SVC_GAMESTATE = 2
+SVC_CONFIGSTRING = 3
+SVC_BASELINE = 4
+SVC_SERVERCOMMAND = 5
+SVC_DOWNLOAD = 6
+SVC_SNAPSHOT = 7
+SVC_EOF = 8
+
+
+def _numpy_dtype(layout, size):
+    names, formats, offsets = [], [], []
+    for name, offset, is_float, length in layout:
+        scalar = np.float32 if is_float else np.int32
+        names.append(name)
+        formats.append((scalar, (length,)) if length > 1 else scalar)
+        offsets.append(offset)
+    return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": size})
+
+
+# Binary compatible with entityState_t/playerState_t, rows can be handed to the engine
+ENTITY_STATE_DTYPE = _numpy_dtype(struct_layout(ENTITY_STATE_FIELDS, (("number", 0, 1),)), ENTITY_STATE_SIZE)
+PLAYER_STATE_DTYPE = _numpy_dtype(struct_layout(PLAYER_STATE_FIELDS, PLAYER_STATE_ARRAYS), PLAYER_STATE_SIZE)
+
+# entities is a view into the parse entity ring and changed indexes the rows of it
+# that were delta decoded in this snapshot. Both stay valid until the ring wraps,
+# consume them before asking for the next snapshots.
+Snapshot = namedtuple("Snapshot", ["message_num", "server_time", "delta_num", "snap_flags", "ps", "entities", "changed"])
+
+
+def detach(snapshot):
+    # A copy with only the changed entities and the player state, safe to keep
+    # after the parser has moved on
+    return snapshot._replace(ps=snapshot.ps.copy(), entities=snapshot.entities[snapshot.changed],
+                             changed=np.arange(len(snapshot.changed)))
+
+
+class SnapshotParser:
+    """Rebuilds snapshots from server messages the way CL_ParseServerMessage does.
+
+    All states live in preallocated NumPy arrays: the baselines, a ring of parse
+    entities the snapshots slice into, the player states of the last
+    PACKET_BACKUP snapshots and the current state of every entity number.
+    Deltas are decoded straight into those rows.
+    """
+
+    def __init__(self, decoder):
+        self.decoder = decoder
+        self.baselines = np.zeros(MAX_GENTITIES, dtype=ENTITY_STATE_DTYPE)
+        self.parse_entities = np.zeros(MAX_PARSE_ENTITIES, dtype=ENTITY_STATE_DTYPE)
+        self.player_states = np.zeros(PACKET_BACKUP, dtype=PLAYER_STATE_DTYPE)
+        self.entities = np.zeros(MAX_GENTITIES, dtype=ENTITY_STATE_DTYPE)  # Latest state per entity number
+        # Structured copies skip the bytes no field covers, rows are copied as words
+        self._parse_words = self.parse_entities.view(np.int32).reshape(MAX_PARSE_ENTITIES, -1)
+        self._entity_words = self.entities.view(np.int32).reshape(MAX_GENTITIES, -1)
+        self.active = np.zeros(MAX_GENTITIES, dtype=bool)  # Present in the latest snapshot
+
+        # Bookkeeping of the snapshot ring, indexed by message number & PACKET_MASK
+        self._snap_message = [-1] * PACKET_BACKUP
+        self._snap_first = [0] * PACKET_BACKUP  # Absolute parse entity number of the first row
+        self._snap_count = [0] * PACKET_BACKUP
+        self.parse_entities_num = 0
+
+        self.configstrings = {}
+        self.client_num = -1
+        self.server_command_sequence = 0
+        self.gamestates = 0
+        self.bad_messages = 0
+        self.dropped_snapshots = 0
+
+    def snapshots(self, frames):
+        # Decode framed demo messages, yielding every valid snapshot
+        decoder = self.decoder
+        for frame in decoder.messages(frames):
+            yield from self.parse_message(frame.sequence)
+
+    def state(self):
+        # Everything the next message is parsed against, as arrays and plain values.
+        # The state arrays are kept as their words, padding included.
+        return {
+            "baselines": self.baselines.view(np.int32),
+            "parse_entities": self._parse_words,
+            "player_states": self.player_states.view(np.int32),
+            "entities": self._entity_words,
+            "active": self.active,
+            "snap_message": np.array(self._snap_message, dtype=np.int64),
+            "snap_first": np.array(self._snap_first, dtype=np.int64),
+            "snap_count": np.array(self._snap_count, dtype=np.int64),
+            "parse_entities_num": self.parse_entities_num,
+            "configstrings": self.configstrings,
+            "client_num": self.client_num,
+            "server_command_sequence": self.server_command_sequence,
+            "gamestates": self.gamestates,
+            "bad_messages": self.bad_messages,
+            "dropped_snapshots": self.dropped_snapshots,
+        }
+
+    def restore(self, state):
+        # Continue from a state() of another parser
+        self.baselines.view(np.int32)[:] = state["baselines"]
+        self._parse_words[:] = state["parse_entities"]
+        self.player_states.view(np.int32)[:] = state["player_states"]
+        self._entity_words[:] = state["entities"]
+        self.active[:] = state["active"]
+        self._snap_message = state["snap_message"].tolist()
+        self._snap_first = state["snap_first"].tolist()
+        self._snap_count = state["snap_count"].tolist()
+        self.parse_entities_num = state["parse_entities_num"]
+        self.configstrings = {int(index): value for index, value in state["configstrings"].items()}
+        for name in ("client_num", "server_command_sequence", "gamestates", "bad_messages", "dropped_snapshots"):
+            setattr(self, name, state[name])
+
+    def parse_message(self, sequence):
+        # The message is already loaded into the decoder
+        msg = self.decoder
+        msg.read_long()  # reliableAcknowledge
+        snapshots = []
+        while True:
+            if msg.overflowed:
+                self.bad_messages += 1
+                break
+            command = msg.read_byte()
+            if command == SVC_EOF:
+                break
+            if command == SVC_NOP:
+                continue
+            if command == SVC_SERVERCOMMAND:
+                self.server_command_sequence = msg.read_long()
+                msg.read_string()
+            elif command == SVC_GAMESTATE:
+                if not self._parse_gamestate():
+                    self.bad_messages += 1
+                    break
+            elif command == SVC_SNAPSHOT:
+                snapshot = self._parse_snapshot(sequence)
+                if snapshot is False:
+                    self.bad_messages += 1
+                    break
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+            else:
+                # Nothing after an unknown command can be located
+                self.bad_messages += 1
+                break
+        return snapshots
+
+    def _parse_gamestate(self):
+        msg = self.decoder
+        self.server_command_sequence = msg.read_long()
+        self.configstrings = {}
+        self.baselines[:] = 0
+        self.active[:] = False
+        self._snap_message = [-1] * PACKET_BACKUP
+
+        while True:
+            command = msg.read_byte()
+            if command == SVC_EOF:
+                break
+            if command == SVC_CONFIGSTRING:
+                index = msg.read_short()
+                if index < 0 or index >= MAX_CONFIGSTRINGS:
+                    return False
+                self.configstrings[index] = msg.read_big_string()
+            elif command == SVC_BASELINE:
+                number = msg.read_bits(GENTITYNUM_BITS)
+                if not msg.read_delta_entity_at(None, 0, self.baselines, number, number):
+                    return False
+            else:
+                return False
+            if msg.overflowed:
+                return False
+
+        self.client_num = msg.read_long()
+        msg.read_long()  # checksumFeed
+        self.gamestates += 1
+        return not msg.overflowed
+
+    def _parse_snapshot(self, message_num):
+        msg = self.decoder
+        server_time = msg.read_long()
+        delta = msg.read_byte()
+        delta_num = message_num - delta if delta else -1
+        snap_flags = msg.read_byte()
+
+        # Start the new snapshot on a fresh stretch of the ring
+        head = self.parse_entities_num % MAX_PARSE_ENTITIES
+        if head + MAX_GENTITIES > MAX_PARSE_ENTITIES:
+            self.parse_entities_num += MAX_PARSE_ENTITIES - head
+            head = 0
+
+        # A delta needs the snapshot it refers to, with its entity rows not yet reused
+        old_slot = None
+        valid = True
+        if delta_num > 0:
+            old_slot = delta_num & PACKET_MASK
+            if self._snap_message[old_slot] != delta_num:
+                valid = False
+            elif self.parse_entities_num + MAX_GENTITIES - self._snap_first[old_slot] > MAX_PARSE_ENTITIES:
+                valid = False
+
+        area_bytes = msg.read_byte()
+        msg.read_data(area_bytes)  # areamask
+
+        slot = message_num & PACKET_MASK
+        old_states = self.player_states if old_slot is not None else None
+        if not msg.read_delta_playerstate_at(old_states, old_slot, self.player_states, slot):
+            return False
+
+        changed = self._parse_packet_entities(old_slot, head)
+        if changed is None:
+            return False
+        count = len(changed[0])
+
+        if not valid:
+            # The rows were read only to get past them
+            self._snap_message[slot] = -1
+            self.dropped_snapshots += 1
+            return None
+
+        first = self.parse_entities_num
+        self.parse_entities_num += count
+        self._snap_message[slot] = message_num
+        self._snap_first[slot] = first
+        self._snap_count[slot] = count
+
+        entities = self.parse_entities[head:head + count]
+        changed = np.array(changed[1], dtype=np.intp)
+        numbers = entities["number"]
+        self.active[:] = False
+        self.active[numbers] = True
+        self._entity_words[numbers[changed]] = self._parse_words[head + changed]
+        return Snapshot(message_num, server_time, delta_num, snap_flags, self.player_states[slot], entities, changed)
+
+    def _parse_packet_entities(self, old_slot, head):
+        # CL_ParsePacketEntities: merge the sorted old entity list with the numbers
+        # sent in this message. Returns (row numbers, rows that were delta decoded).
+        msg = self.decoder
+        rows = self.parse_entities
+        words = self._parse_words
+        baselines = self.baselines
+        numbers = []
+        changed = []
+
+        if old_slot is not None and self._snap_message[old_slot] != -1 and \
+                self.parse_entities_num + MAX_GENTITIES - self._snap_first[old_slot] <= MAX_PARSE_ENTITIES:
+            old_start = self._snap_first[old_slot] % MAX_PARSE_ENTITIES
+            old_numbers = rows["number"][old_start:old_start + self._snap_count[old_slot]].tolist()
+        else:
+            old_start = 0
+            old_numbers = []
+        old_index = 0
+        old_count = len(old_numbers)
+        old_number = old_numbers[0] if old_count else MAX_GENTITIES
+        row = head
+
+        while True:
+            new_number = msg.read_bits(GENTITYNUM_BITS)
+            if new_number == ENTITYNUM_NONE:
+                break
+            if msg.overflowed:
+                return None
+
+            while old_number < new_number:
+                # Not in the message, unchanged from the old snapshot
+                words[row] = words[old_start + old_index]
+                numbers.append(old_number)
+                row += 1
+                old_index += 1
+                old_number = old_numbers[old_index] if old_index < old_count else MAX_GENTITIES
+
+            # Rows are passed by index, the native reader needs no slice of them
+            if old_number == new_number:
+                source, source_row = rows, old_start + old_index
+                old_index += 1
+                old_number = old_numbers[old_index] if old_index < old_count else MAX_GENTITIES
+            else:
+                source, source_row = baselines, new_number
+
+            if not msg.read_delta_entity_at(source, source_row, rows, row, new_number):
+                return None
+            if rows["number"][row] != ENTITYNUM_NONE:
+                # Still present, a removed entity leaves its row to the next one
+                changed.append(row - head)
+                numbers.append(new_number)
+                row += 1
+
+        while old_number < MAX_GENTITIES:
+            words[row] = words[old_start + old_index]
+            numbers.append(old_number)
+            row += 1
+            old_index += 1
+            old_number = old_numbers[old_index] if old_index < old_count else MAX_GENTITIES
+
+        return numbers, changed
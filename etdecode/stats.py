@@ -0,0 +1,103 @@
+import cProfile
+import io
+import json
+import logging
+import pstats
+import time
+from collections import Counter
+
+LOG_INTERVAL = 10.0  # Seconds in which a kind of log message is written only once
+PROFILE_LINES = 25  # Functions listed in the profile report
+
+
+class RateLimitedLog:
+    """Writes each kind of message at most once per interval to a logger.
+
+    Messages are told apart by a key. Those dropped are counted and the
+    number is added to the next message of the same key that gets through.
+    """
+
+    def __init__(self, logger, interval=LOG_INTERVAL):
+        self.logger = logger
+        self.interval = interval
+        self._last = {}  # key: (time written, messages dropped since)
+
+    def log(self, level, key, message, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        last, dropped = self._last.get(key, (None, 0))
+        if last is not None and now - last < self.interval:
+            self._last[key] = (last, dropped + 1)
+            return
+        if dropped:
+            message += " (%d more like it suppressed)"
+            args += (dropped,)
+        self.logger.log(level, message, *args)
+        self._last[key] = (now, 0)
+
+    def warning(self, key, message, *args):
+        self.log(logging.WARNING, key, message, *args)
+
+    def error(self, key, message, *args):
+        self.log(logging.ERROR, key, message, *args)
+
+
+class ParseStats:
+    """Counters and stage timers of one parse.
+
+    Timers are integer nanoseconds from time.perf_counter_ns. With
+    profile_every set, one snapshot in that many is run under cProfile.
+    """
+
+    def __init__(self, profile_every=0):
+        self.counters = Counter()
+        self.timers_ns = Counter()
+        self.profile_every = profile_every
+        self.profiler = cProfile.Profile() if profile_every > 0 else None
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def add_time(self, name, nanoseconds):
+        self.timers_ns[name] += nanoseconds
+
+    def seconds(self, name):
+        return self.timers_ns[name] / 1e9
+
+    def profile_report(self, lines=PROFILE_LINES):
+        # The functions that took most time in the profiled snapshots, as pstats prints them
+        if self.profiler is None:
+            return None
+        text = io.StringIO()
+        try:
+            pstats.Stats(self.profiler, stream=text).sort_stats("cumulative").print_stats(lines)
+        except TypeError:
+            return None  # Nothing was profiled
+        return text.getvalue()
+
+    def as_dict(self):
+        values = {
+            "counters": dict(self.counters),
+            "seconds": {name: nanoseconds / 1e9 for name, nanoseconds in self.timers_ns.items()},
+        }
+        total = self.timers_ns.get("total")
+        if total:
+            values["messages_per_s"] = self.counters["messages"] * 1e9 / total
+            values["mb_per_s"] = self.counters["bytes_read"] * 1e3 / total
+        if self.profiler is not None:
+            values["profile"] = self.profile_report()
+        return values
+
+    def to_json(self, path=None):
+        # The stats as a JSON document, also written to path when one is given
+        text = json.dumps(self.as_dict(), indent=2)
+        if path is not None:
+            with open(path, "w") as file:
+                file.write(text)
+        return text
+
+    def report(self):
+        lines = [", ".join(f"{name} {count}" for name, count in sorted(self.counters.items()))]
+        lines.append(", ".join(f"{name} {nanoseconds / 1e9:.3f}s" for name, nanoseconds in sorted(self.timers_ns.items())))
+        return "\n".join(lines)
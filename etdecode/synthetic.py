@@ -0,0 +1,231 @@
+import argparse
+
+import numpy as np
+
+from etdecode.constants import ET_EVENTS, ET_ITEM, ET_PLAYER, EV_BULLET_HIT_FLESH, EV_FILL_CLIP, EV_FIRE_WEAPON, \
+    EVENT_SEQUENCE_MASK, MAX_EVENTS
+from etdecode.demo import FRAME_HEADER
+from etdecode.msg import MessageWriter
+from etdecode.netfields import ENTITYNUM_NONE, GENTITYNUM_BITS, MAX_GENTITIES
+from etdecode.snapshot import ENTITY_STATE_DTYPE, MAX_CLIENTS, PLAYER_STATE_DTYPE, SVC_BASELINE, SVC_CONFIGSTRING, \
+    SVC_EOF, SVC_GAMESTATE, SVC_SNAPSHOT
+
+SNAPSHOT_MSEC = 50  # sv_fps 20
+SNAPSHOTS = 12000  # Ten minutes
+PLAYERS = 20  # Clients on the server, client 0 records the demo
+ITEMS = 32  # Other entities, a few of them moving
+FIRE_RATE = 2.0  # Shots per player per second
+HIT_RATIO = 0.3  # Share of the shots that hit a player
+RELOAD_RATE = 0.05  # Reloads per player per second
+KEYFRAME_INTERVAL = 200  # Snapshots between full (non-delta) snapshots
+
+ITEM_FIRST = MAX_CLIENTS  # Entity numbers of the items
+TEMP_FIRST = 512  # Entity numbers the temporary hit events cycle through
+TEMP_ENTITIES = 256
+MAX_SPEED = 320.0  # g_speed
+SERVER_INFO = "\\mapname\\synthetic\\sv_hostname\\etdecode\\sv_fps\\20"
+WRITERS = ("python", "native")  # What encodes the messages, both give the same bytes
+
+
+def _create_writer(writer):
+    if writer not in WRITERS:
+        raise ValueError(f"Unknown message writer: {writer!r} (expected one of {', '.join(WRITERS)})")
+    if writer == "native":
+        from etdecode.native import NativeWriter
+        return NativeWriter()
+    return MessageWriter()
+
+
+def _begin(writer):
+    writer.begin()
+    writer.write_bits(0, 32)  # reliableAcknowledge
+
+
+def _finish(writer):
+    writer.write_bits(SVC_EOF, 8)
+    if writer.overflowed:
+        raise ValueError("Synthetic message larger than MAX_MSGLEN, use fewer entities")
+    return writer.data()
+
+
+def generate_demo(path, snapshots=SNAPSHOTS, players=PLAYERS, items=ITEMS, seed=0, fire_rate=FIRE_RATE,
+                  hit_ratio=HIT_RATIO, reload_rate=RELOAD_RATE, keyframe_interval=KEYFRAME_INTERVAL, writer="python"):
+    """Write a deterministic synthetic demo to path.
+
+    players run around, turn, switch weapons, fire, hit and reload at the
+    given rates, client 0 as the recording player. The same arguments
+    always give the same file. The messages are encoded in pure Python, or
+    with huffman.so for writer="native". Returns the number of messages,
+    bytes and events written.
+    """
+    if not 1 <= players <= MAX_CLIENTS:
+        raise ValueError(f"players must be between 1 and {MAX_CLIENTS}")
+    if not 0 <= items <= TEMP_FIRST - ITEM_FIRST:
+        raise ValueError(f"items must be between 0 and {TEMP_FIRST - ITEM_FIRST}")
+    rng = np.random.default_rng(seed)
+    writer = _create_writer(writer)
+    dt = SNAPSHOT_MSEC / 1000.0
+
+    # Baselines of every player but the recording one, and of the items
+    baselines = np.zeros(MAX_GENTITIES, dtype=ENTITY_STATE_DTYPE)
+    null_state = np.zeros(1, dtype=ENTITY_STATE_DTYPE)
+    clients = np.arange(1, players)
+    baselines["number"] = np.arange(MAX_GENTITIES)
+    baselines["eType"][clients] = ET_PLAYER
+    baselines["clientNum"][clients] = clients
+    item_numbers = np.arange(ITEM_FIRST, ITEM_FIRST + items)
+    baselines["eType"][item_numbers] = ET_ITEM
+    baselines["pos_trBase"][item_numbers] = rng.uniform(-2000, 2000, (items, 3)).astype(np.float32)
+
+    state = baselines.copy()
+    present = np.zeros(MAX_GENTITIES, dtype=bool)
+    present[clients] = True
+    present[item_numbers] = True
+    old_state = state.copy()
+    old_present = np.zeros(MAX_GENTITIES, dtype=bool)
+    ps = np.zeros(1, dtype=PLAYER_STATE_DTYPE)
+    old_ps = ps.copy()
+    # The states as rows of words, what the writers take
+    words = ENTITY_STATE_DTYPE.itemsize >> 2
+    baseline_words = baselines.view(np.int32).reshape(MAX_GENTITIES, words)
+    state_words = state.view(np.int32).reshape(MAX_GENTITIES, words)
+    old_words = old_state.view(np.int32).reshape(MAX_GENTITIES, words)
+    null_words = null_state.view(np.int32)
+
+    positions = rng.uniform(-2000, 2000, (players, 3)).astype(np.float32)
+    positions[:, 2] = 0
+    velocities = np.zeros((players, 2))
+    angles = np.zeros((players, 3), dtype=np.float32)
+    angles[:, 1] = rng.uniform(0, 360, players)
+    weapons = rng.integers(1, 26, players)
+    sequences = np.zeros(players, dtype=np.int64)
+    events = np.zeros((players, MAX_EVENTS), dtype=np.int64)
+    counts = {"messages": 0, "bytes": 0, "fires": 0, "hits": 0, "reloads": 0}
+    next_temp = 0
+
+    with open(path, "wb") as demo:
+        def write_frame(data):
+            counts["messages"] += 1
+            demo.write(FRAME_HEADER.pack(counts["messages"], len(data)))
+            demo.write(data)
+
+        _begin(writer)
+        writer.write_bits(SVC_GAMESTATE, 8)
+        writer.write_bits(0, 32)  # serverCommandSequence
+        writer.write_bits(SVC_CONFIGSTRING, 8)
+        writer.write_bits(0, 16)  # CS_SERVERINFO
+        writer.write_string(SERVER_INFO)
+        for number in np.flatnonzero(present).tolist():
+            writer.write_bits(SVC_BASELINE, 8)
+            writer.write_delta_entity(null_words, baseline_words[number], 1)
+        writer.write_bits(SVC_EOF, 8)
+        writer.write_bits(0, 32)  # clientNum
+        writer.write_bits(seed & 0x7FFFFFFF, 32)  # checksumFeed
+        write_frame(_finish(writer))
+
+        for snapshot in range(snapshots):
+            server_time = (snapshot + 1) * SNAPSHOT_MSEC
+
+            # Move and turn everyone, a fifth of the players holding their aim still
+            velocities += rng.normal(0, 40, velocities.shape)
+            speed = np.hypot(velocities[:, 0], velocities[:, 1])
+            velocities *= np.minimum(1.0, MAX_SPEED / np.maximum(speed, 1e-9))[:, None]
+            positions[:, :2] += (velocities * dt).astype(np.float32)
+            turning = rng.random(players) >= 0.2
+            angles[turning, 0] = np.clip(angles[turning, 0] + rng.normal(0, 1, turning.sum()), -80, 80)
+            angles[turning, 1] = (angles[turning, 1] + rng.normal(0, 4, turning.sum())) % 360
+            flicks = turning & (rng.random(players) < 0.01)
+            angles[flicks, 1] = (angles[flicks, 1] + rng.uniform(-90, 90, flicks.sum())) % 360
+            switching = rng.random(players) < 0.002
+            weapons[switching] = rng.integers(1, 26, switching.sum())
+
+            # Weapon events go into the events[] ring under eventSequence
+            firing = rng.random(players) < fire_rate * dt
+            reloading = rng.random(players) < reload_rate * dt
+            for event, mask in ((EV_FIRE_WEAPON, firing), (EV_FILL_CLIP, reloading)):
+                slots = sequences[mask] % MAX_EVENTS
+                events[np.flatnonzero(mask), slots] = event
+                sequences[mask] = (sequences[mask] + 1) & EVENT_SEQUENCE_MASK
+            counts["fires"] += int(firing.sum())
+            counts["reloads"] += int(reloading.sum())
+
+            state["pos_trBase"][clients] = positions[1:]
+            state["apos_trBase"][clients] = angles[1:]
+            state["weapon"][clients] = weapons[1:]
+            state["eventSequence"][clients] = sequences[1:]
+            state["events"][clients] = events[1:]
+            moving = item_numbers[rng.random(items) < 0.05]
+            state["pos_trBase"][moving] += rng.normal(0, 8, (len(moving), 3)).astype(np.float32)
+
+            # Bullet hits are temporary entities naming the shooter, gone a snapshot later
+            present[TEMP_FIRST:TEMP_FIRST + TEMP_ENTITIES] = False
+            for shooter in np.flatnonzero(firing & (rng.random(players) < hit_ratio)).tolist():
+                number = TEMP_FIRST + next_temp
+                next_temp = (next_temp + 1) % TEMP_ENTITIES
+                state[number] = baselines[number]
+                state["eType"][number] = ET_EVENTS + EV_BULLET_HIT_FLESH
+                state["otherEntityNum"][number] = shooter
+                state["pos_trBase"][number] = positions[rng.integers(0, players)]
+                present[number] = True
+                counts["hits"] += 1
+
+            ps["commandTime"] = server_time
+            ps["clientNum"] = 0
+            ps["origin"] = positions[0]
+            ps["viewangles"] = angles[0]
+            ps["weapon"] = weapons[0]
+            ps["eventSequence"] = sequences[0]
+            ps["events"] = events[0]
+
+            full = snapshot % keyframe_interval == 0
+            _begin(writer)
+            writer.write_bits(SVC_SNAPSHOT, 8)
+            writer.write_bits(server_time, 32)
+            writer.write_bits(0 if full else 1, 8)  # Delta from the previous message
+            writer.write_bits(0, 8)  # snapFlags
+            writer.write_bits(0, 8)  # No areamask bytes
+            writer.write_delta_playerstate(None if full else old_ps.view(np.int32), ps.view(np.int32))
+            if full:
+                old_present[:] = False
+            for number in np.flatnonzero(present | old_present).tolist():
+                if not old_present[number]:
+                    writer.write_delta_entity(baseline_words[number], state_words[number], 1)
+                elif not present[number]:
+                    writer.write_delta_entity(old_words[number], None, 1)
+                else:
+                    writer.write_delta_entity(old_words[number], state_words[number], 0)
+            writer.write_bits(ENTITYNUM_NONE, GENTITYNUM_BITS)
+            write_frame(_finish(writer))
+
+            # Whole rows as words, padding included
+            old_state.view(np.int32)[:] = state.view(np.int32)
+            old_present[:] = present
+            old_ps.view(np.int32)[:] = ps.view(np.int32)
+
+        demo.write(FRAME_HEADER.pack(-1, -1))
+        counts["bytes"] = demo.tell()
+    return counts
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Write a deterministic synthetic demo.")
+    parser.add_argument("output", help="demo file to write")
+    parser.add_argument("--snapshots", type=int, default=SNAPSHOTS)
+    parser.add_argument("--players", type=int, default=PLAYERS)
+    parser.add_argument("--items", type=int, default=ITEMS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fire-rate", type=float, default=FIRE_RATE, help="shots per player per second")
+    parser.add_argument("--hit-ratio", type=float, default=HIT_RATIO, help="share of the shots that hit")
+    parser.add_argument("--reload-rate", type=float, default=RELOAD_RATE, help="reloads per player per second")
+    parser.add_argument("--keyframe-interval", type=int, default=KEYFRAME_INTERVAL,
+                        help="snapshots between full snapshots")
+    parser.add_argument("--writer", default="python", choices=WRITERS, help="what encodes the messages")
+    options = parser.parse_args(args)
+    counts = generate_demo(options.output, options.snapshots, options.players, options.items, options.seed,
+                           options.fire_rate, options.hit_ratio, options.reload_rate, options.keyframe_interval,
+                           options.writer)
+    print(f"Wrote {options.output}: " + ", ".join(f"{count} {name}" for name, count in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+/*
+ * Definitions of the engine symbols huffman.dll leaves unresolved.
+ *
+ * huffman.dll (huffman.so) is the message code of an ET client build, linked
+ * without the rest of the engine. ctypes loads libraries with RTLD_NOW, so
+ * without these the load fails on the first missing symbol. etdecode.native
+ * loads this library RTLD_GLOBAL before huffman.dll so they resolve here.
+ *
+ * None of the functions are reached while reading or writing messages, they
+ * only satisfy the linker. The variables are zeroed storage large enough for
+ * the structs they stand for; cl_shownet points at zeros, so MSG_ debug output
+ * stays off. Build with `make -C native`.
+ */
+
+static char zeros[65536];
+void *cl_shownet = zeros;
+long CIN_CloseAllVideos(void) { return 0; }
+long CL_CharEvent(void) { return 0; }
+long CL_ConsolePrint(void) { return 0; }
+long CL_Disconnect(void) { return 0; }
+long CL_FlushMemory(void) { return 0; }
+long CL_Frame(void) { return 0; }
+long CL_GameCompleteCommand(void) { return 0; }
+long CL_Init(void) { return 0; }
+long CL_InitKeyCommands(void) { return 0; }
+long CL_JoystickEvent(void) { return 0; }
+long CL_KeyEvent(void) { return 0; }
+long CL_MouseEvent(void) { return 0; }
+long CL_PacketEvent(void) { return 0; }
+long CL_Shutdown(void) { return 0; }
+long CL_ShutdownCGame(void) { return 0; }
+long CL_ShutdownUI(void) { return 0; }
+long CL_StartHunkUsers(void) { return 0; }
+long COM_CompareExtension(void) { return 0; }
+long COM_DefaultExtension(void) { return 0; }
+long COM_Parse(void) { return 0; }
+long Cbuf_AddText(void) { return 0; }
+long Cbuf_Execute(void) { return 0; }
+long Cbuf_ExecuteText(void) { return 0; }
+long Cbuf_Init(void) { return 0; }
+long Cmd_AddSystemCommand(void) { return 0; }
+long Cmd_Argc(void) { return 0; }
+long Cmd_ArgsFrom(void) { return 0; }
+long Cmd_Argv(void) { return 0; }
+long Cmd_CommandCompletion(void) { return 0; }
+long Cmd_CompleteArgument(void) { return 0; }
+long Cmd_Init(void) { return 0; }
+long Cmd_RemoveCommand(void) { return 0; }
+long Cmd_TokenizeString(void) { return 0; }
+long Cmd_TokenizeStringIgnoreQuotes(void) { return 0; }
+long Com_Download_f(void) { return 0; }
+long Com_SkipCharset(void) { return 0; }
+long Com_TruncateLongString(void) { return 0; }
+long Com_UpdateVarsClean(void) { return 0; }
+long Com_Update_f(void) { return 0; }
+long Com_sprintf(void) { return 0; }
+long Cvar_CheckRange(void) { return 0; }
+long Cvar_CommandCompletion(void) { return 0; }
+long Cvar_Flags(void) { return 0; }
+long Cvar_Get(void) { return 0; }
+long Cvar_Init(void) { return 0; }
+long Cvar_Set(void) { return 0; }
+long Cvar_Set2(void) { return 0; }
+long Cvar_SetDescription(void) { return 0; }
+long Cvar_SetValue(void) { return 0; }
+long Cvar_VariableIntegerValue(void) { return 0; }
+long Cvar_VariableString(void) { return 0; }
+long Cvar_WriteVariables(void) { return 0; }
+long FS_Delete(void) { return 0; }
+long FS_FCloseFile(void) { return 0; }
+long FS_FOpenFileByMode(void) { return 0; }
+long FS_FOpenFileRead(void) { return 0; }
+long FS_FOpenFileWrite(void) { return 0; }
+long FS_FileExists(void) { return 0; }
+long FS_FilenameCompare(void) { return 0; }
+long FS_FilenameCompletion(void) { return 0; }
+long FS_ForceFlush(void) { return 0; }
+long FS_FreeFile(void) { return 0; }
+long FS_InitFilesystem(void) { return 0; }
+long FS_Initialized(void) { return 0; }
+long FS_LoadStack(void) { return 0; }
+long FS_Printf(void) { return 0; }
+long FS_PureServerSetLoadedPaks(void) { return 0; }
+long FS_Read(void) { return 0; }
+long FS_ReadFile(void) { return 0; }
+long FS_Shutdown(void) { return 0; }
+long FS_Write(void) { return 0; }
+long IN_Frame(void) { return 0; }
+long Key_KeynameCompletion(void) { return 0; }
+long Key_WriteBindings(void) { return 0; }
+long NET_GetLoopPacket(void) { return 0; }
+long NET_Init(void) { return 0; }
+long NET_Sleep(void) { return 0; }
+long Netchan_Init(void) { return 0; }
+long Q_CleanDirName(void) { return 0; }
+long Q_CleanStr(void) { return 0; }
+long Q_Extended_To_UTF8(void) { return 0; }
+long Q_SafeNetString(void) { return 0; }
+long Q_UTF8_ByteOffset(void) { return 0; }
+long Q_UTF8_Insert(void) { return 0; }
+long Q_UTF8_Strlen(void) { return 0; }
+long Q_strcat(void) { return 0; }
+long Q_stricmp(void) { return 0; }
+long Q_stricmpn(void) { return 0; }
+long Q_strncmp(void) { return 0; }
+long Q_strncpyz(void) { return 0; }
+long SV_Frame(void) { return 0; }
+long SV_FrameMsec(void) { return 0; }
+long SV_Init(void) { return 0; }
+long SV_PacketEvent(void) { return 0; }
+long SV_SendQueuedPackets(void) { return 0; }
+long SV_Shutdown(void) { return 0; }
+long SV_ShutdownGameProgs(void) { return 0; }
+long Sys_ConsoleInput(void) { return 0; }
+long Sys_Dialog(void) { return 0; }
+long Sys_Error(void) { return 0; }
+long Sys_Init(void) { return 0; }
+long Sys_Milliseconds(void) { return 0; }
+long Sys_PID(void) { return 0; }
+long Sys_Print(void) { return 0; }
+long Sys_Quit(void) { return 0; }
+long Sys_RandomBytes(void) { return 0; }
+long Sys_WritePIDFile(void) { return 0; }
+long VM_Clear(void) { return 0; }
+long VM_Init(void) { return 0; }
+char c_brush_traces[65536];
+char c_patch_traces[65536];
+char c_pointcontents[65536];
+char c_traces[65536];
+char cl[65536];
+char consoleButtonWasPressed[65536];
+char cvar_modifiedFlags[65536];
+char fs_gamedir[65536];
+long va(void) { return 0; }
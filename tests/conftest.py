@@ -0,0 +1,34 @@
+import pytest
+
+from etdecode.synthetic import generate_demo
+
+SNAPSHOTS = 300  # Two and a half laps of the default aim window
+
+
+@pytest.fixture(scope="session")
+def synthetic_demo(tmp_path_factory):
+    # A small demo every test may read, none may change it
+    path = str(tmp_path_factory.mktemp("demos") / "synthetic.dm_84")
+    generate_demo(path, snapshots=SNAPSHOTS, players=8, items=8, seed=5, keyframe_interval=100)
+    return path
+
+
+@pytest.fixture
+def parse(synthetic_demo, tmp_path):
+    # parse(**options) parses the synthetic demo into a fresh database and returns its path
+    from etdecode.monitor import ETPlayerMonitor
+
+    parsed = []
+
+    def parse(demo_file=synthetic_demo, database_file=None, **options):
+        database_file = database_file or str(tmp_path / f"parse-{len(parsed)}.db")
+        monitor = ETPlayerMonitor(demo_file, engine=options.pop("engine", "python"), database_file=database_file,
+                                  **options)
+        try:
+            stats = monitor.parse_demo()
+        finally:
+            monitor.close(summary=False)
+        assert not stats.counters["errors"]
+        parsed.append(database_file)
+        return database_file
+    return parse
@@ -0,0 +1,73 @@
+import math
+
+import numpy as np
+
+from etdecode.aim import SPEED_SCALE, AimHistory
+from etdecode.checkpoint import load_checkpoint, save_checkpoint
+
+WINDOW = 32  # Above MIN_SPEEDS, so z-scores are given
+SAMPLES = 200  # Several laps of the ring
+PLAYER = 3
+
+
+def _samples(seed=0):
+    # Times in ms, some of them repeated so a few speeds are unknown, and turning angles
+    rng = np.random.default_rng(seed)
+    times = np.cumsum(rng.choice([0, 50, 50, 50, 100], SAMPLES))
+    angles = np.cumsum(rng.normal(0, 5, (SAMPLES, 3)), axis=0) % 360
+    angles[rng.random(SAMPLES) < 0.2] = 0.0
+    return times, angles
+
+
+def _expected_stats(history, player_id):
+    # The window statistics from the stored speeds, directly
+    speeds = history.speeds[player_id]
+    tenths = np.rint(speeds[speeds == speeds] * SPEED_SCALE)
+    if not len(tenths):
+        return 0, 0.0, 0.0
+    return len(tenths), tenths.mean() / SPEED_SCALE, tenths.var() / (SPEED_SCALE * SPEED_SCALE)
+
+
+def _assert_stats(history, player_id):
+    count, mean, variance = history.speed_stats(player_id)
+    expected = _expected_stats(history, player_id)
+    assert count == expected[0]
+    assert math.isclose(mean, expected[1]) and math.isclose(variance, expected[2], abs_tol=1e-9)
+
+
+def test_rolling_stats_after_wraparound():
+    history = AimHistory(WINDOW)
+    times, angles = _samples()
+    for timestamp, angle in zip(times.tolist(), angles.tolist()):
+        history.add(PLAYER, timestamp, *angle)
+        _assert_stats(history, PLAYER)
+    assert history.count[PLAYER] == WINDOW
+    assert history.speed_stats(0) == (0, 0.0, 0.0)
+
+
+def test_blocks_give_what_single_samples_give():
+    single, blocks = AimHistory(WINDOW), AimHistory(WINDOW)
+    times, angles = _samples(1)
+    zscores = [single.add(PLAYER, timestamp, *angle)[1] for timestamp, angle in zip(times.tolist(), angles.tolist())]
+    extended = np.concatenate([blocks.extend(PLAYER, times[start:start + 7], angles[start:start + 7])
+                               for start in range(0, SAMPLES, 7)])
+    assert np.array_equal(np.array(zscores), extended, equal_nan=True)
+    assert not np.isnan(extended).all()
+    assert single.speed_stats(PLAYER) == blocks.speed_stats(PLAYER)
+
+
+def test_rolling_stats_after_checkpoint_restore(tmp_path):
+    history = AimHistory(WINDOW)
+    times, angles = _samples(2)
+    half = SAMPLES // 2
+    for timestamp, angle in zip(times[:half].tolist(), angles[:half].tolist()):
+        history.add(PLAYER, timestamp, *angle)
+    path = str(tmp_path / "aim.ckpt.npz")
+    save_checkpoint(path, {"aim": history.state()})
+    restored = AimHistory(WINDOW)
+    restored.restore(load_checkpoint(path)["aim"])
+    assert restored.speed_stats(PLAYER) == history.speed_stats(PLAYER)
+    for timestamp, angle in zip(times[half:].tolist(), angles[half:].tolist()):
+        (previous, zscore), expected = restored.add(PLAYER, timestamp, *angle), history.add(PLAYER, timestamp, *angle)
+        assert previous == expected[0] and np.array_equal(zscore, expected[1], equal_nan=True)
+    _assert_stats(restored, PLAYER)
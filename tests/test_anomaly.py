@@ -0,0 +1,111 @@
+import math
+import shutil
+import sqlite3
+
+import numpy as np
+import pytest
+
+from etdecode.anomaly import MAX_FILL, MIN_SHOTS, AimRecorder, aim_features, analyze_demos, rank_players
+
+FRAME = 50  # ms between samples
+FRAMES = 400
+SHOT_FRAMES = np.arange(10, FRAMES - 10, 20)
+
+
+def _aim(turner=3, snapper=7):
+    # (frame times, player ids, angles, shots, hits) of two players shooting together:
+    # turner turns at an even 90 deg/s, snapper flicks 60 degrees onto every shot and hits
+    frame_times = np.arange(FRAMES) * FRAME
+    angles = np.zeros((2, FRAMES, 2), dtype=np.float32)
+    angles[0, :, 0] = np.random.default_rng(1).normal(0.0, 0.5, FRAMES)
+    angles[0, :, 1] = (90.0 * frame_times / 1000.0) % 360.0 - 180.0
+    yaw = np.zeros(FRAMES)
+    for frame in SHOT_FRAMES:
+        yaw[frame - 1:] += 30.0
+        yaw[frame:] += 30.0
+    angles[1, :, 1] = (yaw + 180.0) % 360.0 - 180.0
+    shots = np.array([(frame_times[frame] + 10, player_id) for frame in SHOT_FRAMES for player_id in (turner, snapper)])
+    hits = np.array([(frame_times[frame] + 30, snapper) for frame in SHOT_FRAMES])
+    return frame_times, np.array([turner, snapper]), angles, shots, hits
+
+
+def test_snaps_are_told_from_even_turning():
+    turner, snapper = aim_features(*_aim())
+    assert (turner["player_id"], snapper["player_id"]) == (3, 7)
+    assert turner["shots"] == snapper["shots"] == snapper["hits"] == len(SHOT_FRAMES) and turner["hits"] == 0
+    assert turner["snaps"] == 0 and turner["snap_rate"] == 0.0 and math.isnan(turner["snap_hit_rate"])
+    assert snapper["snaps"] == snapper["snap_hits"] == len(SHOT_FRAMES) and snapper["snap_rate"] == 1.0
+    assert turner["turn_cv"] < 0.01 < snapper["turn_cv"]
+    assert 85.0 < turner["peak_speed"] < 95.0 < snapper["peak_speed"]
+
+
+def test_gaps_are_not_turns():
+    frame_times, player_ids, angles, shots, hits = _aim()
+    angles[1, 100:110] = np.nan
+    snapper = aim_features(frame_times, player_ids, angles, shots, hits)[1]
+    assert snapper["samples"] == FRAMES - 1 - 11  # No rate into, inside or out of the gap
+    assert snapper["snaps"] == len(SHOT_FRAMES) - 1  # The one shot in the gap is not seen
+
+
+def test_too_little_to_know():
+    assert aim_features(np.arange(2) * FRAME, np.array([1]), np.zeros((1, 2, 2)), np.zeros((0, 2), np.int64),
+                        np.zeros((0, 2), np.int64)) == []
+    row, = aim_features(np.arange(10) * FRAME, np.array([1]), np.zeros((1, 10, 2), np.float32),
+                        np.zeros((0, 2), np.int64), np.zeros((0, 2), np.int64))
+    assert row["shots"] == 0 and math.isnan(row["snap_rate"]) and math.isnan(row["jerk_ratio"])
+
+
+def test_recorder_fills_short_gaps():
+    recorder = AimRecorder()
+    for frame in range(60):
+        player_ids = [1, 2] if frame % 30 < 5 or frame < 10 else [2]  # Player 1 goes missing
+        recorder.add(frame * FRAME, player_ids, np.full((len(player_ids), 3), float(frame)))
+    frame_times, player_ids, angles = recorder.series()
+    assert frame_times.tolist() == [frame * FRAME for frame in range(60)] and player_ids.tolist() == [1, 2]
+    missing = np.isnan(angles[0, :, 1])
+    # Filled with the last angles for MAX_FILL ms, missing after that until seen again
+    assert missing.tolist() == [10 + MAX_FILL // FRAME < frame < 30 or frame > 34 + MAX_FILL // FRAME
+                                for frame in range(60)]
+    assert angles[0, 12, 1] == 9.0 and not np.isnan(angles[1]).any()
+
+
+def test_rank_players_puts_the_outlier_first():
+    rows = [{"player_id": player_id, "shots": 50, "snap_rate": 0.1 + 0.01 * player_id,
+             "snap_hit_rate": 0.5, "jerk_ratio": 5.0 + 0.1 * player_id, "turn_cv": 0.5 + 0.01 * player_id}
+            for player_id in range(10)]
+    rows.append(dict(rows[0], player_id=10, snap_rate=0.9, turn_cv=0.1))
+    rows.append(dict(rows[0], player_id=11, snap_rate=1.0, shots=MIN_SHOTS - 1))  # Too few shots to tell
+    rows.append(dict(rows[0], player_id=12, jerk_ratio=math.nan))
+    ranked = rank_players(rows)
+    assert ranked[0]["player_id"] == 10 and ranked[0]["score"] > ranked[1]["score"]
+    assert {row["player_id"] for row in ranked} == set(range(13))
+    assert all(row["score"] >= 0.0 for row in ranked)
+    scores = {row["player_id"]: row["score"] for row in ranked}
+    assert scores[11] == scores[0]  # Its snap rate left out, it is player 0
+    assert "score" not in rows[0]
+    assert rank_players([]) == []
+    same = rank_players([dict(rows[0], player_id=player_id) for player_id in range(3)])
+    assert [row["score"] for row in same] == [0.0] * 3
+
+
+def test_analyze_demos_counts_every_players_shots(parse, synthetic_demo, tmp_path):
+    directory = tmp_path / "demos"
+    directory.mkdir()
+    for name in ("a.dm_84", "b.dm_84"):
+        shutil.copy(synthetic_demo, directory / name)
+    ranked = analyze_demos(str(directory), workers=2, engine="python")
+    with sqlite3.connect(parse()) as connection:
+        shots = dict(connection.execute("SELECT player_id, COUNT(*) FROM player_actions WHERE action = 'fire' "
+                                        "GROUP BY player_id"))
+    assert sum(row["shots"] for row in ranked) == 2 * sum(shots.values()) > 0
+    assert sorted(row["demo"] for row in ranked) == sorted(str(directory / name) for name in ("a.dm_84", "b.dm_84")
+                                                           for _ in range(len(ranked) // 2))
+    assert [row["score"] for row in ranked] == sorted((row["score"] for row in ranked), reverse=True)
+    for row in ranked:
+        assert row["player_name"] == f"Player{row['player_id']}"
+        assert row["shots"] == shots.get(row["player_id"], 0)
+
+
+@pytest.mark.parametrize("pattern", ["missing/*.dm_84", "missing"])
+def test_analyze_demos_without_demos(tmp_path, pattern):
+    assert analyze_demos(str(tmp_path / pattern), workers=1) == []
@@ -0,0 +1,49 @@
+import os
+import sqlite3
+
+import pytest
+
+from etdecode.batch import process_demos
+from etdecode.synthetic import generate_demo
+
+TABLES = ("moves", "aims", "weapon_events")
+
+
+def _rows(path):
+    # Events stored per demo id and table
+    with sqlite3.connect(path) as connection:
+        return {(table, demo_id): count for table in TABLES for demo_id, count in
+                connection.execute(f"SELECT demo_id, COUNT(*) FROM {table} GROUP BY demo_id")}
+
+
+@pytest.fixture
+def demos(tmp_path):
+    directory = tmp_path / "demos"
+    directory.mkdir()
+    for seed, name in enumerate(("a.dm_84", "b.dm_84")):
+        generate_demo(str(directory / name), snapshots=120, players=6, items=4, seed=seed)
+    return directory
+
+
+@pytest.mark.parametrize("split", [1, 2])
+def test_parsing_again_replaces_the_events(demos, tmp_path, split):
+    output = str(tmp_path / "batch.db")
+    assert process_demos(str(demos), output, workers=2, engine="python", split=split) >= 2
+    first = _rows(output)
+    assert {demo_id for _, demo_id in first} == {1, 2}
+    assert process_demos(str(demos), output, workers=2, engine="python", split=split) >= 2
+    assert _rows(output) == first
+
+
+@pytest.mark.parametrize("split", [1, 2])
+def test_failed_demo_keeps_its_events(demos, tmp_path, split):
+    output = str(tmp_path / "batch.db")
+    process_demos(str(demos), output, workers=2, engine="python", split=split)
+    first = _rows(output)
+    # A directory in place of the demo, reading it fails inside the worker
+    os.remove(demos / "b.dm_84")
+    (demos / "b.dm_84").mkdir()
+    merged = process_demos(str(demos), output, workers=2, engine="python", split=split)
+    assert 1 <= merged <= split
+    assert _rows(output) == first
+    assert not [name for name in os.listdir(tmp_path) if name.startswith("etdecode-")]
@@ -0,0 +1,22 @@
+import pytest
+
+from etdecode.benchmark import STAGES, run_stages
+from etdecode.synthetic import generate_demo
+
+REPEAT = 3  # The fastest of a few runs, timings on a busy host are noisy
+
+
+def _delta_seconds(path, engine):
+    runs = [run_stages(path, engine)[STAGES.index("delta")] for _ in range(REPEAT)]
+    assert all(run["stage"] == "delta" and run["items"] == 200 for run in runs)
+    return min(run["seconds"] for run in runs)
+
+
+def test_native_delta_keeps_up_with_python(tmp_path):
+    path = str(tmp_path / "synthetic.dm_84")
+    generate_demo(path, snapshots=200, players=12, items=16)
+    try:
+        native = _delta_seconds(path, "native")
+    except OSError as e:
+        pytest.skip(f"huffman library unavailable: {e}")
+    assert native <= _delta_seconds(path, "python")
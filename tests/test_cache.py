@@ -0,0 +1,73 @@
+import os
+import shutil
+
+from etdecode.cache import VERSION_FILE, ParseCache
+from etdecode.database import ActionDatabase
+from etdecode.events import action_counts
+from etdecode.monitor import CACHE_COLUMNS, ETPlayerMonitor
+from etdecode.synthetic import generate_demo
+
+
+def _parse(demo_file, cache, tmp_path):
+    # (monitor, stats) of a parse, the monitor closed without a summary
+    monitor = ETPlayerMonitor(demo_file, engine="python", database_file=str(tmp_path / "cache.db"), cache=cache)
+    stats = monitor.parse_demo()
+    monitor.close(summary=False)
+    assert not stats.counters["errors"]
+    return monitor, stats
+
+
+def _counts(columns):
+    return [(action, count) for _, action, count in action_counts(columns, str)]
+
+
+def test_hit_serves_the_parsed_events(synthetic_demo, tmp_path):
+    cache = ParseCache(str(tmp_path / "cache"))
+    parsed, stats = _parse(synthetic_demo, cache, tmp_path)
+    assert not stats.counters["cache_hits"] and len(cache.entries()) == 1
+    hit, stats = _parse(synthetic_demo, cache, tmp_path)
+    assert stats.counters["cache_hits"] == 1
+    assert sorted(hit.cached) == sorted(name for name in CACHE_COLUMNS if name != "player_positions")
+    database = ActionDatabase(str(tmp_path / "cache.db"))
+    assert _counts(hit.cached) == [(action, count) for _, action, count in database.action_counts(parsed.demo_id)]
+    database.close()
+    assert hit.player_positions == parsed.player_positions
+
+
+def test_damaged_entry_is_a_miss(synthetic_demo, tmp_path):
+    cache = ParseCache(str(tmp_path / "cache"))
+    _parse(synthetic_demo, cache, tmp_path)
+    key = cache.key(synthetic_demo)
+    path = os.path.join(cache.directory, key)
+    good = cache.load(key, CACHE_COLUMNS)
+    assert good is not None
+
+    # A column missing, then an entry of another version
+    backup = str(tmp_path / "backup")
+    shutil.copytree(path, backup)
+    os.remove(os.path.join(path, "player_positions.npy"))
+    assert cache.load(key, CACHE_COLUMNS) is None
+    monitor, stats = _parse(synthetic_demo, cache, tmp_path)
+    assert not stats.counters["cache_hits"] and monitor.cached is None
+    # The parse stored a whole entry again
+    assert cache.load(key, CACHE_COLUMNS) is not None
+
+    shutil.rmtree(path)
+    shutil.copytree(backup, path)
+    with open(os.path.join(path, VERSION_FILE), "w") as file:
+        file.write("0")
+    assert cache.load(key, CACHE_COLUMNS) is None
+    assert not _parse(synthetic_demo, cache, tmp_path)[1].counters["cache_hits"]
+
+
+def test_changed_demo_is_parsed_again(tmp_path):
+    cache = ParseCache(str(tmp_path / "cache"))
+    demo_file = str(tmp_path / "changing.dm_84")
+    generate_demo(demo_file, snapshots=60, players=4, items=2, seed=1)
+    _parse(demo_file, cache, tmp_path)
+    first = cache.key(demo_file)
+    generate_demo(demo_file, snapshots=60, players=4, items=2, seed=2)
+    assert cache.key(demo_file) != first
+    stats = _parse(demo_file, cache, tmp_path)[1]
+    assert not stats.counters["cache_hits"] and len(cache.entries()) == 2
+    assert _parse(demo_file, cache, tmp_path)[1].counters["cache_hits"] == 1
@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+import sqlite3
+
+import pytest
+
+from etdecode.cli import main
+
+OUTSIDE = "SELECT * FROM player_actions WHERE timestamp NOT BETWEEN 5000 AND 10000"
+
+
+@pytest.fixture
+def database(parse):
+    return parse()
+
+
+def _run(capsys, *args):
+    # (exit status, stdout) of the command line args
+    status = main(list(args))
+    return status, capsys.readouterr().out
+
+
+def test_parse_writes_the_database_and_stats(synthetic_demo, tmp_path, capsys):
+    database = str(tmp_path / "cli.db")
+    status, out = _run(capsys, "-q", "parse", synthetic_demo, "-d", database, "--engine", "python", "--stats", "-")
+    assert status == 0
+    stats = json.loads(out)
+    assert stats["counters"]["snapshots"] > 0 and not stats["counters"].get("errors")
+    with sqlite3.connect(database) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM moves").fetchone()[0] == stats["counters"]["events.move"]
+        outside = sorted(connection.execute(OUTSIDE), key=repr)
+
+    # A time range replaces only that part of what was stored
+    status, out = _run(capsys, "-q", "parse", synthetic_demo, "-d", database, "--engine", "python",
+                       "--start", "5000", "--end", "10000", "--ingest", "bulk", "--stats", "-")
+    assert status == 0 and 0 < json.loads(out)["counters"]["snapshots"] <= 101
+    with sqlite3.connect(database) as connection:
+        assert sorted(connection.execute(OUTSIDE), key=repr) == outside
+        assert connection.execute("SELECT COUNT(*) FROM moves WHERE timestamp BETWEEN 5000 AND 10000").fetchone()[0]
+
+
+@pytest.mark.parametrize("args", [
+    ["parse"],
+    ["parse", "demo.dm_84", "--engine", "fast"],
+    ["parse", "demo.dm_84", "--ingest", "unsafe"],
+    ["parse", "demo.dm_84", "--start", "soon"],
+    ["export", "--table", "sqlite_master"],
+    ["export", "--format", "xml"],
+    ["jump"],
+    [],
+])
+def test_bad_arguments_exit_with_usage(args, capsys):
+    with pytest.raises(SystemExit) as exit:
+        main(args)
+    assert exit.value.code == 2
+    assert "usage: etdecode" in capsys.readouterr().err
+
+
+def test_reading_commands_need_a_database(tmp_path):
+    for command in ("summary", "plot", "export", "near"):
+        with pytest.raises(SystemExit, match="No database at"):
+            main([command, "-d", str(tmp_path / "missing.db")])
+    assert not (tmp_path / "missing.db").exists()
+
+
+def test_summary(database, capsys):
+    status, out = _run(capsys, "summary", "-d", database)
+    with sqlite3.connect(database) as connection:
+        counts = connection.execute("SELECT COUNT(*) FROM player_actions").fetchone()[0]
+    assert status == 0 and sum(int(line.split()[-1]) for line in out.splitlines()) == counts
+
+    status, out = _run(capsys, "summary", "-d", database, "--totals")
+    lines = out.splitlines()
+    assert status == 0 and lines[0].split() == ["player", "moves", "distance", "shots", "hits", "accuracy", "reloads"]
+    assert len(lines) > 1
+    assert _run(capsys, "summary", "-d", database, "--demo", "1")[1] == out
+
+
+@pytest.mark.parametrize("table", ["player_actions", "moves", "weapon_events"])
+def test_export_formats_agree(database, capsys, table):
+    status, out = _run(capsys, "export", "-d", database, "--table", table)
+    rows = list(csv.reader(io.StringIO(out)))
+    status, out = _run(capsys, "export", "-d", database, "--table", table, "--format", "jsonl")
+    records = [json.loads(line) for line in out.splitlines()]
+    assert status == 0 and len(rows) - 1 == len(records) > 0
+    assert rows[0] == list(records[0])
+    assert rows[1] == ["" if value is None else str(value) for value in records[0].values()]
+
+    player_id = records[0]["player_id"]
+    out = _run(capsys, "export", "-d", database, "--table", table, "--format", "jsonl", "--player", str(player_id))[1]
+    assert [json.loads(line) for line in out.splitlines()] == [row for row in records if row["player_id"] == player_id]
+
+
+def test_near(database, capsys):
+    with pytest.raises(SystemExit, match="near needs --player and --time"):
+        main(["near", "-d", database, "--player", "1"])
+    status, out = _run(capsys, "near", "-d", database, "--player", "1", "--time", "5000", "--radius", "100000")
+    assert status == 0 and {int(line.split()[0]) for line in out.splitlines()} <= set(range(8)) - {1}
+    assert out
+    status, out = _run(capsys, "near", "-d", database, "--hits", "--radius", "100000")
+    with sqlite3.connect(database) as connection:
+        hits = connection.execute("SELECT COUNT(*) FROM player_actions WHERE action = 'hit'").fetchone()[0]
+    assert status == 0 and len(out.splitlines()) == hits
+
+
+def test_plot_writes_a_file(database, tmp_path, capsys):
+    for args in ([], ["--heatmap"], ["--player", "1"]):
+        output = tmp_path / f"plot{len(args)}.png"
+        assert _run(capsys, "plot", "-d", database, "-o", str(output), *args)[0] == 0
+        assert output.stat().st_size > 0
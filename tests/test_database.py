@@ -0,0 +1,167 @@
+import os
+import sqlite3
+
+import pytest
+
+from etdecode.database import INDEXES, KIND_TABLES, STATS_TABLES, ActionDatabase
+
+
+def _counts(connection, demo_id):
+    return {table: connection.execute(f"SELECT COUNT(*) FROM {table} WHERE demo_id = ?", (demo_id,)).fetchone()[0]
+            for table in KIND_TABLES}
+
+
+def test_discard_skips_a_demo_with_nothing_stored(parse):
+    path = parse()
+    database = ActionDatabase(path)
+    statements = []
+    database.connection.set_trace_callback(statements.append)
+    assert not database.has_events(2)
+    database.discard(2)
+    assert not [statement for statement in statements if statement.lstrip().startswith("DELETE")]
+    database.close()
+
+
+def test_discard_from_seq_recounts_the_demo(parse):
+    path = parse()
+    database = ActionDatabase(path)
+    connection = database.connection
+    before = _counts(connection, 1)
+    middle = database.next_seq // 2
+    database.discard(1, middle)
+    after = _counts(connection, 1)
+    for table in KIND_TABLES:
+        assert after[table] == connection.execute(f"SELECT COUNT(*) FROM {table} WHERE seq < ?", (middle,)).fetchone()[0]
+        assert after[table] <= before[table]
+    assert 0 < sum(after.values()) < sum(before.values())
+    moves, aims = connection.execute("SELECT SUM(moves), SUM(aims) FROM player_stats WHERE demo_id = 1").fetchone()
+    assert (moves, aims) == (after["moves"], after["aims"])
+    database.close()
+
+
+def test_discard_searches_by_demo(parse):
+    with sqlite3.connect(parse()) as connection:
+        for table in KIND_TABLES:
+            plan = connection.execute(f"EXPLAIN QUERY PLAN DELETE FROM {table} WHERE demo_id = ? AND seq >= ?",
+                                      (1, 0)).fetchall()
+            assert f"idx_{table}_demo_seq" in plan[0][3]
+
+
+def _events(path):
+    with sqlite3.connect(path) as connection:
+        return {table: connection.execute(f"SELECT * FROM {table} ORDER BY seq").fetchall() for table in KIND_TABLES}
+
+
+def _indexes(connection):
+    return {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")}
+
+
+def test_bulk_ingest_stores_what_safe_ingest_does(parse, tmp_path):
+    safe = parse(ingest="safe")
+    bulk = parse(ingest="bulk", commit_rows=500)
+    assert _events(bulk) == _events(safe)
+    with sqlite3.connect(bulk) as connection:
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+        assert _indexes(connection) == {name for name, _, _ in INDEXES}
+    assert not os.path.exists(bulk + "-wal")
+
+
+def test_bulk_ingest_defers_indexes_and_keeps_a_wal_database(tmp_path):
+    path = str(tmp_path / "bulk.db")
+    ActionDatabase(path).close()
+    with sqlite3.connect(path) as connection:
+        connection.execute("PRAGMA journal_mode=WAL")  # The only mode a file keeps
+    database = ActionDatabase(path, mode="bulk")
+    assert database.connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert not _indexes(database.connection)
+    database.finish()
+    assert database.connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert _indexes(database.connection) == {name for name, _, _ in INDEXES}
+    database.close()
+
+
+def _stats(connection):
+    # The stats tables, distances rounded: summed per batch they differ in the last bits
+    return {table: [tuple(round(value, 6) if isinstance(value, float) else value for value in row)
+                    for row in connection.execute(f"SELECT * FROM {table} ORDER BY {', '.join(key)}")]
+            for table, (key, _) in STATS_TABLES.items()}
+
+
+def _recount(database):
+    # The stats tables recounted from the events, left as they were
+    database._rebuild_stats(database.connection.cursor())
+    stats = _stats(database.connection)
+    database.connection.rollback()
+    return stats
+
+
+def _followed(synthetic_demo, tmp_path, name, demo_id=None):
+    # A parse stored in many small batches, each adding to the totals
+    from etdecode.monitor import ETPlayerMonitor
+
+    path = str(tmp_path / name)
+    monitor = ETPlayerMonitor(synthetic_demo, engine="python", database_file=path, demo_id=demo_id)
+    monitor.parse_demo(follow=True, checkpoint=path + ".ckpt.npz", flush_rows=100, idle_timeout=0)
+    monitor.close(summary=False)
+    return path
+
+
+def test_batched_totals_match_a_recount(synthetic_demo, tmp_path):
+    database = ActionDatabase(_followed(synthetic_demo, tmp_path, "batched.db"))
+    stats = _stats(database.connection)
+    assert all(stats.values())
+    assert _recount(database) == stats
+    database.close()
+
+
+def test_totals_count_the_events(parse):
+    path = parse()
+    with sqlite3.connect(path) as connection:
+        events = connection.execute("SELECT player_id, action, weapon FROM player_actions").fetchall()
+        distances = dict(connection.execute("SELECT player_id, TOTAL(distance) FROM moves GROUP BY player_id"))
+    database = ActionDatabase(path)
+    totals = database.player_totals()
+    weapons = database.weapon_totals(1)
+    database.close()
+
+    assert [row[0] for row in totals] == sorted({player_id for player_id, _, _ in events})
+    for player_id, name, moves, distance, shots, hits, accuracy, reloads in totals:
+        actions = [action for event_player, action, _ in events if event_player == player_id]
+        assert name == f"Player{player_id}"
+        assert (moves, shots, hits, reloads) == tuple(actions.count(action) for action in ("move", "fire", "hit", "reload"))
+        assert distance == pytest.approx(distances.get(player_id, 0.0))
+        assert accuracy == (hits / shots if shots else None)
+    for player_id, _, weapon, shots, hits, _, reloads in weapons:
+        actions = [action for event_player, action, event_weapon in events
+                   if event_player == player_id and (event_weapon or 0) == weapon]
+        assert (shots, hits, reloads) == tuple(actions.count(action) for action in ("fire", "hit", "reload"))
+    assert sum(row[3] for row in weapons) == sum(row[4] for row in totals) > 0
+
+
+def test_merged_totals_add_up(synthetic_demo, tmp_path):
+    merged = _followed(synthetic_demo, tmp_path, "merged.db", demo_id=1)
+    shard = _followed(synthetic_demo, tmp_path, "shard.db", demo_id=2)
+    database = ActionDatabase(shard)
+    alone = database.player_totals()
+    database.close()
+
+    database = ActionDatabase(merged)
+    database.merge(shard)
+    assert database.player_totals(1) == database.player_totals(2)
+    assert [row[:2] for row in database.player_totals(2)] == [row[:2] for row in alone]
+    for total, one in zip(database.player_totals(), alone):
+        assert total[2:4] == pytest.approx((2 * one[2], 2 * one[3]))
+        assert total[4:] == (2 * one[4], 2 * one[5], one[6], 2 * one[7])
+    assert _recount(database) == _stats(database.connection)
+    database.close()
+
+
+def test_missing_stats_tables_are_rebuilt(parse):
+    path = parse()
+    with sqlite3.connect(path) as connection:
+        stats = _stats(connection)
+        for table in STATS_TABLES:
+            connection.execute(f"DROP TABLE {table}")
+    ActionDatabase(path).close()
+    with sqlite3.connect(path) as connection:
+        assert _stats(connection) == stats
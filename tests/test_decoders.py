@@ -0,0 +1,102 @@
+import random
+
+import numpy as np
+import pytest
+
+from etdecode.demo import DemoReader
+from etdecode.huffman import HUFF_CODES, LOOKUP_BITS, HuffmanTree, build_codes
+from etdecode.msg import PythonDecoder
+from etdecode.snapshot import SnapshotParser
+
+MESSAGES = 200
+SEED = 3
+
+
+def _native_decoder():
+    from etdecode.native import NativeDecoder
+    try:
+        return NativeDecoder()
+    except OSError as e:
+        pytest.skip(f"huffman library unavailable: {e}")
+
+
+def _reads(rng):
+    # A random sequence of reads, as (method name, arguments)
+    while True:
+        choice = rng.randrange(6)
+        if choice == 0:
+            yield "read_bits", (rng.choice([bits for bits in range(-32, 33) if bits]),)
+        elif choice == 1:
+            yield "read_byte", ()
+        elif choice == 2:
+            yield "read_short", ()
+        elif choice == 3:
+            yield "read_long", ()
+        elif choice == 4:
+            yield "read_string", ()
+        else:
+            yield "read_data", (rng.randrange(1, 8),)
+
+
+def test_engines_read_the_same():
+    # Every bit sequence is a valid Huffman stream, so random bytes make
+    # messages both decoders must read identically, past the end included
+    native = _native_decoder()
+    python = PythonDecoder()
+    rng = random.Random(SEED)
+    for _ in range(MESSAGES):
+        data = bytes(rng.randrange(256) for _ in range(rng.randrange(1, 256)))
+        assert native.load(data) and python.load(data)
+        for read, arguments in _reads(rng):
+            expected = getattr(native, read)(*arguments)
+            assert getattr(python, read)(*arguments) == expected, (data.hex(), read, arguments)
+            assert python.readcount == native.readcount
+            assert python.overflowed == native.overflowed
+            if native.overflowed:
+                break
+
+
+def test_engines_rebuild_the_same_snapshots(tmp_path):
+    # The delta readers, on the framed messages of a synthetic demo
+    from etdecode.synthetic import generate_demo
+
+    native = _native_decoder()
+    path = tmp_path / "synthetic.dm_84"
+    generate_demo(path, snapshots=60, players=8, items=8, seed=SEED, keyframe_interval=20)
+    parsers = SnapshotParser(native), SnapshotParser(PythonDecoder())
+    snapshots = 0
+    with DemoReader(str(path)) as reader:
+        for frame in reader:
+            assert native.load(frame.data) and parsers[1].decoder.load(frame.data)
+            expected, got = (list(parser.parse_message(frame.sequence)) for parser in parsers)
+            assert parsers[1].decoder.readcount == native.readcount
+            assert [snapshot.server_time for snapshot in got] == [snapshot.server_time for snapshot in expected]
+            snapshots += len(expected)
+            for name, value in parsers[0].state().items():
+                if isinstance(value, np.ndarray):
+                    assert np.array_equal(parsers[1].state()[name], value), name
+                else:
+                    assert parsers[1].state()[name] == value, name
+    assert snapshots == 60 and parsers[0].bad_messages == 0
+
+
+def test_codes_match_the_adaptive_build():
+    assert build_codes() == HUFF_CODES
+
+
+def test_lookup_table_round_trips_every_symbol():
+    tree = HuffmanTree()
+    symbols = list(range(256)) * 2
+    random.Random(SEED).shuffle(symbols)
+    stream = position = 0
+    for symbol in symbols:
+        value, length = tree.encode[symbol]
+        assert length <= LOOKUP_BITS
+        stream |= value << position
+        position += length
+    decoder = PythonDecoder()
+    # readcount runs one byte ahead of the bits read, like the engine's, so the
+    # last code needs a byte behind it not to count as reading past the end
+    decoder.load(stream.to_bytes(position // 8 + 2, "little"))
+    assert [decoder.read_bits(8) for _ in symbols] == symbols
+    assert not decoder.overflowed
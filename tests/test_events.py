@@ -0,0 +1,60 @@
+import sqlite3
+
+import numpy as np
+
+from etdecode.events import ACTION_CODES, EventBuffer, action_counts, player_moves
+
+CHUNK = 4  # Small chunks, so the rows cross chunk boundaries
+
+
+def test_rows_cross_chunks():
+    buffer = EventBuffer(CHUNK)
+    buffer.append(10, 1, "move", pos_x=1.0, pos_y=2.0, pos_z=3.0, velocity=0.5, distance=2.0)
+    buffer.append(20, 2, "fire", weapon=3)
+    buffer.extend({
+        "timestamp": np.arange(30, 90, 10),
+        "player_id": np.full(6, 4),
+        "kind": np.full(6, ACTION_CODES["aim_consistency"]),
+        "angle_x": np.arange(6, dtype=np.float32),
+        "angle_y": np.zeros(6, dtype=np.float32),
+        "angle_z": np.zeros(6, dtype=np.float32),
+    })
+    buffer.append(90, 2, "hit", weapon=3, accuracy=1.0)
+    assert len(buffer) == 9
+
+    columns = buffer.columns()
+    assert columns["timestamp"].tolist() == list(range(10, 100, 10))
+    assert columns["weapon_valid"].tolist() == [False, True] + [False] * 6 + [True]
+    assert columns["angle_x_valid"].tolist() == [False, False] + [True] * 6 + [False]
+    rows = list(buffer.rows(lambda player_id: f"player{player_id}"))
+    assert rows[0] == (10, 1, "player1", "move", None, 1.0, 2.0, 3.0, None, None, None, 0.5, None)
+    assert rows[1] == (20, 2, "player2", "fire", 3, None, None, None, None, None, None, None, None)
+    assert rows[7] == (80, 4, "player4", "aim_consistency", None, None, None, None, 5.0, 0.0, 0.0, None, None)
+    assert rows[8][3:5] == ("hit", 3) and rows[8][12] == 1.0
+
+    buffer.clear()
+    assert len(buffer) == 0 and len(buffer.columns()["timestamp"]) == 0
+
+
+def test_columns_match_the_stored_events(parse, tmp_path):
+    # The events of the synthetic demo, read back into a buffer, give what the database counts
+    path = parse()
+    buffer = EventBuffer(1000)
+    with sqlite3.connect(path) as connection:
+        view = sorted(connection.execute("SELECT * FROM player_actions"), key=repr)
+        names = dict(connection.execute("SELECT player_id, player_name FROM players"))
+        counts = sorted(connection.execute(
+            "SELECT p.player_name, a.action, COUNT(*) FROM player_actions a JOIN players p USING (player_id) "
+            "GROUP BY a.player_id, a.action"))
+    for timestamp, player_id, _, action, *values in view:
+        buffer.append(timestamp, player_id, action, *values)
+    assert len(buffer) == len(view) > 1000
+    assert sorted(buffer.rows(names.get), key=repr) == view
+    assert action_counts(buffer.columns(), names.get) == counts
+
+    buffer.save(str(tmp_path / "events.npz"))
+    with np.load(str(tmp_path / "events.npz")) as saved:
+        columns = {name: saved[name] for name in saved.files}
+    player_id = view[0][1]
+    moves = [(row[0], row[5], row[6], row[7]) for row in view if row[1] == player_id and row[3] == "move"]
+    assert player_moves(columns, player_id) == sorted(moves, key=lambda move: move[0])
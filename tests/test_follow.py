@@ -0,0 +1,84 @@
+import os
+import sqlite3
+
+import pytest
+
+from etdecode.checkpoint import CHECKPOINT_SUFFIX, load_checkpoint
+from etdecode.database import KIND_TABLES, STATS_TABLES
+from etdecode.monitor import ETPlayerMonitor
+from etdecode.msg import PythonDecoder
+from etdecode.seek import DemoIndex
+
+TABLES = tuple(KIND_TABLES) + tuple(STATS_TABLES)
+FLUSH_ROWS = 100  # Checkpoints every few snapshots
+
+
+def _tables(path):
+    # The rows of every table without their seq numbers, which depend on when events
+    # were flushed, and with the float totals rounded, which depend on the order they were summed in
+    tables = {}
+    with sqlite3.connect(path) as connection:
+        for table in TABLES:
+            columns = [row[1] for row in connection.execute(f"PRAGMA table_info({table})") if row[1] != "seq"]
+            rows = connection.execute(f"SELECT {', '.join(columns)} FROM {table}")
+            tables[table] = sorted(tuple(round(value, 6) if isinstance(value, float) else value for value in row)
+                                   for row in rows)
+    return tables
+
+
+def _follow(demo_file, database_file, batch_frames=64):
+    monitor = ETPlayerMonitor(demo_file, engine="python", database_file=database_file, batch_frames=batch_frames)
+    try:
+        stats = monitor.parse_demo(follow=True, flush_rows=FLUSH_ROWS, idle_timeout=0)
+    finally:
+        monitor.close(summary=False)
+    assert not stats.counters["errors"]
+    return stats
+
+
+def _growing(synthetic_demo, demo_file, parts):
+    # Writes a copy of the synthetic demo in parts, split at messages. Yields after each part.
+    offsets = DemoIndex.build(synthetic_demo, PythonDecoder()).offsets.tolist()
+    ends = [offsets[len(offsets) * part // parts] for part in range(1, parts)] + [os.path.getsize(synthetic_demo)]
+    with open(synthetic_demo, "rb") as source:
+        data = source.read()
+    written = 0
+    for end in ends:
+        with open(demo_file, "ab") as demo:
+            demo.write(data[written:end])
+        written = end
+        yield demo_file
+
+
+def test_following_stores_what_a_parse_does(parse, synthetic_demo, tmp_path):
+    database_file = str(tmp_path / "followed.db")
+    demo_file, = _growing(synthetic_demo, str(tmp_path / "copy.dm_84"), 1)  # The checkpoint goes next to the demo
+    stats = _follow(demo_file, database_file)
+    assert stats.counters["snapshots"] > 0
+    assert _tables(database_file) == _tables(parse())
+
+
+@pytest.mark.parametrize("batch_frames", [(64, 64), (0, 64), (64, 0)])
+def test_resumed_follow_stores_what_one_run_does(parse, synthetic_demo, tmp_path, batch_frames):
+    resumed = str(tmp_path / "resumed.db")
+    offsets = []
+    for run, demo_file in enumerate(_growing(synthetic_demo, str(tmp_path / "growing.dm_84"), 3)):
+        _follow(demo_file, resumed, batch_frames[min(run, 1)])
+        offsets.append(load_checkpoint(demo_file + CHECKPOINT_SUFFIX)["monitor"]["offset"])
+    last = DemoIndex.build(synthetic_demo, PythonDecoder()).offsets[-1]
+    assert offsets[0] < offsets[1] <= last < offsets[2] < os.path.getsize(synthetic_demo)  # Before the end marker
+    assert _tables(resumed) == _tables(parse())
+
+
+def test_events_stored_after_the_checkpoint_are_replaced(parse, synthetic_demo, tmp_path):
+    database_file = str(tmp_path / "interrupted.db")
+    for run, demo_file in enumerate(_growing(synthetic_demo, str(tmp_path / "growing.dm_84"), 2)):
+        if run:
+            # As if the first run had stored more before it was stopped, without checkpointing it
+            with sqlite3.connect(database_file) as connection:
+                next_seq = load_checkpoint(demo_file + CHECKPOINT_SUFFIX)["monitor"]["next_seq"]
+                row = connection.execute("SELECT * FROM weapon_events ORDER BY seq DESC LIMIT 1").fetchone()
+                connection.execute(f"INSERT INTO weapon_events VALUES ({', '.join('?' * len(row))})",
+                                   (next_seq,) + row[1:])
+        _follow(demo_file, database_file)
+    assert _tables(database_file) == _tables(parse())
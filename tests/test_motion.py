@@ -0,0 +1,25 @@
+import sqlite3
+
+import pytest
+
+from etdecode.database import KIND_TABLES, STATS_TABLES
+from etdecode.monitor import BATCH_FRAMES
+
+
+def _rows(path):
+    # Every event without its seq, which counts the order rows were stored in, and the totals
+    rows = {}
+    with sqlite3.connect(path) as connection:
+        for table in KIND_TABLES:
+            columns = [row[1] for row in connection.execute(f"PRAGMA table_info({table})") if row[1] != "seq"]
+            rows[table] = sorted(connection.execute(f"SELECT {', '.join(columns)} FROM {table}"))
+        for table in STATS_TABLES:
+            rows[table] = sorted(connection.execute(f"SELECT * FROM {table}"))
+    return rows
+
+
+@pytest.mark.parametrize("batch_frames", [BATCH_FRAMES, 7])
+def test_batches_match_single_frames(parse, batch_frames):
+    expected = _rows(parse(batch_frames=0))
+    assert expected["moves"] and expected["aims"] and expected["player_stats"]
+    assert _rows(parse(batch_frames=batch_frames)) == expected
@@ -0,0 +1,114 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from etdecode.database import NEAR_WINDOW, ActionDatabase
+
+QUERIES = 40
+
+
+@pytest.fixture
+def database(parse):
+    database = ActionDatabase(parse())
+    assert database.tracked
+    yield database
+    database.close()
+
+
+def _moves(database):
+    return database.connection.execute("SELECT demo_id, player_id, timestamp, pos_x, pos_y, pos_z FROM moves").fetchall()
+
+
+def _near(moves, position, radius, start, end):
+    # moves_near by looking at every move
+    x, y, z = position
+    return sorted(move for move in moves if start <= move[2] <= end and
+                  (move[3] - x) * (move[3] - x) + (move[4] - y) * (move[4] - y) + (move[5] - z) * (move[5] - z) <= radius * radius)
+
+
+def _queries(moves, seed=0):
+    # (position, radius, start, end) around moves of the demo, from an instant to most of it
+    rng = np.random.default_rng(seed)
+    for index in rng.integers(0, len(moves), QUERIES).tolist():
+        _, _, timestamp, x, y, z = moves[index]
+        radius = float(rng.choice([1.0, 100.0, 800.0, 5000.0]))
+        window = int(rng.choice([0, 50, 1500, 20000]))
+        yield (x + rng.normal(0, 50), y + rng.normal(0, 50), z), radius, timestamp - window, timestamp + window
+
+
+def _check(database):
+    # Every query of the R*Tree finds what a scan of every move does
+    moves = _moves(database)
+    found = 0
+    for position, radius, start, end in _queries(moves):
+        expected = _near(moves, position, radius, start, end)
+        assert sorted(database.moves_near(position, radius, start, end)) == expected
+        assert sorted(database.moves_near(position, radius, start, end, demo_id=1)) == expected
+        assert not database.moves_near(position, radius, start, end, demo_id=2)
+        found += len(expected)
+    assert found
+    x, y, z = moves[0][3:]
+    assert sorted(database.moves_near((x, y, z), 1e9)) == sorted(moves)
+
+
+def test_moves_near_finds_what_a_scan_does(database):
+    _check(database)
+    # The same queries without the R*Tree
+    tracked = [database.moves_near(*query) for query in _queries(_moves(database))]
+    database.tracked = False
+    assert [database.moves_near(*query) for query in _queries(_moves(database))] == tracked
+
+
+def test_moves_in_box(database):
+    moves = _moves(database)
+    xs = sorted(move[3] for move in moves)
+    ys = sorted(move[4] for move in moves)
+    x_range, y_range = (xs[len(xs) // 4], xs[len(xs) // 2]), (ys[len(ys) // 4], ys[3 * len(ys) // 4])
+    rows = database.moves_in_box(x_range, y_range, start=2000, end=9000)
+    assert rows == sorted(rows, key=lambda row: row[2])
+    assert sorted(rows) == sorted(move for move in moves if x_range[0] <= move[3] <= x_range[1] and
+                                  y_range[0] <= move[4] <= y_range[1] and 2000 <= move[2] <= 9000)
+    assert rows
+
+
+def test_players_near(database):
+    moves = _moves(database)
+    for _, player_id, timestamp, *_ in moves[::97]:
+        near = database.players_near(player_id, timestamp + 10, 1500.0)
+        _, time, x, y, z = database.player_position(player_id, timestamp + 10)
+        assert abs(time - timestamp - 10) <= 10
+        closest = {}
+        for _, other, other_time, *position in _near(moves, (x, y, z), 1500.0, timestamp + 10 - NEAR_WINDOW,
+                                                     timestamp + 10 + NEAR_WINDOW):
+            distance = float(np.sqrt(sum((a - b) ** 2 for a, b in zip(position, (x, y, z)))))
+            if other != player_id and distance < closest.get(other, (np.inf,))[0]:
+                closest[other] = (distance, other_time)
+        assert [row[0] for row in near] == sorted(closest, key=lambda other: closest[other][0])
+        for other, distance, other_time in near:
+            assert distance == pytest.approx(closest[other][0]) and other_time == closest[other][1]
+    assert database.players_near(moves[0][1], -100000, 1e9) == []
+
+
+def test_tracks_follow_discard_and_merge(parse, database):
+    database.discard(1, database.next_seq // 2)
+    _check(database)
+
+    shard = ActionDatabase(parse(demo_id=2))
+    shard.close()
+    database.merge(shard.path)
+    moves = _moves(database)
+    for position, radius, start, end in _queries(moves, seed=1):
+        expected = _near(moves, position, radius, start, end)
+        assert sorted(database.moves_near(position, radius, start, end)) == expected
+        assert sorted(database.moves_near(position, radius, start, end, 2)) == [move for move in expected if move[0] == 2]
+
+
+def test_missing_tracks_are_rebuilt(parse):
+    path = parse()
+    with sqlite3.connect(path) as connection:
+        connection.execute("DROP TABLE move_tracks")
+    database = ActionDatabase(path)
+    assert database.tracked
+    _check(database)
+    database.close()
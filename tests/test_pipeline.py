@@ -0,0 +1,50 @@
+import sqlite3
+
+import pytest
+
+from etdecode.database import KIND_TABLES, STATS_TABLES
+from etdecode.pipeline import StageStats, threaded
+
+TABLES = tuple(KIND_TABLES) + tuple(STATS_TABLES)
+
+
+def _tables(path):
+    with sqlite3.connect(path) as connection:
+        return {table: sorted(connection.execute(f"SELECT * FROM {table}")) for table in TABLES}
+
+
+@pytest.mark.parametrize("batch_frames", [0, 256])
+def test_pipelined_parse_stores_what_a_sequential_one_does(parse, batch_frames):
+    sequential = _tables(parse(batch_frames=batch_frames))
+    assert sequential["moves"] and sequential["weapon_events"]
+    assert _tables(parse(batch_frames=batch_frames, pipeline=True)) == sequential
+
+
+def test_threaded_keeps_the_order_and_raises_the_producer_error():
+    stats = StageStats("test")
+    assert list(threaded(range(1000), stats, queue_size=4)) == list(range(1000))
+    assert stats.items == 1000
+
+    def failing():
+        yield 1
+        raise ValueError("bad frame")
+
+    items = threaded(failing(), StageStats("test"))
+    assert next(items) == 1
+    with pytest.raises(ValueError, match="bad frame"):
+        next(items)
+
+
+def test_threaded_stops_the_producer_of_a_consumer_that_stops():
+    produced = []
+
+    def endless():
+        while True:
+            produced.append(len(produced))
+            yield produced[-1]
+
+    items = threaded(endless(), StageStats("test"), queue_size=2)
+    assert [next(items) for _ in range(5)] == list(range(5))
+    items.close()
+    stopped = len(produced)
+    assert stopped < 5 + 2 + 2  # What was queued, and at most one more on its way
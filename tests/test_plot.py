@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from etdecode.database import ActionDatabase
+from etdecode.plot import lttb, min_max_indices, tracks
+
+
+def _lttb(x, y, points):
+    # Largest-Triangle-Three-Buckets point by point, with the buckets lttb uses
+    bounds = [int(bound) for bound in np.linspace(1, len(x) - 1, points - 1)]
+    kept = [0]
+    for bucket in range(points - 2):
+        start, end = bounds[bucket], bounds[bucket + 1]
+        if bucket + 2 < len(bounds):
+            following = range(end, bounds[bucket + 2])
+            next_x = sum(x[i] for i in following) / len(following)
+            next_y = sum(y[i] for i in following) / len(following)
+        else:
+            next_x, next_y = x[-1], y[-1]
+        a = kept[-1]
+        areas = [abs((x[a] - next_x) * (y[i] - y[a]) - (x[a] - x[i]) * (next_y - y[a])) for i in range(start, end)]
+        kept.append(start + areas.index(max(areas)))
+    return kept + [len(x) - 1]
+
+
+@pytest.fixture(scope="module")
+def paths(synthetic_demo, tmp_path_factory):
+    # Every player's path through the synthetic demo
+    from etdecode.monitor import ETPlayerMonitor
+
+    database_file = str(tmp_path_factory.mktemp("plot") / "plot.db")
+    monitor = ETPlayerMonitor(synthetic_demo, engine="python", database_file=database_file)
+    monitor.parse_demo()
+    monitor.close(summary=False)
+    database = ActionDatabase(database_file)
+    paths = list(tracks(database.player_ids(), database.player_moves))
+    database.close()
+    return paths
+
+
+@pytest.mark.parametrize("points", [3, 4, 17, 100])
+def test_lttb_keeps_the_largest_triangles(paths, points):
+    for _, x, y in paths:
+        assert len(x) > 100
+        kept = lttb(x, y, points)
+        assert len(kept) == points and kept[0] == 0 and kept[-1] == len(x) - 1
+        assert np.all(np.diff(kept) > 0)
+        assert kept.tolist() == _lttb(x.tolist(), y.tolist(), points)
+
+
+def test_lttb_keeps_short_paths_and_peaks():
+    x = np.arange(10, dtype=np.float64)
+    assert lttb(x, x, 10).tolist() == lttb(x, x, 50).tolist() == lttb(x, x, 2).tolist() == list(range(10))
+
+    x = np.arange(1000, dtype=np.float64)
+    y = np.zeros(1000)
+    y[[123, 456, 789]] = [50.0, -80.0, 20.0]
+    assert {123, 456, 789} <= set(lttb(x, y, 20).tolist())
+
+
+@pytest.mark.parametrize("buckets", [1, 7, 50])
+def test_min_max_indices_keep_each_buckets_extremes(paths, buckets):
+    for _, x, _ in paths:
+        kept = min_max_indices(x, buckets)
+        assert np.all(np.diff(kept) > 0) and len(kept) <= 2 * buckets
+        bounds = np.linspace(0, len(x), buckets + 1).astype(np.int64)
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            inside = kept[(kept >= start) & (kept < end)]
+            assert x[inside].min() == x[start:end].min() and x[inside].max() == x[start:end].max()
+
+
+def test_min_max_indices_keep_short_series():
+    values = np.array([3.0, 1.0, 2.0, 5.0])
+    assert min_max_indices(values, 2).tolist() == [0, 1, 2, 3]
+    assert min_max_indices(values, 1).tolist() == [1, 3]
+
+
+def test_tracks_reads_one_player_at_a_time():
+    read = []
+
+    def moves(player_id):
+        read.append(player_id)
+        return [(player_id * 100 + step, float(step), float(-step), 0.0) for step in range(player_id)]
+
+    paths = tracks([1, 3, 0], moves)
+    player_id, x, y = next(paths)
+    assert read == [1] and player_id == 1 and x.tolist() == [0.0] and y.tolist() == [0.0]
+    rest = list(paths)
+    assert read == [1, 3, 0]
+    assert rest[0][1].tolist() == [0.0, 1.0, 2.0] and rest[0][2].tolist() == [0.0, -1.0, -2.0]
+    assert len(rest[1][1]) == 0
@@ -0,0 +1,52 @@
+import sqlite3
+
+from etdecode.database import ActionDatabase
+
+# The wide table databases of older versions hold
+LEGACY_COLUMNS = ("timestamp", "player_id", "player_name", "action", "weapon", "pos_x", "pos_y", "pos_z",
+                  "angle_x", "angle_y", "angle_z", "velocity", "accuracy")
+LEGACY_TABLE = """
+    CREATE TABLE player_actions (
+        timestamp INTEGER, player_id INTEGER, player_name TEXT, action TEXT, weapon INTEGER,
+        pos_x REAL, pos_y REAL, pos_z REAL, angle_x REAL, angle_y REAL, angle_z REAL,
+        velocity REAL, accuracy REAL
+    )
+"""
+
+
+def _view(connection):
+    return sorted(connection.execute("SELECT * FROM player_actions"), key=repr)
+
+
+def test_view_has_the_legacy_columns(parse):
+    with sqlite3.connect(parse()) as connection:
+        columns = tuple(row[1] for row in connection.execute("PRAGMA table_info(player_actions)"))
+        kinds = dict(connection.execute("SELECT action, COUNT(*) FROM player_actions GROUP BY action"))
+        counts = {table: connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                  for table in ("moves", "aims", "weapon_events")}
+    assert columns == LEGACY_COLUMNS
+    assert kinds["move"] == counts["moves"] and kinds["aim_consistency"] == counts["aims"]
+    assert sum(kinds.values()) == sum(counts.values())
+
+
+def test_legacy_table_is_migrated(parse, tmp_path):
+    with sqlite3.connect(parse()) as connection:
+        expected = _view(connection)
+    legacy = str(tmp_path / "legacy.db")
+    with sqlite3.connect(legacy) as connection:
+        connection.execute(LEGACY_TABLE)
+        connection.executemany(f"INSERT INTO player_actions VALUES ({', '.join('?' * len(LEGACY_COLUMNS))})", expected)
+
+    database = ActionDatabase(legacy)
+    connection = database.connection
+    assert connection.execute("SELECT type FROM sqlite_master WHERE name = 'player_actions'").fetchone()[0] == "view"
+    assert _view(connection) == expected
+    counted = {(name, action): count for name, action, count in database.action_counts()}
+    for name, action in {(row[2], row[3]) for row in expected}:
+        assert counted[name, action] == sum(1 for row in expected if row[2:4] == (name, action))
+    database.close()
+
+    # Opening it again finds nothing left to migrate
+    database = ActionDatabase(legacy)
+    assert _view(database.connection) == expected
+    database.close()
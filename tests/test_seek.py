@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+
+from etdecode.demo import DemoReader
+from etdecode.msg import PythonDecoder
+from etdecode.seek import FULL_SNAPSHOT, GAMESTATE, INDEX_SUFFIX, NO_TIME, DemoIndex, in_range
+from etdecode.snapshot import PLAYER_STATE_DTYPE, SnapshotParser, detach
+from etdecode.synthetic import SNAPSHOT_MSEC
+
+KEYFRAME_INTERVAL = 100  # As conftest generates the demo
+
+
+def _snapshots(demo_file, frames=None, start_time=None):
+    parser = SnapshotParser(PythonDecoder())
+    with DemoReader(demo_file) as reader:
+        source = reader if frames is None else frames(reader)
+        return [detach(snapshot) for snapshot in in_range(parser.snapshots(source), start_time)]
+
+
+def test_index_finds_every_message(synthetic_demo):
+    index = DemoIndex.build(synthetic_demo, PythonDecoder())
+    snapshots = len(index) - 1
+    assert index.flags[0] == GAMESTATE and index.server_times[0] == NO_TIME
+    assert index.server_times[1:].tolist() == [SNAPSHOT_MSEC * (number + 1) for number in range(snapshots)]
+    assert (index.keyframes - 1).tolist() == list(range(0, snapshots, KEYFRAME_INTERVAL))
+    with DemoReader(synthetic_demo) as reader:
+        frames = list(reader)
+    assert index.offsets.tolist() == [frame.offset for frame in frames]
+    assert index.sequences.tolist() == [frame.sequence for frame in frames]
+
+
+def test_index_round_trips_through_its_file(synthetic_demo, tmp_path):
+    path = str(tmp_path / "synthetic.idx.npz")
+    built = DemoIndex.for_demo(synthetic_demo, PythonDecoder(), path)
+    loaded = DemoIndex.load(path)
+    for name in ("offsets", "sequences", "server_times", "flags"):
+        assert np.array_equal(getattr(loaded, name), getattr(built, name))
+    assert (loaded.size, loaded.mtime_ns) == (built.size, built.mtime_ns) == (os.path.getsize(synthetic_demo),
+                                                                          os.stat(synthetic_demo).st_mtime_ns)
+
+
+def test_changed_demo_gets_a_new_index(tmp_path, synthetic_demo):
+    demo_file = str(tmp_path / "copy.dm_84")
+    with open(synthetic_demo, "rb") as source, open(demo_file, "wb") as copy:
+        copy.write(source.read())
+    first = DemoIndex.for_demo(demo_file, PythonDecoder())
+    assert os.path.exists(demo_file + INDEX_SUFFIX)
+    with open(demo_file, "r+b") as demo:
+        demo.truncate(first.offsets[-1])  # The last message gone
+    assert len(DemoIndex.for_demo(demo_file, PythonDecoder())) == len(first) - 1
+
+
+def test_seeking_gives_the_snapshots_of_a_full_parse(synthetic_demo):
+    index = DemoIndex.build(synthetic_demo, PythonDecoder())
+    everything = _snapshots(synthetic_demo)
+    for start_time in (None, 50, 4999, 5050, 5051, 12345):
+        gamestate, keyframe = index.start(start_time)
+        assert gamestate == 0 and index.flags[keyframe] & FULL_SNAPSHOT
+        seeked = _snapshots(synthetic_demo, lambda reader: index.frames(reader, start_time), start_time)
+        expected = [snapshot for snapshot in everything if start_time is None or snapshot.server_time >= start_time]
+        assert [snapshot.server_time for snapshot in seeked] == [snapshot.server_time for snapshot in expected]
+        for got, snapshot in zip(seeked, expected):
+            # Field by field: a copied np.void leaves the bytes between fields undefined
+            assert all(np.array_equal(got.ps[name], snapshot.ps[name]) for name in PLAYER_STATE_DTYPE.names)
+            assert np.array_equal(got.entities.view(np.int32), snapshot.entities.view(np.int32))
+
+
+def test_segments_cover_the_demo_at_keyframes(synthetic_demo):
+    index = DemoIndex.build(synthetic_demo, PythonDecoder())
+    segments = index.segments(3)
+    assert len(segments) == 3 and segments[0][0] is None and segments[-1][1] is None
+    keyframe_times = set(index.server_times[index.keyframes].tolist())
+    for (_, end_time), (start_time, _) in zip(segments, segments[1:]):
+        assert end_time == start_time and start_time in keyframe_times
+    assert index.segments(1) == [(None, None)]
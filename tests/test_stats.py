@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+from collections import Counter
+
+import pytest
+
+from etdecode.database import ActionDatabase
+from etdecode.monitor import ETPlayerMonitor
+from etdecode.stats import RateLimitedLog
+from etdecode.synthetic import generate_demo
+
+END_MARKER = 8  # The two -1 words closing a demo, not a message
+
+
+def _parse(demo_file, tmp_path, **options):
+    monitor = ETPlayerMonitor(demo_file, engine="python", database_file=str(tmp_path / "stats.db"), **options)
+    stats = monitor.parse_demo()
+    monitor.close(summary=False)
+    return stats
+
+
+@pytest.mark.parametrize("options", [{}, {"batch_frames": 0}, {"pipeline": True}, {"profile_every": 10}])
+def test_counters_match_what_was_written(tmp_path, options):
+    demo_file = str(tmp_path / "counted.dm_84")
+    written = generate_demo(demo_file, snapshots=200, players=6, items=4, seed=3)
+    stats = _parse(demo_file, tmp_path, **options)
+    counters = stats.counters
+    assert counters["messages"] == written["messages"]
+    assert counters["bytes_read"] == written["bytes"] - END_MARKER == os.path.getsize(demo_file) - END_MARKER
+    assert counters["snapshots"] == written["messages"] - 1  # All but the gamestate
+    assert (counters["events.fire"], counters["events.hit"], counters["events.reload"]) == \
+        (written["fires"], written["hits"], written["reloads"])
+    assert not counters["errors"] and not counters["decode_failures"] and not counters["dropped_snapshots"]
+
+    database = ActionDatabase(str(tmp_path / "stats.db"))
+    stored = Counter()
+    for _, action, count in database.action_counts():
+        stored[action] += count
+    database.close()
+    for action in ("move", "aim_consistency", "fire", "hit", "reload"):
+        assert counters["events." + action] == stored[action]
+    assert counters["rows_flushed"] == sum(counters[name] for name in counters if name.startswith("events."))
+
+    values = json.loads(stats.to_json(str(tmp_path / "stats.json")))
+    with open(tmp_path / "stats.json") as file:
+        assert json.load(file) == values
+    assert values["counters"] == dict(counters)
+    assert values["seconds"]["total"] > 0 and values["messages_per_s"] > 0
+    assert ("profile" in values) == ("profile_every" in options)
+
+
+def test_truncated_demo_is_counted(tmp_path):
+    demo_file = str(tmp_path / "truncated.dm_84")
+    written = generate_demo(demo_file, snapshots=50, players=2, items=0, seed=1)
+    with open(demo_file, "r+b") as demo:
+        demo.truncate(os.path.getsize(demo_file) - END_MARKER - 10)  # Into the last message
+    counters = _parse(demo_file, tmp_path).counters
+    assert counters["malformed_frames"] == 1
+    assert counters["messages"] == written["messages"] - 1
+    assert not counters["errors"]
+
+
+def test_rate_limited_log_counts_what_it_drops(caplog):
+    log = RateLimitedLog(logging.getLogger("test_stats"), interval=3600)
+    with caplog.at_level(logging.WARNING, logger="test_stats"):
+        for number in range(5):
+            log.warning("bad", "Bad frame %d", number)
+        log.error("other", "Other message")
+        assert [record.getMessage() for record in caplog.records] == ["Bad frame 0", "Other message"]
+
+        log.interval = 0
+        log.warning("bad", "Bad frame %d", 5)
+        assert caplog.records[-1].getMessage() == "Bad frame 5 (4 more like it suppressed)"
+        log.warning("bad", "Bad frame %d", 6)
+        assert caplog.records[-1].getMessage() == "Bad frame 6"
+
+    caplog.clear()
+    with caplog.at_level(logging.ERROR, logger="test_stats"):
+        log.warning("bad", "Not written")
+    assert not caplog.records
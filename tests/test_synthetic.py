@@ -0,0 +1,31 @@
+import pytest
+
+from etdecode.synthetic import generate_demo
+
+OPTIONS = {"snapshots": 100, "players": 8, "items": 8, "keyframe_interval": 40}
+
+
+def test_same_seed_same_bytes(tmp_path):
+    paths = [tmp_path / f"{name}.dm_84" for name in ("first", "second", "other")]
+    counts = [generate_demo(paths[0], seed=7, **OPTIONS), generate_demo(paths[1], seed=7, **OPTIONS)]
+    generate_demo(paths[2], seed=8, **OPTIONS)
+    assert counts[0] == counts[1]
+    assert paths[0].read_bytes() == paths[1].read_bytes()
+    assert paths[0].read_bytes() != paths[2].read_bytes()
+
+
+def test_writers_give_the_same_bytes(tmp_path):
+    from etdecode.native import load_library
+    try:
+        load_library()
+    except OSError as e:
+        pytest.skip(f"huffman library unavailable: {e}")
+    python, native = tmp_path / "python.dm_84", tmp_path / "native.dm_84"
+    generate_demo(python, seed=7, **OPTIONS)
+    generate_demo(native, seed=7, writer="native", **OPTIONS)
+    assert python.read_bytes() == native.read_bytes()
+
+
+def test_unknown_writer(tmp_path):
+    with pytest.raises(ValueError):
+        generate_demo(tmp_path / "demo.dm_84", writer="rust", **OPTIONS)